@@ -1,14 +1,21 @@
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import get_db
+from .database import AsyncReadSessionLocal, get_async_db
 from .models import User, UserRole
 from .schemas import UserCreate, UserOut, TokenResponse
 
@@ -18,9 +25,76 @@ router = APIRouter()
 SECRET_KEY = os.getenv("DOCQA_SECRET_KEY", "change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("DOCQA_TOKEN_MINUTES", "120"))
+# Stream tickets end up in access logs (they ride in the /events query string), so they expire fast.
+STREAM_TICKET_SECONDS = int(os.getenv("DOCQA_STREAM_TICKET_SECONDS", "60"))
+STREAM_TICKET_AUDIENCE = "docqa:events"
+USER_CACHE_TTL_SECONDS = float(os.getenv("DOCQA_USER_CACHE_TTL", "30"))
+# Build the current user from signed token claims alone (no DB lookup); role changes then apply at
+# the next login instead of within USER_CACHE_TTL_SECONDS.
+TRUST_TOKEN_CLAIMS = os.getenv("DOCQA_AUTH_TRUST_CLAIMS", "0") == "1"
+HASH_WORKERS = int(os.getenv("DOCQA_HASH_WORKERS", "2"))
+HASH_MAX_PENDING = int(os.getenv("DOCQA_HASH_MAX_PENDING", "32"))
 
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+
+@dataclass(frozen=True)
+class AuthUser:
+    """Detached snapshot of the authenticated user, safe to share between requests."""
+
+    id: int
+    email: str
+    full_name: str
+    role: UserRole
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthUser":
+        return cls(id=user.id, email=user.email, full_name=user.full_name, role=user.role, created_at=user.created_at)
+
+
+class UserCache:
+    def __init__(self, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[float, AuthUser]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[AuthUser]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, user: AuthUser) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(_mapper, _connection, target: User) -> None:
+    user_cache.invalidate(target.id)
+
+
+# argon2 is deliberately slow; it gets its own small pool so a burst of logins cannot occupy the
+# request threadpool, and requests beyond HASH_MAX_PENDING are turned away instead of queueing.
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="argon2")
+_hash_slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
 
 
 def verify_password(plain_password: str, password_hash: str) -> bool:
@@ -31,6 +105,27 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_hash(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests in flight",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.wrap_future(_hash_executor.submit(fn, *args))
+    finally:
+        _hash_slots.release()
+
+
+async def verify_password_async(plain_password: str, password_hash: str) -> bool:
+    return await _run_hash(verify_password, plain_password, password_hash)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hash(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -38,60 +133,121 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> User:
+@lru_cache(maxsize=4096)
+def _decode_token(token: str) -> dict:
+    # Signature check is the expensive part and a token's claims never change; expiry is
+    # re-checked by the caller on every use.
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+async def _user_from_claims(db: AsyncSession, payload: dict, credentials_exception: HTTPException) -> AuthUser:
+    try:
+        user_id = int(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        raise credentials_exception
+    if TRUST_TOKEN_CLAIMS and "role" in payload and "email" in payload:
+        return AuthUser(
+            id=user_id, email=payload["email"], full_name=payload.get("name", ""), role=UserRole(payload["role"])
+        )
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    user = await db.get(User, user_id)
+    if user is None:
+        raise credentials_exception
+    auth_user = AuthUser.from_user(user)
+    user_cache.put(auth_user)
+    return auth_user
+
+
+async def get_current_user(db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_scheme)) -> AuthUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int | None = payload.get("sub")
-        if user_id is None:
+        # Stream tickets carry an audience, which makes this decode reject them.
+        payload = _decode_token(token)
+        if payload.get("exp", 0) < time.time():
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    return await _user_from_claims(db, payload, credentials_exception)
+
+
+def create_stream_ticket(user: AuthUser) -> str:
+    """Short-lived token that only ``GET /events`` accepts, for EventSource's query string."""
+    claims = {"sub": str(user.id), "aud": STREAM_TICKET_AUDIENCE, "role": user.role.value, "email": user.email,
+              "name": user.full_name}
+    return create_access_token(claims, timedelta(seconds=STREAM_TICKET_SECONDS))
+
+
+async def get_stream_user(
+    ticket: Optional[str] = Query(None, description="from POST /events/ticket; EventSource cannot send headers"),
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+) -> AuthUser:
+    # A session of its own, closed before the response starts: the stream may stay open for hours.
+    async with AsyncReadSessionLocal() as db:
+        if header_token:
+            return await get_current_user(db, header_token)
+        credentials_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired stream ticket"
+        )
+        try:
+            payload = jwt.decode(ticket or "", SECRET_KEY, algorithms=[ALGORITHM], audience=STREAM_TICKET_AUDIENCE)
+        except JWTError:
+            raise credentials_exception
+        # decode() with an audience still accepts tokens that have none, such as login tokens.
+        if payload.get("aud") != STREAM_TICKET_AUDIENCE:
+            raise credentials_exception
+        return await _user_from_claims(db, payload, credentials_exception)
 
 
 def require_role(required: UserRole):
-    def role_dep(user: User = Depends(get_current_user)) -> User:
+    async def role_dep(user: AuthUser = Depends(get_current_user)) -> AuthUser:
         if user.role != required:
             raise HTTPException(status_code=403, detail="Insufficient role")
         return user
     return role_dep
 
 
+async def _find_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    return (await db.execute(select(User).where(User.email == email))).scalars().first()
+
+
 @router.post("/register", response_model=UserOut)
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == user_in.email).first():
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if await _find_user_by_email(db, user_in.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     user = User(
         email=user_in.email,
         full_name=user_in.full_name or "",
         role=user_in.role,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=await get_password_hash_async(user_in.password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await _find_user_by_email(db, form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    token = create_access_token({"sub": str(user.id), "role": user.role.value})
+    token = create_access_token(
+        {"sub": str(user.id), "role": user.role.value, "email": user.email, "name": user.full_name}
+    )
     return TokenResponse(access_token=token)
 
 
 @router.get("/me", response_model=UserOut)
-def get_current_user_info(user: User = Depends(get_current_user)):
+async def get_current_user_info(user: AuthUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    if user.created_at is None:
+        # trusted-claims mode carries no profile details beyond the token
+        return await db.get(User, user.id)
     return user
 
 
@@ -0,0 +1,337 @@
+"""zstd compression for stored chunk text and for HTTP responses.
+
+Storage: columns typed :class:`CompressedText` hold zstd frames on SQLite, compressed with a
+dictionary trained on the chunks themselves (``python -m backend.compression train``), so even a
+single 800-token chunk compresses well. Frames name their dictionary, so rows written under an
+older one stay readable; rows written before compression was enabled are plain text and are
+returned as is. SQL that needs the text (upsert comparisons, re-indexing for search) goes through
+the ``docqa_unzstd()`` function every SQLite connection of the app registers. PostgreSQL keeps plain text: TOAST
+already compresses large values there.
+
+Responses: :class:`CompressionMiddleware` is Starlette's GZip middleware with zstd preferred when
+the client accepts it.
+"""
+import argparse
+import gzip
+import io
+import os
+import threading
+from typing import BinaryIO, Dict, Optional
+
+import zstandard
+from sqlalchemy import LargeBinary, Text, cast, func, select, type_coerce, update
+from sqlalchemy.types import TypeDecorator
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipMiddleware, GZipResponder, IdentityResponder
+
+
+STORAGE_COMPRESSION = os.getenv("DOCQA_STORAGE_COMPRESSION", "zstd")  # "off" stores new rows as plain text
+STORAGE_LEVEL = int(os.getenv("DOCQA_STORAGE_ZSTD_LEVEL", "9"))
+DICT_SIZE = 112 * 1024  # zstd's default dictionary size
+TRAIN_SAMPLES = 5000
+
+RESPONSE_COMPRESSION = os.getenv("DOCQA_RESPONSE_COMPRESSION", "1") == "1"
+RESPONSE_MIN_BYTES = 1024
+RESPONSE_ZSTD_LEVEL = 3
+RESPONSE_GZIP_LEVEL = 6
+# Parquet pages are compressed already.
+RESPONSE_EXCLUDED_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/vnd.apache.parquet",)
+
+UPLOAD_SUFFIXES = (".gz", ".zst")
+# What a compressed upload may expand to; a few MB of .gz can otherwise inflate without bound.
+MAX_UPLOAD_BYTES = int(os.getenv("DOCQA_MAX_UPLOAD_BYTES", str(1024 ** 3)))
+
+
+class Codec:
+    """Compressors and decompressors for the stored dictionaries, one set per thread."""
+
+    def __init__(self, level: int = STORAGE_LEVEL):
+        self.level = level
+        self._dicts: Dict[int, zstandard.ZstdCompressionDict] = {}
+        self._active: Optional[int] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def load(self) -> None:
+        """(Re)read the dictionaries; the newest one compresses new rows."""
+        from .database import engine
+        from .models import CompressionDict
+
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(CompressionDict.id, CompressionDict.data).order_by(CompressionDict.created_at, CompressionDict.id)
+            ).all()
+        with self._lock:
+            for dict_id, data in rows:
+                if dict_id not in self._dicts:
+                    self._dicts[dict_id] = zstandard.ZstdCompressionDict(bytes(data))
+            self._active = rows[-1][0] if rows else None
+            self._loaded = True
+            self._local = threading.local()
+
+    def _cached(self, kind: str, dict_id: Optional[int]):
+        cache = self._local.__dict__.setdefault(kind, {})
+        obj = cache.get(dict_id)
+        if obj is None:
+            data = self._dicts[dict_id] if dict_id else None
+            if kind == "c":
+                obj = zstandard.ZstdCompressor(level=self.level, dict_data=data)
+            else:
+                obj = zstandard.ZstdDecompressor(dict_data=data)
+            cache[dict_id] = obj
+        return obj
+
+    def compress(self, value: str) -> bytes:
+        if not self._loaded:
+            self.load()
+        return self._cached("c", self._active).compress(value.encode("utf-8"))
+
+    def decompress(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        data = bytes(value)
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        if dict_id and dict_id not in self._dicts:
+            self.load()  # trained by another process since we last looked
+            if dict_id not in self._dicts:
+                raise ValueError(f"zstd dictionary {dict_id} is not in compression_dicts")
+        return self._cached("d", dict_id).decompress(data).decode("utf-8")
+
+
+codec = Codec()
+
+
+class CompressedText(TypeDecorator):
+    """Text stored as a zstd frame on SQLite; reads return ``str`` whatever the row holds."""
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "sqlite" or STORAGE_COMPRESSION == "off":
+            return value
+        return codec.compress(value)
+
+    def process_result_value(self, value, dialect):
+        return codec.decompress(value)
+
+
+def sql_unzstd(value):
+    """``docqa_unzstd(x)`` for SQLite connections (see backend/database.py)."""
+    return codec.decompress(value)
+
+
+def plain_text(db, column):
+    """SQL expression for the text in a CompressedText `column`, for comparisons inside the database."""
+    if db.get_bind().dialect.name == "sqlite":
+        return type_coerce(func.docqa_unzstd(column), Text)
+    return column
+
+
+def uncompressed_name(filename: str) -> str:
+    """`filename` without a .gz/.zst suffix: the name of what's inside."""
+    for suffix in UPLOAD_SUFFIXES:
+        if filename.endswith(suffix):
+            return filename[: -len(suffix)]
+    return filename
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, limit: int):
+        super().__init__(f"decompressed upload exceeds {limit} bytes")
+        self.limit = limit
+
+
+class _CappedReader(io.RawIOBase):
+    """Raises :class:`UploadTooLarge` once more than `limit` bytes have been read from `raw`."""
+
+    def __init__(self, raw: BinaryIO, limit: int):
+        self._raw = raw
+        self._limit = limit
+        self._read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._raw.readinto(buffer)
+        self._read += n
+        if self._read > self._limit:
+            raise UploadTooLarge(self._limit)
+        return n
+
+
+def open_upload(fileobj: BinaryIO, filename: str, limit: int = MAX_UPLOAD_BYTES) -> BinaryIO:
+    """The uploaded file from its start, decompressed on the fly when `filename` says it's compressed.
+
+    Decompressing is blocking work: read the result off the event loop.
+    """
+    fileobj.seek(0)
+    if filename.endswith(".gz"):
+        raw = gzip.GzipFile(fileobj=fileobj, mode="rb")
+    elif filename.endswith(".zst"):
+        raw = zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True, closefd=False)
+    else:
+        return fileobj
+    return io.BufferedReader(_CappedReader(raw, limit))
+
+
+def _accepts(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        if name.strip() != coding:
+            continue
+        q = params.strip()
+        if not q.startswith("q="):
+            return True
+        try:
+            return float(q[2:]) > 0
+        except ValueError:
+            return False
+    return False
+
+
+class ZstdResponder(GZipResponder):
+    content_encoding = "zstd"
+
+    @property
+    def compressor(self):
+        if self._compressor is None:
+            self._compressor = zstandard.ZstdCompressor(level=self.compresslevel).compressobj()
+        return self._compressor
+
+    def _compress_body(self, body: bytes, more_body: bool) -> bytes:
+        # A flushed block per message keeps streamed exports (NDJSON, CSV) flowing to the client.
+        flush = zstandard.COMPRESSOBJ_FLUSH_BLOCK if more_body else zstandard.COMPRESSOBJ_FLUSH_FINISH
+        return self.compressor.compress(body) + self.compressor.flush(flush)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """zstd when the client accepts it, else gzip; compressed responses get a weak ETag (as nginx does)."""
+
+    def __init__(self, app, minimum_size: int = RESPONSE_MIN_BYTES):
+        super().__init__(
+            app, minimum_size, compresslevel=RESPONSE_GZIP_LEVEL, exclude_content_types=RESPONSE_EXCLUDED_TYPES
+        )
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or not RESPONSE_COMPRESSION:
+            await self.app(scope, receive, send)
+            return
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        if _accepts(accept, "zstd"):
+            responder = ZstdResponder(
+                self.app, self.minimum_size, compresslevel=RESPONSE_ZSTD_LEVEL,
+                thread_minimum_size=self.thread_minimum_size, exclude_content_types=self.exclude_content_types,
+            )
+        elif _accepts(accept, "gzip"):
+            responder = GZipResponder(
+                self.app, self.minimum_size, compresslevel=self.compresslevel,
+                thread_minimum_size=self.thread_minimum_size, exclude_content_types=self.exclude_content_types,
+            )
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=self.exclude_content_types)
+
+        coding = getattr(responder, "content_encoding", None)
+
+        async def send_weak_etag(message) -> None:
+            if message["type"] == "http.response.start" and coding and not responder.content_encoding_set:
+                headers = MutableHeaders(raw=message["headers"])
+                etag = headers.get("etag")
+                # A strong ETag names exact bytes; the compressed body is a different representation.
+                if etag and not etag.startswith("W/") and headers.get("content-encoding") == coding:
+                    headers["etag"] = "W/" + etag
+            await send(message)
+
+        await responder(scope, receive, send_weak_etag)
+
+
+def train(db, samples: int = TRAIN_SAMPLES, dict_size: int = DICT_SIZE) -> Optional[int]:
+    """Train a dictionary on a random sample of chunks and make it the active one; returns its id."""
+    from .models import Chunk, CompressionDict
+
+    texts = [t.encode("utf-8") for t in db.execute(select(Chunk.content).order_by(func.random()).limit(samples)).scalars()]
+    if len(texts) < 8:
+        return None  # zstd needs a handful of samples to find anything shared
+    trained = zstandard.train_dictionary(dict_size, texts, level=STORAGE_LEVEL)
+    if db.get(CompressionDict, trained.dict_id()) is None:
+        db.add(CompressionDict(id=trained.dict_id(), data=trained.as_bytes()))
+    db.commit()
+    codec.load()
+    return trained.dict_id()
+
+
+def recompress(db, batch_size: int = 1000) -> int:
+    """Rewrite chunks that are plain text or use an older dictionary; returns how many were rewritten."""
+    from .models import Chunk
+
+    codec.load()
+    active = codec._active
+    rewritten, last_id = 0, 0
+    while True:
+        rows = db.execute(
+            select(Chunk.id, type_coerce(Chunk.content, Text).label("stored"))  # raw column value
+            .where(Chunk.id > last_id).order_by(Chunk.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return rewritten
+        stale = [
+            {"id": row.id, "content": codec.decompress(row.stored)}
+            for row in rows
+            if isinstance(row.stored, str) or zstandard.get_frame_parameters(row.stored).dict_id != active
+        ]
+        if stale:
+            # Same text, so neither the chunks_fts rows nor any reader's data change.
+            db.execute(update(Chunk).execution_options(bump_generation=False), stale)
+            db.commit()
+            rewritten += len(stale)
+        last_id = rows[-1].id
+
+
+def storage_stats(db) -> Dict[str, int]:
+    from .models import Chunk
+
+    stored_bytes, text_bytes, compressed, total = db.execute(
+        select(
+            func.coalesce(func.sum(func.length(type_coerce(Chunk.content, LargeBinary))), 0),
+            func.coalesce(func.sum(func.length(cast(func.docqa_unzstd(Chunk.content), LargeBinary))), 0),
+            func.count().filter(func.typeof(Chunk.content) == "blob"),
+            func.count(),
+        )
+    ).one()
+    return {
+        "chunks": total,
+        "compressed": compressed,
+        "stored_bytes": stored_bytes,
+        "text_bytes": text_bytes,
+        "dictionaries": len(codec._dicts),
+        "active_dictionary": codec._active,
+    }
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Manage zstd compression of stored chunk text (SQLite)")
+    sub = p.add_subparsers(dest="command", required=True)
+    t = sub.add_parser("train", help="train a dictionary on the current chunks and make it active")
+    t.add_argument("--samples", type=int, default=TRAIN_SAMPLES)
+    t.add_argument("--dict-kb", type=int, default=DICT_SIZE // 1024)
+    r = sub.add_parser("recompress", help="rewrite plain or older-dictionary chunks with the active dictionary")
+    r.add_argument("--batch-size", type=int, default=1000)
+    sub.add_parser("stats", help="stored vs. text size of chunks.content")
+    args = p.parse_args()
+
+    from .database import SessionLocal, init_database
+
+    init_database()
+    with SessionLocal() as db:
+        if db.get_bind().dialect.name != "sqlite":
+            raise SystemExit("chunk text is only compressed on SQLite; PostgreSQL relies on TOAST")
+        if args.command == "train":
+            dict_id = train(db, args.samples, args.dict_kb * 1024)
+            print({"dictionary": dict_id} if dict_id else "not enough chunks to train a dictionary")
+        elif args.command == "recompress":
+            print({"rewritten": recompress(db, args.batch_size)})
+        else:
+            codec.load()
+            print(storage_stats(db))
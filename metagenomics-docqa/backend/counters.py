@@ -0,0 +1,111 @@
+import argparse
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import events
+from .database import SessionLocal, dialect_insert
+from .models import Chunk, QAItem, QAStatus, QAStatusCounter
+
+
+def apply_deltas(db: Session, deltas: Dict[Tuple[QAStatus, str], int]) -> None:
+    # Runs inside the caller's transaction so counters commit (or roll back) with the QA rows.
+    changed = []
+    for (status, source_url), delta in deltas.items():
+        if not delta:
+            continue
+        changed.append({"status": status.value, "source_url": source_url or "", "delta": delta})
+        stmt = dialect_insert(db, QAStatusCounter).values(status=status, source_url=source_url or "", count=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[QAStatusCounter.status, QAStatusCounter.source_url],
+            set_={"count": QAStatusCounter.count + stmt.excluded.count},
+        )
+        db.execute(stmt)
+    if changed:
+        events.queue(db, "counters", {"deltas": changed})
+
+
+def record_created(db: Session, source_url: str, count: int, status: QAStatus = QAStatus.pending) -> None:
+    apply_deltas(db, {(status, source_url): count})
+
+
+def record_transitions(db: Session, transitions: Iterable[Tuple[str, QAStatus, QAStatus]]) -> None:
+    """Apply ``(source_url, old_status, new_status)`` moves; unchanged statuses are ignored."""
+    deltas: Counter = Counter()
+    for source_url, old, new in transitions:
+        if old == new:
+            continue
+        deltas[(old, source_url or "")] -= 1
+        deltas[(new, source_url or "")] += 1
+    apply_deltas(db, deltas)
+
+
+def get_counts(db: Session, source_url: Optional[str] = None) -> Dict[str, int]:
+    query = db.query(QAStatusCounter.status, func.sum(QAStatusCounter.count))
+    if source_url is not None:
+        query = query.filter(QAStatusCounter.source_url == source_url)
+    counts = {status.value: 0 for status in QAStatus}
+    for status, count in query.group_by(QAStatusCounter.status):
+        counts[status.value] = int(count or 0)
+    counts["total"] = sum(counts.values())
+    return counts
+
+
+def get_counts_by_source(db: Session) -> Dict[str, Dict[str, int]]:
+    result: Dict[str, Dict[str, int]] = {}
+    for status, source_url, count in db.query(
+        QAStatusCounter.status, QAStatusCounter.source_url, QAStatusCounter.count
+    ):
+        entry = result.setdefault(source_url, {s.value: 0 for s in QAStatus})
+        entry[status.value] = count
+    for entry in result.values():
+        entry["total"] = sum(entry.values())
+    return result
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every counter from qa_items; returns the number of counter rows written.
+
+    Near-duplicates clustered under another QA (duplicate_of_id set) are left out, like they are
+    from the review queue.
+    """
+    source_url = func.coalesce(Chunk.source_url, "")
+    rows = (
+        db.query(QAItem.status, source_url, func.count(QAItem.id))
+        .join(Chunk, Chunk.id == QAItem.chunk_id_fk)
+        .filter(QAItem.duplicate_of_id.is_(None))
+        .group_by(QAItem.status, source_url)
+        .all()
+    )
+    db.query(QAStatusCounter).delete(synchronize_session=False)
+    db.add_all(
+        QAStatusCounter(status=status, source_url=source, count=count)
+        for status, source, count in rows
+    )
+    db.flush()
+    return len(rows)
+
+
+def ensure_initialized(db: Session) -> None:
+    # Databases that predate the counters table get seeded once on startup.
+    if db.query(QAStatusCounter.id).first() is None and db.query(QAItem.id).first() is not None:
+        rebuild(db)
+        db.commit()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Maintain the qa_status_counters summary table")
+    p.add_argument("command", choices=["rebuild", "show"])
+    args = p.parse_args()
+
+    from .database import init_database
+
+    init_database()
+    with SessionLocal() as db:
+        if args.command == "rebuild":
+            written = rebuild(db)
+            db.commit()
+            print(f"rebuilt {written} counter rows")
+        print(get_counts(db))
@@ -1,21 +1,131 @@
 import os
 from pathlib import Path
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from .compression import sql_unzstd
+
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 DB_PATH = os.getenv("DOCQA_DB_PATH", str(BASE_DIR / "docqa.sqlite3"))
+# e.g. postgresql+psycopg://docqa:secret@db/docqa; defaults to the SQLite file above
+DATABASE_URL = os.getenv("DOCQA_DATABASE_URL", f"sqlite:///{DB_PATH}")
+# Optional separate target for read-heavy endpoints (a PostgreSQL replica, say)
+READ_DATABASE_URL = os.getenv("DOCQA_READ_DATABASE_URL", DATABASE_URL)
+
+DB_POOL_SIZE = int(os.getenv("DOCQA_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DOCQA_DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DOCQA_DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DOCQA_DB_POOL_RECYCLE", "1800"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("DOCQA_SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_CACHE_MB = int(os.getenv("DOCQA_SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("DOCQA_SQLITE_MMAP_MB", "256"))
+
+
+def _sqlite_pragmas(readonly: bool):
+    def on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        # WAL lets readers proceed while a writer commits; NORMAL sync is durable enough under WAL.
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA foreign_keys=ON")
+        if readonly:
+            cur.execute("PRAGMA query_only=ON")
+        cur.close()
+        # Used by the chunks FTS index and upsert comparisons to read zstd-compressed text.
+        dbapi_conn.create_function("docqa_unzstd", 1, sql_unzstd, deterministic=True)
+    return on_connect
+
+
+def make_engine(url: str, readonly: bool = False) -> Engine:
+    if url.startswith("sqlite"):
+        eng = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        event.listen(eng, "connect", _sqlite_pragmas(readonly))
+        return eng
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+# Async drivers for the request path; worker threads and CLI tools keep the sync engines above.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+psycopg"}
 
-engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+
+def async_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(
+        hide_password=False
+    )
+
+
+def make_async_engine(url: str, readonly: bool = False) -> AsyncEngine:
+    url = async_url(url)
+    if url.startswith("sqlite"):
+        eng = create_async_engine(
+            url,
+            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        event.listen(eng.sync_engine, "connect", _sqlite_pragmas(readonly))
+        return eng
+    return create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+engine = make_engine(DATABASE_URL)
+read_engine = make_engine(READ_DATABASE_URL, readonly=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+async_engine = make_async_engine(DATABASE_URL)
+async_read_engine = make_async_engine(READ_DATABASE_URL, readonly=True)
+# expire_on_commit=False: attributes stay readable after commit without an implicit (sync) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
 def init_database() -> None:
     from . import models  # noqa: F401 - ensure models are imported for metadata
+    from .migrations import run_migrations
+
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+
+def dialect_insert(db, model):
+    # INSERT with ON CONFLICT support for the dialect the session is bound to.
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
 
 
 def get_db():
@@ -26,3 +136,25 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    # For endpoints that only read; bound to the read engine (query_only on SQLite).
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engines() -> None:
+    await async_engine.dispose()
+    await async_read_engine.dispose()
@@ -0,0 +1,176 @@
+"""Near-duplicate QA detection with MinHash signatures and an LSH index kept in the database.
+
+Each QA's question + answer is shingled into character 5-grams and summarised by a MinHash
+signature. The signature is cut into bands; each band hash is a row in ``qa_lsh_buckets``, so a
+lookup only touches QAs sharing at least one band (index lookups) and is then confirmed with
+the exact Jaccard similarity of the shingle sets.
+
+DOCQA_DEDUP_MODE decides what happens to a near-duplicate produced by the generation workers:
+``drop`` (default) skips it, ``cluster`` stores it with ``duplicate_of_id`` pointing at the first
+QA of its cluster (hidden from the review queue), ``off`` disables the check.
+"""
+import argparse
+import hashlib
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from .models import Annotation, QAItem, QALSHBucket, QAStatus
+
+
+DEDUP_MODE = os.getenv("DOCQA_DEDUP_MODE", "drop")
+DEDUP_THRESHOLD = float(os.getenv("DOCQA_DEDUP_THRESHOLD", "0.8"))
+
+SHINGLE_CHARS = 5
+NUM_PERM = 128
+BANDS = 16  # 8 rows per band: candidate threshold (1/16)^(1/8) ~ 0.71, below DEDUP_THRESHOLD
+ROWS = NUM_PERM // BANDS
+
+_rng = np.random.RandomState(1)
+# Fixed seed: band hashes must be the same in every process that reads or writes the index.
+_PERM_A = _rng.randint(0, np.iinfo(np.uint64).max, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.randint(0, np.iinfo(np.uint64).max, size=NUM_PERM, dtype=np.uint64)
+
+
+@dataclass
+class Fingerprint:
+    shingles: Set[int]
+    bands: List[Tuple[int, int]]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def shingles(text: str) -> Set[int]:
+    text = _normalize(text)
+    if len(text) <= SHINGLE_CHARS:
+        return {_hash32(text)}
+    return {_hash32(text[i:i + SHINGLE_CHARS]) for i in range(len(text) - SHINGLE_CHARS + 1)}
+
+
+def _hash32(s: str) -> int:
+    return zlib.crc32(s.encode())
+
+
+def signature(shingle_set: Set[int]) -> np.ndarray:
+    hv = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+    # Multiply-shift hashing: (a * x + b) mod 2**64 (numpy wraps), keep the high 32 bits.
+    permuted = (np.outer(hv, _PERM_A) + _PERM_B) >> np.uint64(32)
+    return permuted.min(axis=0)
+
+
+def band_hashes(sig: np.ndarray) -> List[Tuple[int, int]]:
+    bands = []
+    for band in range(BANDS):
+        # The band number is part of the hash, so a bucket value alone identifies (band, rows).
+        rows = sig[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(rows, digest_size=8, salt=band.to_bytes(8, "little")).digest()
+        bands.append((band, int.from_bytes(digest, "little", signed=True)))
+    return bands
+
+
+def fingerprint(question: str, answer: str) -> Fingerprint:
+    sh = shingles(f"{question} {answer}")
+    return Fingerprint(shingles=sh, bands=band_hashes(signature(sh)))
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_duplicate(db: Session, fp: Fingerprint, threshold: float = DEDUP_THRESHOLD) -> Optional[int]:
+    """Id of the most similar indexed cluster head at or above `threshold`, if any."""
+    buckets = select(QALSHBucket.qa_item_id_fk).where(QALSHBucket.bucket.in_([bucket for _, bucket in fp.bands]))
+    candidates = select(QAItem.id, QAItem.question, QAItem.answer).where(
+        QAItem.id.in_(buckets), QAItem.duplicate_of_id.is_(None)
+    )
+    best_id, best = None, threshold
+    for row in db.execute(candidates):
+        similarity = jaccard(fp.shingles, shingles(f"{row.question} {row.answer}"))
+        if similarity >= best:
+            best_id, best = row.id, similarity
+    return best_id
+
+
+def index_qa(db: Session, qa_id: int, fp: Fingerprint) -> None:
+    db.execute(insert(QALSHBucket), [{"qa_item_id_fk": qa_id, "band": band, "bucket": bucket} for band, bucket in fp.bands])
+
+
+def scan(db: Session, batch_size: int = 1000, delete_duplicates: bool = False) -> Dict[str, int]:
+    """Rebuild the LSH index over the whole table, in id order, clustering near-duplicates.
+
+    With `delete_duplicates`, pending duplicates nobody has annotated are removed instead of
+    being clustered.
+    """
+    from .counters import rebuild
+
+    db.execute(delete(QALSHBucket))
+    db.query(QAItem).filter(QAItem.duplicate_of_id.is_not(None)).update(
+        {QAItem.duplicate_of_id: None}, synchronize_session=False
+    )
+    annotated = select(Annotation.qa_item_id_fk)
+    stats = {"scanned": 0, "clustered": 0, "deleted": 0}
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(QAItem.id, QAItem.question, QAItem.answer, QAItem.status,
+                   QAItem.id.in_(annotated).label("annotated"))
+            .where(QAItem.id > last_id)
+            .order_by(QAItem.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            fp = fingerprint(row.question, row.answer)
+            head = find_duplicate(db, fp)
+            if head is None:
+                index_qa(db, row.id, fp)
+            elif delete_duplicates and row.status == QAStatus.pending and not row.annotated:
+                db.execute(delete(QAItem).where(QAItem.id == row.id))
+                stats["deleted"] += 1
+            else:
+                db.query(QAItem).filter(QAItem.id == row.id).update(
+                    {QAItem.duplicate_of_id: head}, synchronize_session=False
+                )
+                stats["clustered"] += 1
+        db.commit()
+        stats["scanned"] += len(rows)
+        last_id = rows[-1].id
+    # Clusters were rebuilt from scratch and only cluster heads are counted, so recount.
+    rebuild(db)
+    db.commit()
+    return stats
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Rebuild the near-duplicate index over existing QA items")
+    p.add_argument("command", choices=["scan", "show"])
+    p.add_argument("--delete", action="store_true", help="delete unannotated pending duplicates instead of clustering")
+    p.add_argument("--batch-size", type=int, default=1000)
+    args = p.parse_args()
+
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        if args.command == "scan":
+            print(scan(db, args.batch_size, args.delete))
+        else:
+            clusters = (
+                db.query(QAItem.duplicate_of_id, func.count())
+                .filter(QAItem.duplicate_of_id.is_not(None))
+                .group_by(QAItem.duplicate_of_id)
+                .order_by(func.count().desc())
+                .limit(20)
+            )
+            for head, size in clusters:
+                print(f"#{head}: {size} duplicates  {db.get(QAItem, head).question}")
@@ -0,0 +1,135 @@
+"""In-process pub/sub behind ``GET /events`` (server-sent events).
+
+Writers attach events to their session with :func:`queue`; they are published when the session
+commits and dropped when it rolls back, so dashboards never see changes that didn't happen.
+Events are numbered and the last DOCQA_EVENTS_HISTORY are kept, so a reconnecting EventSource
+(``Last-Event-ID``) gets what it missed. A subscriber too slow to drain DOCQA_EVENTS_QUEUE events
+gets a single ``resync`` event instead and reloads.
+
+Only commits made in this process are pushed: QAs generated by a separate
+``python -m backend.jobs`` reach dashboards on their next reload.
+"""
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, List, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .models import UserRole
+
+
+EVENTS_QUEUE = int(os.getenv("DOCQA_EVENTS_QUEUE", "1000"))
+EVENTS_HISTORY = int(os.getenv("DOCQA_EVENTS_HISTORY", "1000"))
+KEEPALIVE_SECONDS = 15.0
+RETRY_MILLISECONDS = 3000
+
+_SESSION_KEY = "docqa_events"
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: Any
+    role: Optional[UserRole] = None  # None: every authenticated user
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, role: UserRole, size: int):
+        self.loop = loop
+        self.role = role
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=size)
+
+    def wants(self, ev: Event) -> bool:
+        return ev.role is None or ev.role == self.role
+
+    def _put(self, ev: Event) -> None:
+        # Runs on the subscriber's loop.
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            ev = Event(ev.id, "resync", {})
+        self.queue.put_nowait(ev)
+
+
+class EventBus:
+    def __init__(self, queue_size: int = EVENTS_QUEUE, history: int = EVENTS_HISTORY):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history: Deque[Event] = deque(maxlen=history)
+        self._subscribers: Set[Subscriber] = set()
+
+    def publish(self, type_: str, data: Any, role: Optional[UserRole] = None) -> int:
+        """Thread-safe; subscribers receive events in id order."""
+        with self._lock:
+            self._last_id += 1
+            ev = Event(self._last_id, type_, data, role)
+            self._history.append(ev)
+            for sub in list(self._subscribers):
+                if not sub.wants(ev):
+                    continue
+                try:
+                    sub.loop.call_soon_threadsafe(sub._put, ev)
+                except RuntimeError:  # loop closed without unsubscribing
+                    self._subscribers.discard(sub)
+            return ev.id
+
+    def subscribe(self, role: UserRole, last_event_id: Optional[int] = None) -> Tuple[Subscriber, List[Event]]:
+        """Register a subscriber on the running loop; returns it with the events to replay first."""
+        sub = Subscriber(asyncio.get_running_loop(), role, self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+            if last_event_id is None or last_event_id == self._last_id:
+                return sub, []
+            oldest = self._history[0].id if self._history else self._last_id + 1
+            if not oldest - 1 <= last_event_id < self._last_id:
+                # Older than the history, or issued before a restart: the client has to reload.
+                return sub, [Event(self._last_id, "resync", {})]
+            return sub, [ev for ev in self._history if ev.id > last_event_id and sub.wants(ev)]
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+
+bus = EventBus()
+
+
+def queue(db, type_: str, data: Any, role: Optional[UserRole] = None) -> None:
+    """Publish `data` once `db` (a Session or AsyncSession) commits."""
+    db.info.setdefault(_SESSION_KEY, []).append((type_, data, role))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    for type_, data, role in session.info.pop(_SESSION_KEY, ()):
+        bus.publish(type_, data, role)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+async def stream(sub: Subscriber, replay: List[Event]):
+    """Body of the text/event-stream response; the caller unsubscribes when it ends."""
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+    for ev in replay:
+        yield ev.encode()
+    while True:
+        try:
+            ev = await asyncio.wait_for(sub.queue.get(), KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            # Comment line: keeps proxies from closing an idle connection.
+            yield ": keepalive\n\n"
+            continue
+        yield ev.encode()
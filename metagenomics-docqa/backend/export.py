@@ -0,0 +1,185 @@
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .database import ReadSessionLocal
+from .models import Annotation, Category, Chunk, QAItem, QAStatus
+
+
+EXPORT_BATCH_ROWS = 10_000
+
+SCHEMA = pa.schema([
+    ("qa_id", pa.int64()),
+    ("chunk_id", pa.string()),
+    ("source_url", pa.string()),
+    ("chunk_content", pa.large_string()),
+    ("question", pa.string()),
+    ("answer", pa.string()),
+    ("edited_question", pa.string()),
+    ("edited_answer", pa.string()),
+    ("score", pa.float64()),
+    ("category", pa.string()),
+    ("status", pa.string()),
+    ("created_at", pa.timestamp("us")),
+])
+
+
+@dataclass
+class DatasetFilters:
+    status: Optional[QAStatus] = QAStatus.ready
+    source_url: Optional[str] = None
+    category: Optional[str] = None
+    min_score: Optional[float] = None
+    since: Optional[datetime] = None
+
+
+def dataset_query(filters: DatasetFilters):
+    # Latest annotation per QA item, by id (ids are assigned in insertion order).
+    latest = (
+        select(Annotation.qa_item_id_fk, func.max(Annotation.id).label("annotation_id"))
+        .group_by(Annotation.qa_item_id_fk)
+        .subquery()
+    )
+    stmt = (
+        select(
+            QAItem.id,
+            Chunk.chunk_id,
+            Chunk.source_url,
+            Chunk.content,
+            QAItem.question,
+            QAItem.answer,
+            Annotation.edited_question,
+            Annotation.edited_answer,
+            Annotation.score,
+            Category.name,
+            QAItem.status,
+            QAItem.created_at,
+        )
+        .join(Chunk, Chunk.id == QAItem.chunk_id_fk)
+        .outerjoin(latest, latest.c.qa_item_id_fk == QAItem.id)
+        .outerjoin(Annotation, Annotation.id == latest.c.annotation_id)
+        .outerjoin(Category, Category.id == QAItem.category_id_fk)
+        .order_by(QAItem.id)
+    )
+    if filters.status is not None:
+        stmt = stmt.where(QAItem.status == filters.status)
+    if filters.source_url is not None:
+        stmt = stmt.where(Chunk.source_url == filters.source_url)
+    if filters.category is not None:
+        stmt = stmt.where(Category.name == filters.category)
+    if filters.min_score is not None:
+        stmt = stmt.where(Annotation.score >= filters.min_score)
+    if filters.since is not None:
+        stmt = stmt.where(QAItem.created_at >= filters.since)
+    return stmt
+
+
+def iter_record_batches(db: Session, filters: DatasetFilters, batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    result = db.execute(dataset_query(filters).execution_options(yield_per=batch_rows))
+    for rows in result.partitions():
+        columns: List[List[Any]] = [list(col) for col in zip(*rows)]
+        status_col = SCHEMA.get_field_index("status")
+        columns[status_col] = [status.value for status in columns[status_col]]
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, SCHEMA)], schema=SCHEMA
+        )
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _open_writer(fmt: str, sink):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, SCHEMA, compression="zstd")
+    if fmt == "arrow":
+        # IPC file format (not stream) so consumers can pa.memory_map() the result.
+        return pa.ipc.new_file(sink, SCHEMA)
+    raise ValueError(f"unsupported format: {fmt}")
+
+
+def _write_batch(writer, batch: pa.RecordBatch) -> None:
+    if isinstance(writer, pq.ParquetWriter):
+        # one row group per fetched batch
+        writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer.write_batch(batch)
+
+
+def stream_dataset(fmt: str, filters: DatasetFilters, batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """Yield the encoded file incrementally; both formats only append, so no seeking is needed."""
+    sink = _ChunkSink()
+    with ReadSessionLocal() as db:
+        writer = _open_writer(fmt, pa.PythonFile(sink, mode="w"))
+        for batch in iter_record_batches(db, filters, batch_rows):
+            _write_batch(writer, batch)
+            data = sink.drain()
+            if data:
+                yield data
+        writer.close()
+    yield sink.drain()
+
+
+def write_dataset(path: str, fmt: str, filters: DatasetFilters, batch_rows: int = EXPORT_BATCH_ROWS) -> int:
+    rows = 0
+    with ReadSessionLocal() as db:
+        writer = _open_writer(fmt, path)
+        for batch in iter_record_batches(db, filters, batch_rows):
+            _write_batch(writer, batch)
+            rows += batch.num_rows
+        writer.close()
+    return rows
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Write the QA training dataset as Parquet or Arrow IPC")
+    p.add_argument("out")
+    p.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    p.add_argument("--status", choices=[s.value for s in QAStatus] + ["any"], default="ready")
+    p.add_argument("--source-url")
+    p.add_argument("--category")
+    p.add_argument("--min-score", type=float)
+    p.add_argument("--since", type=datetime.fromisoformat)
+    p.add_argument("--batch-rows", type=int, default=EXPORT_BATCH_ROWS)
+    args = p.parse_args()
+
+    filters = DatasetFilters(
+        status=None if args.status == "any" else QAStatus(args.status),
+        source_url=args.source_url,
+        category=args.category,
+        min_score=args.min_score,
+        since=args.since,
+    )
+    written = write_dataset(args.out, args.format, filters, args.batch_rows)
+    print(f"wrote {written} rows to {args.out}")
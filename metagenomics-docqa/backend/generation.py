@@ -0,0 +1,101 @@
+"""Data generation counter: one number that changes whenever reviewable data does.
+
+Every transaction that writes one of TRACKED_TABLES through a Session bumps ``data_generation``
+once, just before it commits, so the counter moves exactly when readers can see the new data.
+Statements that only touch bookkeeping columns (review leases) opt out with
+``execution_options(bump_generation=False)``. ``backend.models`` imports this module, so the hooks
+are active in every process that writes.
+"""
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from .models import DataGeneration
+
+
+GENERATION_TTL_SECONDS = float(os.getenv("DOCQA_GENERATION_TTL", "1"))
+TRACKED_TABLES = frozenset({"qa_items", "annotations", "chunks", "categories", "qa_status_counters", "users"})
+
+_CHANGED_KEY = "docqa_data_changed"
+_BUMPED_KEY = "docqa_data_generation"
+
+
+class GenerationClock:
+    """Last generation this process knows of, re-read from the database after the TTL."""
+
+    def __init__(self, ttl: float = GENERATION_TTL_SECONDS):
+        self.ttl = ttl
+        self._value = -1
+        self._read_at = 0.0
+        self._lock = threading.Lock()
+
+    def fresh(self) -> Optional[int]:
+        if self._value < 0 or time.monotonic() - self._read_at >= self.ttl:
+            return None
+        return self._value
+
+    def observe(self, value: int) -> int:
+        # Generations only move forward; a slow reader must not set the clock back.
+        with self._lock:
+            self._value = max(self._value, value)
+            self._read_at = time.monotonic()
+            return self._value
+
+
+clock = GenerationClock()
+
+
+def current_generation(db: Session) -> int:
+    """Commits in this process are seen at once, other processes' within DOCQA_GENERATION_TTL seconds."""
+    cached = clock.fresh()
+    if cached is not None:
+        return cached
+    value = db.execute(select(DataGeneration.value).where(DataGeneration.id == 1)).scalar()
+    return clock.observe(value or 0)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_flushed(session: Session, _flush_context, _instances) -> None:
+    if _CHANGED_KEY in session.info:
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if getattr(obj, "__tablename__", None) in TRACKED_TABLES:
+            session.info[_CHANGED_KEY] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statements(state) -> None:
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush.
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    if state.statement.table.name in TRACKED_TABLES and state.execution_options.get("bump_generation", True):
+        state.session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_generation(session: Session) -> None:
+    session.flush()  # commit flushes after this hook; rows still pending must count too
+    if session.info.pop(_CHANGED_KEY, False):
+        session.info[_BUMPED_KEY] = session.execute(
+            update(DataGeneration).where(DataGeneration.id == 1)
+            .values(value=DataGeneration.value + 1)
+            .returning(DataGeneration.value)
+        ).scalar()
+
+
+@event.listens_for(Session, "after_commit")
+def _observe_bump(session: Session) -> None:
+    value = session.info.pop(_BUMPED_KEY, None)
+    if value is not None:
+        clock.observe(value)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
+    session.info.pop(_BUMPED_KEY, None)
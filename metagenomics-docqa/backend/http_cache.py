@@ -0,0 +1,92 @@
+"""Conditional GETs and an in-process response cache for read endpoints.
+
+Responses are tagged ``ETag: "<generation>"`` (see backend/generation.py): a matching
+``If-None-Match`` gets a 304, and JSON bodies already built for the current generation are served
+from memory. Entries from older generations are dropped as soon as a newer one is seen.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from .generation import current_generation
+
+
+RESPONSE_CACHE_BYTES = int(float(os.getenv("DOCQA_RESPONSE_CACHE_MB", "64")) * 1024 * 1024)
+MAX_ENTRY_FRACTION = 8  # one body may use at most 1/8 of the cache
+CACHE_CONTROL = "private, no-cache"  # browsers keep the body but revalidate on every use
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._generation = -1
+        self._entries: "OrderedDict[str, Tuple[int, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, generation: int) -> Optional[bytes]:
+        with self._lock:
+            if generation > self._generation:
+                self._invalidate_before(generation)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, generation: int, body: bytes) -> None:
+        if len(body) * MAX_ENTRY_FRACTION > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._entries[key] = (generation, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _invalidate_before(self, generation: int) -> None:
+        # Caller holds the lock.
+        self._generation = generation
+        for key in [key for key, (gen, _) in self._entries.items() if gen < generation]:
+            self.size -= len(self._entries.pop(key)[1])
+
+
+response_cache = ResponseCache()
+
+
+def etag_for(generation: int) -> str:
+    return f'"{generation}"'
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 response when the request's If-None-Match already names `etag`."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    if etag in tags or "*" in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+async def cached_json(request: Request, db, build: Callable[[], Awaitable[Any]]) -> Response:
+    """Serve the JSON `build()` returns, revalidated and cached by data generation; `db` is an AsyncSession."""
+    generation = await db.run_sync(current_generation)
+    etag = etag_for(generation)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    key = f"{request.url.path}?{'&'.join(sorted(f'{k}={v}' for k, v in request.query_params.multi_items()))}"
+    body = response_cache.get(key, generation)
+    if body is None:
+        body = JSONResponse(await build()).body
+        response_cache.put(key, generation, body)
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
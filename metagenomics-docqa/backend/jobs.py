@@ -0,0 +1,462 @@
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, case, update
+from sqlalchemy.orm import Session, undefer
+
+from . import dedup, events, metrics, verify
+from .counters import record_created
+from .database import AsyncSessionLocal, SessionLocal
+from .models import Chunk, IngestJob, IngestJobItem, JobStatus, QAItem, UserRole
+from .llm_cache import agenerate_qas_cached, astream_qas_cached, generate_qas_cached
+from .pipeline import LLM_STREAM
+
+
+logger = logging.getLogger(__name__)
+
+QA_WORKERS = int(os.getenv("DOCQA_QA_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("DOCQA_JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = float(os.getenv("DOCQA_JOB_POLL_SECONDS", "2"))
+# A running item older than this is taken to be orphaned by a process that died; keep it well above
+# the slowest generation (timeout x retries), since other live processes share the queue.
+JOB_STALE_SECONDS = float(os.getenv("DOCQA_JOB_STALE_SECONDS", "900"))
+# "thread": one OS thread per worker; "async": asyncio tasks on the API's event loop
+WORKER_MODE = os.getenv("DOCQA_WORKER_MODE", "thread")
+
+
+def enqueue_chunks(db: Session, job: IngestJob, chunk_ids: Iterable[int]) -> int:
+    # Caller owns the transaction; items become visible to workers on commit.
+    rows = [{"job_id_fk": job.id, "chunk_id_fk": cid, "status": JobStatus.queued} for cid in chunk_ids]
+    if rows:
+        db.execute(IngestJobItem.__table__.insert(), rows)
+        db.query(IngestJob).filter(IngestJob.id == job.id).update(
+            {IngestJob.total_chunks: IngestJob.total_chunks + len(rows)}, synchronize_session=False
+        )
+        _queue_job_event(db, job.id)
+    return len(rows)
+
+
+def _stale_running():
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    return and_(IngestJobItem.status == JobStatus.running, IngestJobItem.started_at < cutoff)
+
+
+def claim_next_item(db: Session) -> Optional[int]:
+    next_id = (
+        db.query(IngestJobItem.id)
+        .filter(IngestJobItem.status == JobStatus.queued)
+        .order_by(IngestJobItem.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    claimed = db.execute(
+        update(IngestJobItem)
+        .where(IngestJobItem.id == next_id, IngestJobItem.status == JobStatus.queued)
+        .values(status=JobStatus.running, attempts=IngestJobItem.attempts + 1, started_at=datetime.utcnow())
+        .returning(IngestJobItem.id, IngestJobItem.job_id_fk)
+    ).first()
+    if claimed is None:
+        db.rollback()
+        # Queue empty: take back items orphaned by a process that died, without waiting for a restart.
+        if requeue_interrupted(db):
+            return claim_next_item(db)
+        return None
+    db.query(IngestJob).filter(IngestJob.id == claimed.job_id_fk, IngestJob.started_at.is_(None)).update(
+        {IngestJob.started_at: datetime.utcnow()}, synchronize_session=False
+    )
+    started = db.query(IngestJob).filter(
+        IngestJob.id == claimed.job_id_fk, IngestJob.status == JobStatus.queued
+    ).update({IngestJob.status: JobStatus.running}, synchronize_session=False)
+    if started:
+        _queue_job_event(db, claimed.job_id_fk)
+    db.commit()
+    return claimed.id
+
+
+def _finish_job_if_done(db: Session, job_id: int) -> None:
+    # Single UPDATE so concurrent workers and the uploader can't both miss the final transition.
+    done = IngestJob.processed_chunks + IngestJob.failed_chunks >= IngestJob.total_chunks
+    db.execute(
+        update(IngestJob)
+        .where(IngestJob.id == job_id, IngestJob.status.in_([JobStatus.queued, JobStatus.running]), done)
+        .values(
+            status=case(
+                (and_(IngestJob.total_chunks > 0, IngestJob.failed_chunks == IngestJob.total_chunks), JobStatus.failed),
+                else_=JobStatus.completed,
+            ),
+            finished_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _queue_job_event(db: Session, job_id: int) -> None:
+    # Callers bump the job's counters with synchronize_session=False; reload them for the summary.
+    job = db.get(IngestJob, job_id, populate_existing=True)
+    events.queue(db, "job", job_summary(job), role=UserRole.provider)
+
+
+def _store_qas(db: Session, chunk_id: int, source_url: str, qas: list) -> int:
+    existing = {q for (q,) in db.query(QAItem.question).filter(QAItem.chunk_id_fk == chunk_id)}
+    items = []
+    for qa in qas:
+        if qa["question"] in existing:
+            continue
+        existing.add(qa["question"])
+        item = QAItem(chunk_id_fk=chunk_id, question=qa["question"], answer=qa["answer"])
+        if dedup.DEDUP_MODE != "off":
+            # Overlapping chunk windows make the LLM repeat itself; see backend/dedup.py.
+            fp = dedup.fingerprint(qa["question"], qa["answer"])
+            item.duplicate_of_id = dedup.find_duplicate(db, fp)
+            if item.duplicate_of_id is not None and dedup.DEDUP_MODE == "drop":
+                continue
+            db.add(item)
+            db.flush()
+            if item.duplicate_of_id is None:
+                dedup.index_qa(db, item.id, fp)
+        else:
+            db.add(item)
+        items.append(item)
+    if items:
+        db.flush()
+        events.queue(db, "qa_created", {
+            "chunk_id": chunk_id, "source_url": source_url, "ids": [item.id for item in items],
+        })
+    # Clustered duplicates are hidden from review, so only cluster heads and unique QAs are counted.
+    record_created(db, source_url, sum(1 for item in items if item.duplicate_of_id is None))
+    return len(items)
+
+
+@dataclass
+class WorkItem:
+    item_id: int
+    job_id: int
+    chunk_id: int
+    attempts: int
+    content: str
+    source_url: str
+    bypass_cache: bool
+
+
+def load_work_item(db: Session, item_id: int) -> WorkItem:
+    item = db.get(IngestJobItem, item_id)
+    chunk = db.get(Chunk, item.chunk_id_fk, options=[undefer(Chunk.content)])
+    return WorkItem(
+        item_id=item.id,
+        job_id=item.job_id_fk,
+        chunk_id=chunk.id,
+        attempts=item.attempts,
+        content=chunk.content,
+        source_url=chunk.source_url,
+        bypass_cache=item.job.bypass_cache,
+    )
+
+
+def store_streamed_qas(db: Session, work: WorkItem, qas: list) -> int:
+    """Store QAs while the generation is still streaming; the item stays running until complete_item."""
+    created = _store_qas(db, work.chunk_id, work.source_url, qas)
+    if created:
+        db.query(IngestJob).filter(IngestJob.id == work.job_id).update(
+            {IngestJob.qa_generated: IngestJob.qa_generated + created}, synchronize_session=False
+        )
+        _queue_job_event(db, work.job_id)
+    db.commit()
+    return created
+
+
+def _finish_attempt(db: Session, work: WorkItem, **values) -> bool:
+    """End the attempt `work` was loaded for. False if the item was requeued as stale and claimed
+    again meanwhile; that newer attempt then owns the item and its job counters."""
+    return bool(db.execute(
+        update(IngestJobItem)
+        .where(
+            IngestJobItem.id == work.item_id,
+            IngestJobItem.status == JobStatus.running,
+            IngestJobItem.attempts == work.attempts,
+        )
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount)
+
+
+def complete_item(db: Session, work: WorkItem, qas: list, streamed: int = 0) -> int:
+    # `streamed`: QAs already stored (and counted on the job) by store_streamed_qas.
+    created = _store_qas(db, work.chunk_id, work.source_url, qas)
+    metrics.QAS_PER_CHUNK.observe(created + streamed)
+    if not _finish_attempt(
+        db, work, status=JobStatus.completed, qa_generated=created + streamed, error="",
+        finished_at=datetime.utcnow(),
+    ):
+        db.commit()
+        return created
+    db.query(IngestJob).filter(IngestJob.id == work.job_id).update(
+        {
+            IngestJob.processed_chunks: IngestJob.processed_chunks + 1,
+            IngestJob.qa_generated: IngestJob.qa_generated + created,
+        },
+        synchronize_session=False,
+    )
+    _finish_job_if_done(db, work.job_id)
+    _queue_job_event(db, work.job_id)
+    db.commit()
+    return created
+
+
+def fail_item(db: Session, work: WorkItem, exc: Exception) -> None:
+    logger.warning("QA generation failed for job %s item %s: %s", work.job_id, work.item_id, exc)
+    error = str(exc)[:2000]
+    if work.attempts < JOB_MAX_ATTEMPTS:
+        _finish_attempt(db, work, status=JobStatus.queued, error=error)
+    elif _finish_attempt(db, work, status=JobStatus.failed, error=error, finished_at=datetime.utcnow()):
+        db.query(IngestJob).filter(IngestJob.id == work.job_id).update(
+            {IngestJob.failed_chunks: IngestJob.failed_chunks + 1}, synchronize_session=False
+        )
+        _finish_job_if_done(db, work.job_id)
+        _queue_job_event(db, work.job_id)
+    db.commit()
+
+
+def process_item(item_id: int) -> None:
+    with SessionLocal() as db:
+        work = load_work_item(db, item_id)
+    # The LLM call runs outside any transaction so slow generations never hold the DB.
+    try:
+        qas = generate_qas_cached(work.content, bypass=work.bypass_cache)
+        with SessionLocal() as db:
+            complete_item(db, work, qas)
+    except Exception as exc:
+        with SessionLocal() as db:
+            fail_item(db, work, exc)
+        return
+    if verify.VERIFY_MODE != "off":
+        # After the item is completed: a verifier failure leaves QAs unverified, not the chunk failed.
+        try:
+            with SessionLocal() as db:
+                verify.verify_chunk(db, work.chunk_id)
+        except Exception:
+            logger.exception("Verification failed for chunk %s", work.chunk_id)
+
+
+async def process_item_async(item_id: int) -> None:
+    async with AsyncSessionLocal() as db:
+        work = await db.run_sync(load_work_item, item_id)
+    try:
+        if LLM_STREAM:
+            # Each QA is committed as it arrives, so reviewers see it before the generation ends.
+            streamed = 0
+            async for qa in astream_qas_cached(work.content, bypass=work.bypass_cache):
+                async with AsyncSessionLocal() as db:
+                    streamed += await db.run_sync(store_streamed_qas, work, [qa])
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(complete_item, work, [], streamed)
+        else:
+            qas = await agenerate_qas_cached(work.content, bypass=work.bypass_cache)
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(complete_item, work, qas)
+    except Exception as exc:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(fail_item, work, exc)
+        return
+    if verify.VERIFY_MODE != "off":
+        try:
+            async with AsyncSessionLocal() as db:
+                await verify.averify_chunk(db, work.chunk_id)
+        except Exception:
+            logger.exception("Verification failed for chunk %s", work.chunk_id)
+
+
+def close_ingestion(db: Session, job: IngestJob) -> None:
+    """Mark an upload as fully enqueued; workers may have finished every item already."""
+    db.execute(
+        update(IngestJob)
+        .where(IngestJob.id == job.id)
+        .values(status=case((IngestJob.started_at.is_not(None), JobStatus.running), else_=JobStatus.queued))
+        .execution_options(synchronize_session=False)
+    )
+    _finish_job_if_done(db, job.id)
+    db.flush()
+    db.refresh(job)
+    events.queue(db, "job", job_summary(job), role=UserRole.provider)
+
+
+def requeue_interrupted(db: Session) -> int:
+    # Items left running by a process that died mid-generation. Other processes (python -m
+    # backend.jobs, uvicorn --workers) may still be generating younger ones, so only stale items
+    # move, and the guard sits in the UPDATE itself.
+    count = db.query(IngestJobItem).filter(_stale_running()).update(
+        {IngestJobItem.status: JobStatus.queued}, synchronize_session=False
+    )
+    db.commit()
+    return count
+
+
+def retry_failed_items(db: Session, job: IngestJob) -> int:
+    count = db.query(IngestJobItem).filter(
+        IngestJobItem.job_id_fk == job.id, IngestJobItem.status == JobStatus.failed
+    ).update(
+        {IngestJobItem.status: JobStatus.queued, IngestJobItem.attempts: 0, IngestJobItem.finished_at: None},
+        synchronize_session=False,
+    )
+    if count:
+        job.failed_chunks -= count
+        job.status = JobStatus.running if job.started_at else JobStatus.queued
+        job.finished_at = None
+        events.queue(db, "job", job_summary(job), role=UserRole.provider)
+    return count
+
+
+def job_summary(job: IngestJob) -> dict:
+    done = job.processed_chunks + job.failed_chunks
+    elapsed = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+    chunks_per_second = done / elapsed if elapsed else 0.0
+    remaining = job.total_chunks - done
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "status": job.status.value,
+        "total_chunks": job.total_chunks,
+        "processed_chunks": job.processed_chunks,
+        "failed_chunks": job.failed_chunks,
+        "qa_generated": job.qa_generated,
+        "progress": done / job.total_chunks if job.total_chunks else 1.0,
+        "elapsed_seconds": elapsed,
+        "chunks_per_second": chunks_per_second,
+        "qas_per_second": job.qa_generated / elapsed if elapsed else 0.0,
+        "eta_seconds": remaining / chunks_per_second if chunks_per_second and remaining else None,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class WorkerPool:
+    def __init__(self, size: int = QA_WORKERS):
+        self.size = size
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self) -> None:
+        if self._threads or self.size <= 0:
+            return
+        with SessionLocal() as db:
+            requeued = requeue_interrupted(db)
+        if requeued:
+            logger.info("Requeued %d interrupted job items", requeued)
+        self._stop.clear()
+        for i in range(self.size):
+            t = threading.Thread(target=self._run, name=f"qa-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with SessionLocal() as db:
+                    item_id = claim_next_item(db)
+            except Exception:
+                logger.exception("Failed to claim job item")
+                item_id = None
+            if item_id is None:
+                self._wake.wait(JOB_POLL_SECONDS)
+                self._wake.clear()
+                continue
+            try:
+                process_item(item_id)
+            except Exception:
+                logger.exception("Worker crashed on job item %s", item_id)
+
+
+class AsyncWorkerPool:
+    """Worker pool as asyncio tasks on the app's event loop (DOCQA_WORKER_MODE=async).
+
+    Each task holds no thread while it waits on the LLM, so DOCQA_QA_WORKERS can be set in the
+    hundreds; concurrency per LLM backend is still capped by its ``max`` (see llm_backends.py).
+    """
+
+    def __init__(self, size: int = QA_WORKERS):
+        self.size = size
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+        self._wake: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        if self._tasks or self.size <= 0:
+            return
+        async with AsyncSessionLocal() as db:
+            requeued = await db.run_sync(requeue_interrupted)
+        if requeued:
+            logger.info("Requeued %d interrupted job items", requeued)
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(), name=f"qa-worker-{i}") for i in range(self.size)]
+
+    async def stop(self, timeout: float | None = None) -> None:
+        self._stopping = True
+        self.notify()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        self._tasks = []
+
+    def notify(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                async with AsyncSessionLocal() as db:
+                    item_id = await db.run_sync(claim_next_item)
+            except Exception:
+                logger.exception("Failed to claim job item")
+                item_id = None
+            if item_id is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            try:
+                await process_item_async(item_id)
+            except Exception:
+                logger.exception("Worker crashed on job item %s", item_id)
+
+
+pool = AsyncWorkerPool() if WORKER_MODE == "async" else WorkerPool()
+
+
+if __name__ == "__main__":
+    # Standalone worker process: `python -m backend.jobs` alongside an API started with DOCQA_QA_WORKERS=0.
+    import signal
+
+    from .database import init_database
+
+    logging.basicConfig(level=logging.INFO)
+    init_database()
+    standalone = WorkerPool(int(os.getenv("DOCQA_STANDALONE_WORKERS", str(max(QA_WORKERS, 1)))))
+    standalone.start()
+    stopped = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    stopped.wait()
+    standalone.stop()
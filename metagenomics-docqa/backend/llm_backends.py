@@ -0,0 +1,241 @@
+"""Registry of LLM backends with weighted least-outstanding-requests balancing.
+
+DOCQA_LLM_BACKENDS lists the Ollama endpoints, comma separated, each optionally followed by
+``weight=`` and ``max=`` (in-flight cap) settings. Every backend serves OLLAMA_MODEL, the model the
+LLM response cache is keyed on:
+
+    DOCQA_LLM_BACKENDS="http://gpu1:11434 weight=4 max=16, http://cpu1:11434 max=2"
+
+Each request goes to the routable backend with the fewest in-flight requests per unit of weight.
+A backend failing DOCQA_LLM_BREAKER_FAILURES requests in a row (transport errors, timeouts and 5xx
+responses; a 4xx is the request's fault) is taken out of rotation for DOCQA_LLM_BREAKER_SECONDS,
+then gets a single trial request (circuit breaker); a background probe
+(``GET /api/tags``) takes unreachable hosts out before requests time out on them. Sync and async
+clients share one pool per process, so caps hold across both worker modes.
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import metrics
+
+
+LLM_BREAKER_FAILURES = int(os.getenv("DOCQA_LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_SECONDS = float(os.getenv("DOCQA_LLM_BREAKER_SECONDS", "30"))
+LLM_PROBE_SECONDS = float(os.getenv("DOCQA_LLM_PROBE_SECONDS", "10"))
+PROBE_TIMEOUT_SECONDS = 2.0
+WAIT_POLL_SECONDS = 1.0  # re-check while waiting, so circuits that reach half-open are noticed
+
+
+class NoBackendAvailable(httpx.TransportError):
+    """Every backend is failing its health probe or has its circuit open."""
+
+
+@dataclass(eq=False)
+class LLMBackend:
+    url: str
+    model: str
+    weight: float = 1.0
+    max_concurrency: int = 4
+    outstanding: int = 0
+    failures: int = 0  # consecutive
+    open_until: float = 0.0
+    trial_inflight: bool = False
+    healthy: bool = True
+
+    @property
+    def host(self) -> str:
+        return urlsplit(self.url).netloc
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """Whether `exc` counts toward the circuit breaker: the host, not the request, is at fault."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def parse_backends(spec: str, default_url: str, default_model: str, default_max: int) -> List[LLMBackend]:
+    backends = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        url, *options = entry.split()
+        settings = dict(option.split("=", 1) for option in options)
+        if "model" in settings:
+            # Cached responses are keyed on OLLAMA_MODEL; another model's output would be stored under it.
+            raise ValueError(f"per-backend model= is not supported, all backends serve OLLAMA_MODEL: {entry!r}")
+        unknown = set(settings) - {"weight", "max"}
+        if unknown:
+            raise ValueError(f"unknown LLM backend option(s) {sorted(unknown)} in {entry!r}")
+        backends.append(LLMBackend(
+            url=url.rstrip("/"),
+            model=default_model,
+            weight=float(settings.get("weight", 1)),
+            max_concurrency=int(settings.get("max", default_max)),
+        ))
+    return backends or [LLMBackend(url=default_url.rstrip("/"), model=default_model, max_concurrency=default_max)]
+
+
+def _wake(waiter: "asyncio.Future") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class BackendPool:
+    def __init__(
+        self,
+        backends: List[LLMBackend],
+        breaker_failures: int = LLM_BREAKER_FAILURES,
+        breaker_seconds: float = LLM_BREAKER_SECONDS,
+    ):
+        if not backends:
+            raise ValueError("no LLM backends configured")
+        self.backends = backends
+        self.breaker_failures = breaker_failures
+        self.breaker_seconds = breaker_seconds
+        self._cond = threading.Condition()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+        for backend in backends:
+            self._publish(backend, time.monotonic())
+
+    @property
+    def capacity(self) -> int:
+        return sum(backend.max_concurrency for backend in self.backends)
+
+    def _routable(self, backend: LLMBackend, now: float) -> bool:
+        if not backend.healthy:
+            return False
+        return backend.failures < self.breaker_failures or now >= backend.open_until
+
+    def _has_room(self, backend: LLMBackend) -> bool:
+        if backend.outstanding >= backend.max_concurrency:
+            return False
+        # Half-open: one trial request at a time.
+        return backend.failures < self.breaker_failures or not backend.trial_inflight
+
+    def _publish(self, backend: LLMBackend, now: float) -> None:
+        metrics.LLM_BACKEND_OUTSTANDING.labels(backend.host).set(backend.outstanding)
+        metrics.LLM_BACKEND_UP.labels(backend.host).set(int(self._routable(backend, now)))
+
+    def _pick(self, avoid: Optional[LLMBackend]) -> Optional[Tuple[LLMBackend, bool]]:
+        # Caller holds the lock. None means every routable backend is at its cap.
+        now = time.monotonic()
+        routable = [backend for backend in self.backends if self._routable(backend, now)]
+        if not routable:
+            raise NoBackendAvailable("no healthy LLM backend")
+        free = [backend for backend in routable if self._has_room(backend)]
+        if not free:
+            return None
+        # A retry goes to another backend when one has room.
+        preferred = [backend for backend in free if backend is not avoid] or free
+        backend = min(preferred, key=lambda b: (b.outstanding + 1) / b.weight)
+        backend.outstanding += 1
+        trial = backend.failures >= self.breaker_failures
+        if trial:
+            backend.trial_inflight = True
+        self._publish(backend, now)
+        return backend, trial
+
+    def acquire(self, avoid: Optional[LLMBackend] = None) -> Tuple[LLMBackend, bool]:
+        """Reserve a slot: ``(backend, trial)``, where `trial` marks the half-open trial request.
+
+        Pass `trial` back to release(), so only the trial's own outcome ends the half-open state.
+        """
+        with self._cond:
+            while True:
+                picked = self._pick(avoid)
+                if picked is not None:
+                    return picked
+                self._cond.wait(WAIT_POLL_SECONDS)
+
+    async def aacquire(self, avoid: Optional[LLMBackend] = None) -> Tuple[LLMBackend, bool]:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                picked = self._pick(avoid)
+                if picked is not None:
+                    return picked
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await asyncio.wait({waiter}, timeout=WAIT_POLL_SECONDS)
+            with self._cond:
+                if (loop, waiter) in self._async_waiters:
+                    self._async_waiters.remove((loop, waiter))
+
+    def release(self, backend: LLMBackend, ok: bool, trial: bool = False) -> None:
+        """Return a slot; `ok` is False only for failures that count toward the breaker."""
+        with self._cond:
+            backend.outstanding -= 1
+            if trial:
+                backend.trial_inflight = False
+            if ok:
+                backend.failures = 0
+            else:
+                backend.failures += 1
+                if backend.failures >= self.breaker_failures:
+                    backend.open_until = time.monotonic() + self.breaker_seconds
+            self._publish(backend, time.monotonic())
+            self._notify()
+
+    def _notify(self) -> None:
+        # Caller holds the lock.
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def probe(self, client: httpx.Client) -> None:
+        for backend in self.backends:
+            try:
+                healthy = client.get(f"{backend.url}/api/tags").status_code < 500
+            except httpx.HTTPError:
+                healthy = False
+            with self._cond:
+                backend.healthy = healthy
+                self._publish(backend, time.monotonic())
+                self._notify()
+
+    def start_probing(self, interval: float = LLM_PROBE_SECONDS) -> None:
+        if interval <= 0 or self._prober is not None:
+            return
+
+        def loop():
+            with httpx.Client(timeout=PROBE_TIMEOUT_SECONDS) as client:
+                while True:
+                    self.probe(client)
+                    if self._stop.wait(interval):
+                        return
+
+        self._prober = threading.Thread(target=loop, name="llm-probe", daemon=True)
+        self._prober.start()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            now = time.monotonic()
+            return [
+                {
+                    "url": backend.url,
+                    "model": backend.model,
+                    "weight": backend.weight,
+                    "max_concurrency": backend.max_concurrency,
+                    "outstanding": backend.outstanding,
+                    "healthy": backend.healthy,
+                    "consecutive_failures": backend.failures,
+                    "circuit": "closed" if backend.failures < self.breaker_failures
+                    else ("open" if now < backend.open_until else "half_open"),
+                }
+                for backend in self.backends
+            ]
+
+    def close(self) -> None:
+        self._stop.set()
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .database import AsyncSessionLocal, SessionLocal, dialect_insert
+from .models import LLMCacheEntry
+from .pipeline import (
+    OLLAMA_MODEL, QG_PROMPT_VERSION, acall_ollama, astream_qas_for_chunk, build_qg_prompt, call_ollama, extract_qas,
+)
+
+
+LLM_CACHE_ENABLED = os.getenv("DOCQA_LLM_CACHE", "1") != "0"
+LLM_CACHE_MAX_BYTES = int(os.getenv("DOCQA_LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# The size check runs every few stores and trims to a fraction of the budget, not on every write.
+LLM_CACHE_EVICT_EVERY = 50
+LLM_CACHE_LOW_WATERMARK = 0.9
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+stats = CacheStats()
+
+
+def cache_key(content: str, model: str = OLLAMA_MODEL, prompt_version: str = QG_PROMPT_VERSION) -> str:
+    h = hashlib.sha256()
+    for part in (model, prompt_version, content):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def lookup(db: Session, key: str) -> Optional[List[Dict[str, str]]]:
+    entry = db.get(LLMCacheEntry, key)
+    if entry is None:
+        return None
+    entry.hits += 1
+    entry.last_used_at = datetime.utcnow()
+    db.commit()
+    return json.loads(entry.parsed_response)
+
+
+def store(db: Session, key: str, raw: str, parsed: List[Dict[str, str]]) -> None:
+    parsed_json = json.dumps(parsed, ensure_ascii=False)
+    now = datetime.utcnow()
+    values = {
+        "model": OLLAMA_MODEL,
+        "prompt_version": QG_PROMPT_VERSION,
+        "raw_response": raw,
+        "parsed_response": parsed_json,
+        "size_bytes": len(raw.encode("utf-8")) + len(parsed_json.encode("utf-8")),
+        "last_used_at": now,
+    }
+    # Upsert: two workers can miss on the same content and both store it.
+    stmt = dialect_insert(db, LLMCacheEntry).values(key=key, hits=0, created_at=now, **values)
+    db.execute(stmt.on_conflict_do_update(index_elements=[LLMCacheEntry.key], set_=values))
+    db.commit()
+
+
+def evict(db: Session, max_bytes: int = LLM_CACHE_MAX_BYTES) -> int:
+    """Drop least recently used entries once the cache exceeds its byte budget."""
+    total = db.query(func.coalesce(func.sum(LLMCacheEntry.size_bytes), 0)).scalar()
+    if total <= max_bytes:
+        return 0
+    target = int(max_bytes * LLM_CACHE_LOW_WATERMARK)
+    victims = []
+    for key, size in db.query(LLMCacheEntry.key, LLMCacheEntry.size_bytes).order_by(LLMCacheEntry.last_used_at):
+        if total <= target:
+            break
+        victims.append(key)
+        total -= size
+    db.query(LLMCacheEntry).filter(LLMCacheEntry.key.in_(victims)).delete(synchronize_session=False)
+    db.commit()
+    stats.incr("evictions", len(victims))
+    return len(victims)
+
+
+def generate_qas_cached(content: str, bypass: bool = False) -> List[Dict[str, str]]:
+    """generate_qas_for_chunk behind the response cache; ``bypass`` forces a fresh call and refreshes the entry."""
+    if not LLM_CACHE_ENABLED:
+        return extract_qas(call_ollama(build_qg_prompt(content)))
+    key = cache_key(content)
+    if bypass:
+        stats.incr("bypassed")
+    else:
+        with SessionLocal() as db:
+            cached = lookup(db, key)
+        if cached is not None:
+            stats.incr("hits")
+            return cached
+        stats.incr("misses")
+
+    raw = call_ollama(build_qg_prompt(content))
+    parsed = extract_qas(raw)
+    # Empty generations are not cached so a retry gets another chance at the model.
+    if parsed:
+        with SessionLocal() as db:
+            store(db, key, raw, parsed)
+            stats.incr("stores")
+            if stats.stores % LLM_CACHE_EVICT_EVERY == 0:
+                evict(db)
+    return parsed
+
+
+async def agenerate_qas_cached(content: str, bypass: bool = False) -> List[Dict[str, str]]:
+    """Async variant of generate_qas_cached for the asyncio worker mode."""
+    if not LLM_CACHE_ENABLED:
+        return extract_qas(await acall_ollama(build_qg_prompt(content)))
+    key = cache_key(content)
+    if bypass:
+        stats.incr("bypassed")
+    else:
+        async with AsyncSessionLocal() as db:
+            cached = await db.run_sync(lookup, key)
+        if cached is not None:
+            stats.incr("hits")
+            return cached
+        stats.incr("misses")
+
+    raw = await acall_ollama(build_qg_prompt(content))
+    parsed = extract_qas(raw)
+    if parsed:
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(store, key, raw, parsed)
+            stats.incr("stores")
+            if stats.stores % LLM_CACHE_EVICT_EVERY == 0:
+                await db.run_sync(evict)
+    return parsed
+
+
+async def astream_qas_cached(content: str, bypass: bool = False) -> AsyncIterator[Dict[str, str]]:
+    """Streaming variant of agenerate_qas_cached: yields each QA as soon as it is parsed."""
+    if not LLM_CACHE_ENABLED:
+        async for qa in astream_qas_for_chunk(content):
+            yield qa
+        return
+    key = cache_key(content)
+    if bypass:
+        stats.incr("bypassed")
+    else:
+        async with AsyncSessionLocal() as db:
+            cached = await db.run_sync(lookup, key)
+        if cached is not None:
+            stats.incr("hits")
+            for qa in cached:
+                yield qa
+            return
+        stats.incr("misses")
+
+    parsed = []
+    async for qa in astream_qas_for_chunk(content):
+        parsed.append(qa)
+        yield qa
+    if parsed:
+        # The stream is cut after the last QA needed, so the QA lines are all of the response worth keeping.
+        raw = "\n".join(json.dumps(qa, ensure_ascii=False) for qa in parsed)
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(store, key, raw, parsed)
+            stats.incr("stores")
+            if stats.stores % LLM_CACHE_EVICT_EVERY == 0:
+                await db.run_sync(evict)
+
+
+def cache_summary(db: Session) -> Dict[str, float]:
+    entries, size_bytes, stored_hits = db.query(
+        func.count(LLMCacheEntry.key),
+        func.coalesce(func.sum(LLMCacheEntry.size_bytes), 0),
+        func.coalesce(func.sum(LLMCacheEntry.hits), 0),
+    ).one()
+    return {
+        "enabled": LLM_CACHE_ENABLED,
+        "entries": entries,
+        "size_bytes": size_bytes,
+        "max_bytes": LLM_CACHE_MAX_BYTES,
+        "lifetime_hits": stored_hits,
+        **stats.as_dict(),
+    }
@@ -3,17 +3,49 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
+from contextlib import asynccontextmanager
 import os
 
-from .database import init_database
+from .compression import CompressionMiddleware
+from .counters import ensure_initialized as ensure_counters
+from .database import SessionLocal, dispose_async_engines, init_database
+from .jobs import AsyncWorkerPool, pool as job_pool
+from .metrics import MetricsMiddleware, instrument_engines, metrics_endpoint
+from .pipeline import (
+    close_async_llm_client, close_backend_pool, close_llm_client, get_async_llm_client, init_llm_client,
+)
 from . import auth as auth_router
 from .routers import upload as upload_router
 from .routers import review as review_router
 from .routers import provider as provider_router
+from .routers import search as search_router
+from .routers import events as events_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # QA generation workers live as long as the app; DOCQA_QA_WORKERS=0 leaves it to `python -m backend.jobs`.
+    with SessionLocal() as db:
+        ensure_counters(db)
+    init_llm_client()
+    get_async_llm_client()
+    if isinstance(job_pool, AsyncWorkerPool):
+        await job_pool.start()
+    else:
+        job_pool.start()
+    yield
+    if isinstance(job_pool, AsyncWorkerPool):
+        await job_pool.stop(timeout=5)
+    else:
+        job_pool.stop(timeout=5)
+    close_llm_client()
+    await close_async_llm_client()
+    close_backend_pool()
+    await dispose_async_engines()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="MetaDB DocQA Platform")
+    app = FastAPI(title="MetaDB DocQA Platform", lifespan=lifespan)
 
     # CORS for frontend usage
     app.add_middleware(
@@ -23,6 +55,11 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # Inside metrics, so request timings include compression.
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    instrument_engines()
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 
     # Setup static files and templates
     base_dir = os.path.dirname(os.path.dirname(__file__))
@@ -38,6 +75,8 @@ def create_app() -> FastAPI:
     app.include_router(upload_router.router, prefix="/upload", tags=["upload"])
     app.include_router(review_router.router, prefix="/review", tags=["review"])
     app.include_router(provider_router.router, prefix="/provider", tags=["provider"])
+    app.include_router(search_router.router, prefix="/search", tags=["search"])
+    app.include_router(events_router.router, tags=["events"])
 
     # Frontend routes
     @app.get("/", response_class=HTMLResponse)
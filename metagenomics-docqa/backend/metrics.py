@@ -0,0 +1,144 @@
+"""Prometheus metrics for HTTP routes, database queries, LLM calls and QA generation.
+
+Exposed at ``/metrics``. Database timings come from engine events and are also attributed to the
+HTTP request that issued them (through a context variable), which is how N+1 patterns show up:
+as a route whose ``docqa_http_request_db_queries`` grows with page size.
+"""
+import time
+from contextvars import ContextVar
+from typing import List, Optional, Pattern, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import compile_path
+
+
+HTTP_REQUESTS = Counter("docqa_http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_LATENCY = Histogram("docqa_http_request_duration_seconds", "HTTP request latency", ["method", "route"])
+HTTP_IN_FLIGHT = Gauge("docqa_http_requests_in_flight", "HTTP requests being served", ["method", "route"])
+HTTP_DB_QUERIES = Histogram(
+    "docqa_http_request_db_queries", "SQL statements per HTTP request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+HTTP_DB_SECONDS = Histogram("docqa_http_request_db_seconds", "Time in SQL statements per HTTP request", ["route"])
+
+DB_QUERY_SECONDS = Histogram(
+    "docqa_db_query_duration_seconds", "SQL statement latency", ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5),
+)
+
+LLM_REQUEST_SECONDS = Histogram(
+    "docqa_llm_request_duration_seconds", "LLM HTTP call latency (per attempt)", ["host"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+LLM_FAILURES = Counter("docqa_llm_failures_total", "Failed LLM HTTP attempts", ["host", "reason"])
+LLM_STREAMS_STOPPED_EARLY = Counter(
+    "docqa_llm_streams_stopped_early_total", "Streamed generations cut off once enough QAs were parsed"
+)
+LLM_BACKEND_OUTSTANDING = Gauge("docqa_llm_backend_outstanding", "In-flight LLM requests per backend", ["host"])
+LLM_BACKEND_UP = Gauge("docqa_llm_backend_up", "1 if the backend is healthy and its circuit is not open", ["host"])
+_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144)
+LLM_PROMPT_BYTES = Histogram("docqa_llm_prompt_bytes", "Prompt size", buckets=_SIZE_BUCKETS)
+LLM_RESPONSE_BYTES = Histogram("docqa_llm_response_bytes", "Response size", buckets=_SIZE_BUCKETS)
+
+VERIFY_VERDICTS = Counter("docqa_verify_verdicts_total", "Faithfulness verdicts", ["stage", "verdict"])
+
+QAS_PER_CHUNK = Histogram("docqa_qas_per_chunk", "QAs stored per processed chunk", buckets=(0, 1, 2, 3, 5, 10))
+
+# [statement count, seconds] for the HTTP request being served, if any.
+_request_db: ContextVar[Optional[List[float]]] = ContextVar("docqa_request_db", default=None)
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute(name))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("docqa_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(name: str):
+    histogram = DB_QUERY_SECONDS.labels(name)
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["docqa_query_start"].pop()
+        histogram.observe(elapsed)
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+    return after
+
+
+def instrument_engines() -> None:
+    from .database import async_engine, async_read_engine, engine, read_engine
+
+    instrument_engine(engine, "write")
+    instrument_engine(read_engine, "read")
+    instrument_engine(async_engine.sync_engine, "write")
+    instrument_engine(async_read_engine.sync_engine, "read")
+
+
+def observe_llm_attempt(host: str, seconds: float, error: Optional[BaseException] = None) -> None:
+    LLM_REQUEST_SECONDS.labels(host).observe(seconds)
+    if error is not None:
+        response = getattr(error, "response", None)
+        reason = f"status_{response.status_code}" if response is not None else type(error).__name__
+        LLM_FAILURES.labels(host, reason).inc()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streamed responses are timed until their last chunk."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[List[Tuple[Pattern, str]]] = None
+
+    def _route(self, scope) -> str:
+        # Label by path template rather than raw path, to keep label cardinality bounded. Templates
+        # come from the OpenAPI paths because included routers only know their own unprefixed paths.
+        if self._routes is None:
+            paths = sorted(scope["app"].openapi()["paths"], key=lambda path: ("{" in path, path))
+            self._routes = [(compile_path(path)[0], path) for path in paths]
+        for regex, path in self._routes:
+            if regex.match(scope["path"]):
+                return path
+        return "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = self._route(scope)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route, str(status[0])).inc()
+            HTTP_DB_QUERIES.labels(route).observe(stats[0])
+            HTTP_DB_SECONDS.labels(route).observe(stats[1])
+            in_flight.dec()
+            _request_db.reset(token)
+
+
+async def metrics_endpoint(_request: Request) -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
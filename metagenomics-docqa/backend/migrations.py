@@ -0,0 +1,203 @@
+"""Versioned schema changes applied on top of ``Base.metadata.create_all``.
+
+create_all only creates missing tables, so anything that alters an existing table (new indexes,
+columns, triggers) is added here as a numbered step. Steps must be idempotent: on a fresh database
+the models already declare the same objects.
+"""
+import argparse
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+
+def _execute(conn: Connection, *ddl: str) -> None:
+    for stmt in ddl:
+        conn.execute(text(stmt))
+
+
+def add_column_if_missing(conn: Connection, table: str, column: str, ddl: str) -> None:
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _m001_hot_path_indexes(conn: Connection) -> None:
+    # qa_items.chunk_id_fk lookups are already served by the uq_chunk_question (chunk_id_fk, question) index.
+    _execute(
+        conn,
+        "CREATE INDEX IF NOT EXISTS ix_qa_items_status_id ON qa_items (status, id)",
+        "CREATE INDEX IF NOT EXISTS ix_annotations_qa_item_id_fk ON annotations (qa_item_id_fk)",
+        "CREATE INDEX IF NOT EXISTS ix_chunks_source_url ON chunks (source_url)",
+        "CREATE INDEX IF NOT EXISTS ix_ingest_job_items_status_id ON ingest_job_items (status, id)",
+    )
+
+
+def _m002_review_leases(conn: Connection) -> None:
+    add_column_if_missing(conn, "qa_items", "leased_by_user_id", "INTEGER REFERENCES users (id)")
+    add_column_if_missing(conn, "qa_items", "lease_expires_at", "TIMESTAMP")
+    _execute(
+        conn,
+        "CREATE INDEX IF NOT EXISTS ix_qa_items_status_chunk_id ON qa_items (status, chunk_id_fk, id)",
+        "CREATE INDEX IF NOT EXISTS ix_qa_items_leased_by_user_id ON qa_items (leased_by_user_id)",
+    )
+
+
+def _fts5_external(
+    conn: Connection, table: str, source: str, columns: List[str], content: str = "", read: str = ""
+) -> None:
+    # External-content FTS5 table over `source`, kept in sync by triggers (the pattern from the FTS5 docs).
+    # `content` is the table or view FTS5 reads rows back from (default `source`); `read` an SQL function
+    # the triggers apply to each stored value, so both see the same text.
+    cols = ", ".join(columns)
+    new = ", ".join(f"{read}(new.{c})" if read else f"new.{c}" for c in columns)
+    old = ", ".join(f"{read}(old.{c})" if read else f"old.{c}" for c in columns)
+    _execute(
+        conn,
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({cols}, content='{content or source}', "
+        "content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {table} (rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {table} ({table}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {table} ({table}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {table} (rowid, {cols}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {table} ({table}) VALUES ('rebuild')",
+    )
+
+
+def _tsvector_column(conn: Connection, table: str, columns: List[str]) -> None:
+    # Stored generated tsvector (earlier columns weigh more in ts_rank) plus a GIN index.
+    vector = " || ".join(
+        f"setweight(to_tsvector('english', coalesce({c}, '')), '{w}')" for c, w in zip(columns, "ABCD")
+    )
+    _execute(
+        conn,
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)",
+    )
+
+
+def _m003_full_text_search(conn: Connection) -> None:
+    # Search objects are dialect-specific, so they live here rather than on the models (see backend/search.py).
+    if conn.dialect.name == "postgresql":
+        _tsvector_column(conn, "chunks", ["content"])
+        _tsvector_column(conn, "qa_items", ["question", "answer"])
+        _tsvector_column(conn, "annotations", ["edited_question", "edited_answer"])
+    else:
+        _fts5_external(conn, "chunks_fts", "chunks", ["content"])
+        _fts5_external(conn, "qa_items_fts", "qa_items", ["question", "answer"])
+        _fts5_external(conn, "annotations_fts", "annotations", ["edited_question", "edited_answer"])
+
+
+def _m004_duplicate_clusters(conn: Connection) -> None:
+    # qa_lsh_buckets itself is a new table and comes from create_all.
+    add_column_if_missing(conn, "qa_items", "duplicate_of_id", "INTEGER REFERENCES qa_items (id)")
+    _execute(conn, "CREATE INDEX IF NOT EXISTS ix_qa_items_duplicate_of_id ON qa_items (duplicate_of_id)")
+
+
+def _m005_verification(conn: Connection) -> None:
+    add_column_if_missing(conn, "qa_items", "verdict", "VARCHAR(16)")
+    add_column_if_missing(conn, "qa_items", "verdict_by", "VARCHAR(16)")
+    add_column_if_missing(conn, "qa_items", "overlap_score", "FLOAT")
+    add_column_if_missing(conn, "qa_items", "grounding_score", "FLOAT")
+    add_column_if_missing(conn, "qa_items", "verifier_notes", "TEXT")
+    add_column_if_missing(conn, "qa_items", "verified_at", "TIMESTAMP")
+
+
+def _m006_data_generation(conn: Connection) -> None:
+    # The table comes from create_all; its one row is seeded here.
+    _execute(conn, "INSERT INTO data_generation (id, value) SELECT 1, 0 WHERE NOT EXISTS (SELECT 1 FROM data_generation)")
+
+
+def _m007_compressed_chunks(conn: Connection) -> None:
+    # chunks.content may now hold zstd frames (backend/compression.py), so the FTS index reads it
+    # through docqa_unzstd(). PostgreSQL stores plain text and its tsvector column is unaffected.
+    if conn.dialect.name == "postgresql":
+        return
+    _execute(
+        conn,
+        "DROP TRIGGER IF EXISTS chunks_fts_ai",
+        "DROP TRIGGER IF EXISTS chunks_fts_ad",
+        "DROP TRIGGER IF EXISTS chunks_fts_au",
+        "DROP TABLE IF EXISTS chunks_fts",
+        "CREATE VIEW IF NOT EXISTS chunks_text AS SELECT id, docqa_unzstd(content) AS content FROM chunks",
+    )
+    _fts5_external(conn, "chunks_fts", "chunks", ["content"], content="chunks_text", read="docqa_unzstd")
+
+
+def _m008_chunk_index_from_app(conn: Connection) -> None:
+    # The chunks_fts triggers from migration 7 called docqa_unzstd(), which only the app's connections
+    # register, so any other writer (the sqlite3 shell, scripts) failed on INSERT INTO chunks. The index
+    # is now kept in sync by the code that writes chunks (backend/search.py: index_chunks, unindex_chunks).
+    if conn.dialect.name == "postgresql":
+        return
+    _execute(
+        conn,
+        "DROP TRIGGER IF EXISTS chunks_fts_ai",
+        "DROP TRIGGER IF EXISTS chunks_fts_ad",
+        "DROP TRIGGER IF EXISTS chunks_fts_au",
+    )
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "indexes for review, provider and job queue queries", _m001_hot_path_indexes),
+    (2, "review leases on qa_items", _m002_review_leases),
+    (3, "full-text search over chunks, QA items and annotations", _m003_full_text_search),
+    (4, "near-duplicate clusters on qa_items", _m004_duplicate_clusters),
+    (5, "faithfulness verification on qa_items", _m005_verification),
+    (6, "data generation counter for ETags", _m006_data_generation),
+    (7, "chunk search over compressed chunk text", _m007_compressed_chunks),
+    (8, "chunk search index maintained by the application", _m008_chunk_index_from_app),
+]
+
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(255) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def applied_versions(conn: Connection) -> set:
+    _ensure_version_table(conn)
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    applied: List[int] = []
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        # One transaction per step so a failure leaves earlier steps recorded.
+        try:
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                    {"v": version, "d": description, "t": datetime.utcnow()},
+                )
+        except IntegrityError:
+            # another process (API and standalone worker starting together) recorded it first
+            continue
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Apply or list schema migrations")
+    p.add_argument("command", choices=["upgrade", "status"])
+    args = p.parse_args()
+
+    from .database import engine, init_database
+
+    if args.command == "upgrade":
+        init_database()
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    for version, description, _ in MIGRATIONS:
+        print(f"{version:04d} {'applied' if version in done else 'pending':8s} {description}")
@@ -1,9 +1,10 @@
 import enum
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, String, Text, Boolean, Float, UniqueConstraint
+from sqlalchemy import BigInteger, Column, DateTime, Enum, ForeignKey, Index, Integer, LargeBinary, String, Text, Boolean, Float, UniqueConstraint
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
+from .compression import CompressedText
 from .database import Base
 
 
@@ -28,8 +29,9 @@ class Chunk(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     chunk_id: Mapped[str] = mapped_column(String(128), unique=True, index=True)
-    source_url: Mapped[str] = mapped_column(Text, default="")
-    content: Mapped[str] = mapped_column(Text)
+    source_url: Mapped[str] = mapped_column(Text, default="", index=True)
+    # zstd-compressed on SQLite and only loaded (and decompressed) when read; see backend/compression.py
+    content: Mapped[str] = mapped_column(CompressedText, deferred=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     qa_items = relationship("QAItem", back_populates="chunk")
@@ -60,6 +62,18 @@ class QAItem(Base):
     status: Mapped[QAStatus] = mapped_column(Enum(QAStatus), default=QAStatus.pending)
     created_by_user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Review lease from /review/next; an expired lease is free to be claimed again.
+    leased_by_user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # First QA of a near-duplicate cluster (backend/dedup.py); NULL for cluster heads and unique QAs.
+    duplicate_of_id: Mapped[int | None] = mapped_column(ForeignKey("qa_items.id"), nullable=True, index=True)
+    # Automatic faithfulness check (backend/verify.py); NULL verdict means not verified yet.
+    verdict: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    verdict_by: Mapped[str | None] = mapped_column(String(16), nullable=True)  # "lexical" or "llm"
+    overlap_score: Mapped[float | None] = mapped_column(Float, nullable=True)
+    grounding_score: Mapped[float | None] = mapped_column(Float, nullable=True)
+    verifier_notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+    verified_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     chunk = relationship("Chunk", back_populates="qa_items")
     category = relationship("Category")
@@ -67,14 +81,66 @@ class QAItem(Base):
 
     __table_args__ = (
         UniqueConstraint("chunk_id_fk", "question", name="uq_chunk_question"),
+        Index("ix_qa_items_status_id", "status", "id"),
+        Index("ix_qa_items_status_chunk_id", "status", "chunk_id_fk", "id"),
+        Index("ix_qa_items_leased_by_user_id", "leased_by_user_id"),
     )
 
 
+class QALSHBucket(Base):
+    """One MinHash LSH band hash of a QA item's text; see backend/dedup.py."""
+
+    __tablename__ = "qa_lsh_buckets"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    qa_item_id_fk: Mapped[int] = mapped_column(ForeignKey("qa_items.id", ondelete="CASCADE"), index=True)
+    band: Mapped[int] = mapped_column(Integer, nullable=False)
+    bucket: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index("ix_qa_lsh_buckets_bucket", "bucket"),
+    )
+
+
+class QAStatusCounter(Base):
+    """Running QA totals per status and chunk source, kept in step with qa_items writes."""
+
+    __tablename__ = "qa_status_counters"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    status: Mapped[QAStatus] = mapped_column(Enum(QAStatus), nullable=False)
+    source_url: Mapped[str] = mapped_column(Text, default="", nullable=False)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("status", "source_url", name="uq_counter_status_source"),
+    )
+
+
+class CompressionDict(Base):
+    """zstd dictionaries for CompressedText columns; the newest compresses new rows."""
+
+    __tablename__ = "compression_dicts"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)  # zstd dictionary id
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class DataGeneration(Base):
+    """Single row bumped by every commit that changes reviewable data; see backend/http_cache.py."""
+
+    __tablename__ = "data_generation"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+
 class Annotation(Base):
     __tablename__ = "annotations"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    qa_item_id_fk: Mapped[int] = mapped_column(ForeignKey("qa_items.id"))
+    qa_item_id_fk: Mapped[int] = mapped_column(ForeignKey("qa_items.id"), index=True)
     edited_question: Mapped[str] = mapped_column(Text)
     edited_answer: Mapped[str] = mapped_column(Text)
     score: Mapped[float] = mapped_column(Float, default=0.0)
@@ -84,5 +150,70 @@ class Annotation(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     qa_item = relationship("QAItem", back_populates="annotations")
+    annotator = relationship("User")
+
+
+class JobStatus(str, enum.Enum):
+    ingesting = "ingesting"  # upload still streaming chunks into the job
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    filename: Mapped[str] = mapped_column(String(255), default="")
+    status: Mapped[JobStatus] = mapped_column(Enum(JobStatus), default=JobStatus.queued, index=True)
+    total_chunks: Mapped[int] = mapped_column(Integer, default=0)
+    processed_chunks: Mapped[int] = mapped_column(Integer, default=0)
+    failed_chunks: Mapped[int] = mapped_column(Integer, default=0)
+    qa_generated: Mapped[int] = mapped_column(Integer, default=0)
+    bypass_cache: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_by_user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    items = relationship("IngestJobItem", back_populates="job")
+
+
+class IngestJobItem(Base):
+    __tablename__ = "ingest_job_items"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job_id_fk: Mapped[int] = mapped_column(ForeignKey("ingest_jobs.id"), index=True)
+    chunk_id_fk: Mapped[int] = mapped_column(ForeignKey("chunks.id"))
+    status: Mapped[JobStatus] = mapped_column(Enum(JobStatus), default=JobStatus.queued, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    qa_generated: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str] = mapped_column(Text, default="")
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    job = relationship("IngestJob", back_populates="items")
+    chunk = relationship("Chunk")
+
+    __table_args__ = (
+        Index("ix_ingest_job_items_status_id", "status", "id"),
+    )
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256(model, prompt version, content)
+    model: Mapped[str] = mapped_column(String(128))
+    prompt_version: Mapped[str] = mapped_column(String(32))
+    raw_response: Mapped[str] = mapped_column(CompressedText, deferred=True)
+    parsed_response: Mapped[str] = mapped_column(Text)  # json list of {question, answer}
+    size_bytes: Mapped[int] = mapped_column(Integer, default=0)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
 
 
+# Registers the Session hooks that bump DataGeneration; every process that writes imports this module.
+from . import generation  # noqa: E402,F401
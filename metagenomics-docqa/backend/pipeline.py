@@ -1,11 +1,37 @@
+import asyncio
+import json
 import os
-from typing import List, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, List, Dict, Iterable, Iterator, Optional, Tuple, Union
 
 import httpx
 
+from . import metrics
+from .llm_backends import BackendPool, LLMBackend, NoBackendAvailable, is_backend_failure, parse_backends
+
 
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "60"))
+# Several Ollama hosts, balanced by backend/llm_backends.py; unset means OLLAMA_BASE_URL alone.
+LLM_BACKENDS = os.getenv("DOCQA_LLM_BACKENDS", "")
+LLM_MAX_CONNECTIONS = int(os.getenv("DOCQA_LLM_MAX_CONNECTIONS", "32"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("DOCQA_LLM_KEEPALIVE_SECONDS", "60"))
+LLM_HOST_CONCURRENCY = int(os.getenv("DOCQA_LLM_HOST_CONCURRENCY", "4"))  # default per-backend cap
+LLM_RETRIES = int(os.getenv("DOCQA_LLM_RETRIES", "3"))
+LLM_BACKOFF_SECONDS = float(os.getenv("DOCQA_LLM_BACKOFF_SECONDS", "0.5"))
+# Async workers stream completions and stop the model once QAS_PER_CHUNK QAs have been parsed.
+LLM_STREAM = os.getenv("DOCQA_LLM_STREAM", "0") == "1"
+
+QAS_PER_CHUNK = 3
+
+# Ollama answers 500 for transient failures too (model load errors, runner crashes, out of memory).
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Bump whenever build_qg_prompt changes so cached generations from the old prompt are not reused.
+QG_PROMPT_VERSION = "1"
 
 
 def build_qg_prompt(content: str) -> str:
@@ -18,19 +44,311 @@ def build_qg_prompt(content: str) -> str:
     )
 
 
+class LLMClient:
+    """Long-lived Ollama client: pooled keep-alive connections, retries, and requests balanced over the backend pool."""
+
+    def __init__(
+        self,
+        pool: Optional[BackendPool] = None,
+        timeout: float = OLLAMA_TIMEOUT,
+        retries: int = LLM_RETRIES,
+        backoff: float = LLM_BACKOFF_SECONDS,
+    ):
+        self.pool = pool or get_backend_pool()
+        self.retries = retries
+        self.backoff = backoff
+        max_connections = max(LLM_MAX_CONNECTIONS, self.pool.capacity)
+        self._client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+            ),
+        )
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        metrics.LLM_PROMPT_BYTES.observe(len(prompt.encode()))
+        attempt = 0
+        backend: Optional[LLMBackend] = None
+        while True:
+            try:
+                backend, trial = self.pool.acquire(avoid=backend)
+            except NoBackendAvailable:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            payload = {"model": model or backend.model, "prompt": prompt, "stream": False}
+            ok = False
+            backend_failed = False
+            start = time.perf_counter()
+            try:
+                r = self._client.post(f"{backend.url}/api/generate", json=payload)
+                if r.status_code in RETRY_STATUS_CODES and attempt < self.retries:
+                    raise httpx.HTTPStatusError(f"retryable status {r.status_code}", request=r.request, response=r)
+                r.raise_for_status()
+                response = r.json().get("response", "")
+                ok = True
+            except (httpx.TransportError, httpx.HTTPStatusError) as exc:
+                backend_failed = is_backend_failure(exc)
+                metrics.observe_llm_attempt(backend.host, time.perf_counter() - start, exc)
+                retryable = isinstance(exc, httpx.TransportError) or exc.response.status_code in RETRY_STATUS_CODES
+                if not retryable or attempt >= self.retries:
+                    raise
+            finally:
+                self.pool.release(backend, not backend_failed, trial)
+            if ok:
+                metrics.observe_llm_attempt(backend.host, time.perf_counter() - start)
+                metrics.LLM_RESPONSE_BYTES.observe(len(response.encode()))
+                return response
+            # Back off after releasing the backend so waiting retries don't hold its slot.
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    def generate_batch(self, prompts: Iterable[str]) -> Iterator[Tuple[int, Union[str, Exception]]]:
+        """Send prompts concurrently and yield ``(index, response_or_error)`` as each completes."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(self.pool.capacity, 1) * 2, thread_name_prefix="llm-batch"
+                )
+            executor = self._executor
+        futures = {executor.submit(self.generate, prompt): i for i, prompt in enumerate(prompts)}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as exc:
+                yield futures[future], exc
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._client.close()
+
+
+_backend_pool: Optional[BackendPool] = None
+_backend_pool_lock = threading.Lock()
+
+
+def get_backend_pool() -> BackendPool:
+    global _backend_pool
+    with _backend_pool_lock:
+        if _backend_pool is None:
+            _backend_pool = BackendPool(
+                parse_backends(LLM_BACKENDS, OLLAMA_BASE_URL, OLLAMA_MODEL, LLM_HOST_CONCURRENCY)
+            )
+            _backend_pool.start_probing()
+        return _backend_pool
+
+
+def close_backend_pool() -> None:
+    global _backend_pool
+    with _backend_pool_lock:
+        if _backend_pool is not None:
+            _backend_pool.close()
+            _backend_pool = None
+
+
+_llm_client: Optional[LLMClient] = None
+_llm_client_lock = threading.Lock()
+
+
+def init_llm_client() -> LLMClient:
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient()
+        return _llm_client
+
+
+def get_llm_client() -> LLMClient:
+    # Scripts and standalone workers get a client lazily; the API creates it in its lifespan.
+    return _llm_client or init_llm_client()
+
+
+def close_llm_client() -> None:
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is not None:
+            _llm_client.close()
+            _llm_client = None
+
+
 def call_ollama(prompt: str) -> str:
-    url = f"{OLLAMA_BASE_URL}/api/generate"
-    payload = {"model": OLLAMA_MODEL, "prompt": prompt, "stream": False}
-    with httpx.Client(timeout=60) as client:
-        r = client.post(url, json=payload)
-        r.raise_for_status()
-        data = r.json()
-        return data.get("response", "")
+    return get_llm_client().generate(prompt)
 
 
-def parse_jsonl_lines(text: str) -> List[Dict]:
-    import json
+class AsyncLLMClient:
+    """asyncio counterpart of LLMClient: in-flight calls wait on sockets, not on threads."""
 
+    def __init__(
+        self,
+        pool: Optional[BackendPool] = None,
+        timeout: float = OLLAMA_TIMEOUT,
+        retries: int = LLM_RETRIES,
+        backoff: float = LLM_BACKOFF_SECONDS,
+    ):
+        self.pool = pool or get_backend_pool()
+        self.retries = retries
+        self.backoff = backoff
+        max_connections = max(LLM_MAX_CONNECTIONS, self.pool.capacity)
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+            ),
+        )
+
+    async def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        metrics.LLM_PROMPT_BYTES.observe(len(prompt.encode()))
+        attempt = 0
+        backend: Optional[LLMBackend] = None
+        while True:
+            try:
+                backend, trial = await self.pool.aacquire(avoid=backend)
+            except NoBackendAvailable:
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            payload = {"model": model or backend.model, "prompt": prompt, "stream": False}
+            ok = False
+            backend_failed = False
+            start = time.perf_counter()
+            try:
+                r = await self._client.post(f"{backend.url}/api/generate", json=payload)
+                if r.status_code in RETRY_STATUS_CODES and attempt < self.retries:
+                    raise httpx.HTTPStatusError(f"retryable status {r.status_code}", request=r.request, response=r)
+                r.raise_for_status()
+                response = r.json().get("response", "")
+                ok = True
+            except (httpx.TransportError, httpx.HTTPStatusError) as exc:
+                backend_failed = is_backend_failure(exc)
+                metrics.observe_llm_attempt(backend.host, time.perf_counter() - start, exc)
+                retryable = isinstance(exc, httpx.TransportError) or exc.response.status_code in RETRY_STATUS_CODES
+                if not retryable or attempt >= self.retries:
+                    raise
+            finally:
+                self.pool.release(backend, not backend_failed, trial)
+            if ok:
+                metrics.observe_llm_attempt(backend.host, time.perf_counter() - start)
+                metrics.LLM_RESPONSE_BYTES.observe(len(response.encode()))
+                return response
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    async def stream(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the completion in fragments as the backend produces them.
+
+        Closing the iterator early closes the connection, which makes Ollama stop generating.
+        Attempts are only retried before the first fragment has been yielded.
+        """
+        metrics.LLM_PROMPT_BYTES.observe(len(prompt.encode()))
+        attempt = 0
+        backend: Optional[LLMBackend] = None
+        while True:
+            try:
+                backend, trial = await self.pool.aacquire(avoid=backend)
+            except NoBackendAvailable:
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+                attempt += 1
+                continue
+            payload = {"model": model or backend.model, "prompt": prompt, "stream": True}
+            failed = False
+            backend_failed = False
+            done = False
+            received = 0
+            start = time.perf_counter()
+            try:
+                async with self._client.stream("POST", f"{backend.url}/api/generate", json=payload) as r:
+                    if r.status_code in RETRY_STATUS_CODES and attempt < self.retries:
+                        raise httpx.HTTPStatusError(f"retryable status {r.status_code}", request=r.request, response=r)
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        if not line.strip():
+                            continue
+                        event = json.loads(line)
+                        if event.get("error"):
+                            # An error reported mid-stream is the backend failing after its 200.
+                            backend_failed = True
+                            raise RuntimeError(f"LLM stream error: {event['error']}")
+                        fragment = event.get("response", "")
+                        if fragment:
+                            received += len(fragment.encode())
+                            yield fragment
+                        if event.get("done"):
+                            break
+                done = True
+            except (httpx.TransportError, httpx.HTTPStatusError) as exc:
+                failed = True
+                backend_failed = is_backend_failure(exc)
+                metrics.observe_llm_attempt(backend.host, time.perf_counter() - start, exc)
+                retryable = isinstance(exc, httpx.TransportError) or exc.response.status_code in RETRY_STATUS_CODES
+                if not retryable or received or attempt >= self.retries:
+                    raise
+            except Exception:
+                failed = True
+                raise
+            finally:
+                # A consumer that stops early (GeneratorExit) is a success, not a backend failure.
+                self.pool.release(backend, not backend_failed, trial)
+                if not failed:
+                    metrics.observe_llm_attempt(backend.host, time.perf_counter() - start)
+                    metrics.LLM_RESPONSE_BYTES.observe(received)
+                    if not done:
+                        metrics.LLM_STREAMS_STOPPED_EARLY.inc()
+            if done:
+                return
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    async def generate_batch(self, prompts: Iterable[str]) -> AsyncIterator[Tuple[int, Union[str, Exception]]]:
+        async def run(i: int, prompt: str):
+            try:
+                return i, await self.generate(prompt)
+            except Exception as exc:
+                return i, exc
+
+        for next_done in asyncio.as_completed([run(i, prompt) for i, prompt in enumerate(prompts)]):
+            yield await next_done
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_async_llm_client: Optional[AsyncLLMClient] = None
+
+
+def get_async_llm_client() -> AsyncLLMClient:
+    # Bound to the running event loop; the API creates it in its lifespan.
+    global _async_llm_client
+    if _async_llm_client is None:
+        _async_llm_client = AsyncLLMClient()
+    return _async_llm_client
+
+
+async def close_async_llm_client() -> None:
+    global _async_llm_client
+    if _async_llm_client is not None:
+        await _async_llm_client.aclose()
+        _async_llm_client = None
+
+
+async def acall_ollama(prompt: str) -> str:
+    return await get_async_llm_client().generate(prompt)
+
+
+def parse_jsonl_lines(text: str) -> List[Dict]:
     items: List[Dict] = []
     for line in text.splitlines():
         line = line.strip()
@@ -50,9 +368,7 @@ def parse_jsonl_lines(text: str) -> List[Dict]:
     return items
 
 
-def generate_qas_for_chunk(content: str) -> List[Dict[str, str]]:
-    prompt = build_qg_prompt(content)
-    raw = call_ollama(prompt)
+def extract_qas(raw: str) -> List[Dict[str, str]]:
     items = parse_jsonl_lines(raw)
     results: List[Dict[str, str]] = []
     for it in items:
@@ -60,6 +376,62 @@ def generate_qas_for_chunk(content: str) -> List[Dict[str, str]]:
         a = str(it.get("answer", "")).strip()
         if q and a:
             results.append({"question": q, "answer": a})
-    return results[:3]
+    return results[:QAS_PER_CHUNK]
+
+
+def generate_qas_for_chunk(content: str) -> List[Dict[str, str]]:
+    prompt = build_qg_prompt(content)
+    raw = call_ollama(prompt)
+    return extract_qas(raw)
+
+
+async def agenerate_qas_for_chunk(content: str) -> List[Dict[str, str]]:
+    raw = await acall_ollama(build_qg_prompt(content))
+    return extract_qas(raw)
+
+
+def parse_qa_line(line: str) -> Optional[Dict[str, str]]:
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(item, dict):
+        return None
+    q = str(item.get("question", "")).strip()
+    a = str(item.get("answer", "")).strip()
+    return {"question": q, "answer": a} if q and a else None
+
+
+async def astream_qas_for_chunk(content: str, limit: int = QAS_PER_CHUNK) -> AsyncIterator[Dict[str, str]]:
+    """Yield QAs as each JSON line of the streamed completion ends; stops the model after `limit` of them."""
+    stream = get_async_llm_client().stream(build_qg_prompt(content))
+    buffer = ""
+    found = 0
+    try:
+        async for fragment in stream:
+            buffer += fragment
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                qa = parse_qa_line(line)
+                if qa is not None:
+                    yield qa
+                    found += 1
+                    if found >= limit:
+                        return
+        qa = parse_qa_line(buffer)
+        if qa is not None:
+            yield qa
+    finally:
+        await stream.aclose()
+
+
+def generate_qas_for_chunks(contents: List[str]) -> Iterator[Tuple[int, Union[List[Dict[str, str]], Exception]]]:
+    """Batch variant of generate_qas_for_chunk; yields ``(index, qas_or_error)`` in completion order."""
+    prompts = [build_qg_prompt(content) for content in contents]
+    for i, raw in get_llm_client().generate_batch(prompts):
+        yield i, raw if isinstance(raw, Exception) else extract_qas(raw)
 
 
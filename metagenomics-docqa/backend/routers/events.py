@@ -0,0 +1,38 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+
+from .. import events
+from ..auth import STREAM_TICKET_SECONDS, AuthUser, create_stream_ticket, get_current_user, get_stream_user
+
+
+router = APIRouter()
+
+
+@router.post("/events/ticket")
+async def event_stream_ticket(user: AuthUser = Depends(get_current_user)):
+    """A ticket for ``GET /events?ticket=``, so the login token never appears in a URL."""
+    return {"ticket": create_stream_ticket(user), "expires_in": STREAM_TICKET_SECONDS}
+
+
+@router.get("/events")
+async def event_stream(
+    last_event_id: Optional[int] = Header(None),
+    after: Optional[int] = Query(None, description="Last-Event-ID for a stream reopened with a new ticket"),
+    user: AuthUser = Depends(get_stream_user),
+):
+    """Server-sent events: ``qa_status``, ``qa_created``, ``counters``, ``job`` (providers) and ``resync``."""
+    async def body():
+        sub, replay = events.bus.subscribe(user.role, last_event_id if last_event_id is not None else after)
+        try:
+            async for chunk in events.stream(sub, replay):
+                yield chunk
+        finally:
+            events.bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,64 +1,164 @@
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List, Dict, Any, AsyncIterator, Callable, Literal, Optional
 
-from fastapi import APIRouter, Depends, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import csv
+import io
 import json
 
+from .. import generation, http_cache
 from ..auth import require_role, get_current_user
-from ..database import get_db
+from ..database import AsyncReadSessionLocal, ReadSessionLocal, get_async_read_db
+from ..export import DatasetFilters, stream_dataset
 from ..models import UserRole, QAItem, QAStatus, User, Annotation
 from ..schemas import QAOut
 
 
 router = APIRouter()
 
+EXPORT_BATCH_SIZE = 1000
+
 
 @router.get("/ready", response_model=List[Dict[str, Any]])
-def list_ready(_user=Depends(require_role(UserRole.provider)), db: Session = Depends(get_db)):
-    items = db.query(QAItem).filter(QAItem.status == QAStatus.ready).all()
-    result = []
-    for item in items:
-        result.append({
-            "id": item.id,
-            "chunk_id": item.chunk_id_fk,
-            "question": item.question,
-            "answer": item.answer,
-            "status": item.status.value,
-            "created_at": item.created_at.isoformat()
-        })
-    return result
+async def list_ready(
+    request: Request,
+    _user=Depends(require_role(UserRole.provider)),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    async def build():
+        items = (await db.execute(select(QAItem).where(QAItem.status == QAStatus.ready))).scalars()
+        result = []
+        for item in items:
+            result.append({
+                "id": item.id,
+                "chunk_id": item.chunk_id_fk,
+                "question": item.question,
+                "answer": item.answer,
+                "status": item.status.value,
+                "created_at": item.created_at.isoformat()
+            })
+        return result
+
+    return await http_cache.cached_json(request, db, build)
+
+
+async def _iter_ready_rows() -> AsyncIterator[Dict[str, Any]]:
+    # The generator outlives the request handler, so it owns its session. yield_per streams rows
+    # through a server-side cursor instead of materializing the whole result.
+    async with AsyncReadSessionLocal() as db:
+        stmt = (
+            select(QAItem.id, QAItem.question, QAItem.answer, QAItem.created_at)
+            .where(QAItem.status == QAStatus.ready)
+            .order_by(QAItem.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for row in await db.stream(stmt):
+            yield {
+                "id": row.id,
+                "question": row.question,
+                "answer": row.answer,
+                "created_at": row.created_at.isoformat(),
+            }
+
+
+async def _batched(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    # Group small writes so each streamed chunk carries a useful amount of data.
+    buf: List[str] = []
+    async for line in lines:
+        buf.append(line)
+        if len(buf) >= EXPORT_BATCH_SIZE:
+            yield "".join(buf)
+            buf = []
+    if buf:
+        yield "".join(buf)
+
+
+async def _json_lines() -> AsyncIterator[str]:
+    yield "["
+    first = True
+    async for row in _iter_ready_rows():
+        yield ("\n  " if first else ",\n  ") + json.dumps(row, ensure_ascii=False)
+        first = False
+    yield "\n]\n"
+
+
+async def _jsonl_lines() -> AsyncIterator[str]:
+    async for row in _iter_ready_rows():
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+async def _csv_lines() -> AsyncIterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["id", "question", "answer", "created_at"])
+    async for row in _iter_ready_rows():
+        writer.writerow([row["id"], row["question"], row["answer"], row["created_at"]])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def _export_headers(etag: str, filename: str) -> Dict[str, str]:
+    # Exports are too big for the response cache; the ETag still saves re-downloading unchanged data.
+    return {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "ETag": etag,
+        "Cache-Control": http_cache.CACHE_CONTROL,
+    }
+
+
+async def _export_response(
+    request: Request, lines: Callable[[], AsyncIterator[str]], media_type: str, filename: str
+) -> Response:
+    async with AsyncReadSessionLocal() as db:
+        etag = http_cache.etag_for(await db.run_sync(generation.current_generation))
+    unchanged = http_cache.not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    return StreamingResponse(_batched(lines()), media_type=media_type, headers=_export_headers(etag, filename))
 
 
 @router.get("/export/json")
-def export_json(_user=Depends(require_role(UserRole.provider)), db: Session = Depends(get_db)):
-    items = db.query(QAItem).filter(QAItem.status == QAStatus.ready).all()
-    data = []
-    for item in items:
-        data.append({
-            "id": item.id,
-            "question": item.question,
-            "answer": item.answer,
-            "created_at": item.created_at.isoformat()
-        })
-    
-    return Response(
-        content=json.dumps(data, indent=2),
-        media_type="application/json",
-        headers={"Content-Disposition": "attachment; filename=ready_qas.json"}
-    )
+async def export_json(request: Request, _user=Depends(require_role(UserRole.provider))):
+    return await _export_response(request, _json_lines, "application/json", "ready_qas.json")
+
+
+@router.get("/export/jsonl")
+async def export_jsonl(request: Request, _user=Depends(require_role(UserRole.provider))):
+    return await _export_response(request, _jsonl_lines, "application/x-ndjson", "ready_qas.jsonl")
 
 
 @router.get("/export/csv")
-def export_csv(_user=Depends(require_role(UserRole.provider)), db: Session = Depends(get_db)):
-    items = db.query(QAItem).filter(QAItem.status == QAStatus.ready).all()
-    csv_content = "id,question,answer,created_at\n"
-    for item in items:
-        csv_content += f"{item.id},\"{item.question.replace('\"', '\"\"')}\",\"{item.answer.replace('\"', '\"\"')}\",{item.created_at.isoformat()}\n"
-    
-    return Response(
-        content=csv_content,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=ready_qas.csv"}
-    )
+async def export_csv(request: Request, _user=Depends(require_role(UserRole.provider))):
+    return await _export_response(request, _csv_lines, "text/csv", "ready_qas.csv")
 
 
+@router.get("/export/{fmt}")
+def export_columnar(
+    request: Request,
+    fmt: Literal["parquet", "arrow"],
+    status: Optional[QAStatus] = QAStatus.ready,
+    source_url: Optional[str] = None,
+    category: Optional[str] = None,
+    min_score: Optional[float] = None,
+    since: Optional[datetime] = None,
+    _user=Depends(require_role(UserRole.provider)),
+):
+    # Training dataset: QA joined with its chunk, latest annotation and category, one row group per batch.
+    # Encoding is CPU-bound, so this stays a sync generator that Starlette drains in its threadpool.
+    with ReadSessionLocal() as db:
+        etag = http_cache.etag_for(generation.current_generation(db))
+    unchanged = http_cache.not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    filters = DatasetFilters(status=status, source_url=source_url, category=category, min_score=min_score, since=since)
+    media_type = "application/vnd.apache.parquet" if fmt == "parquet" else "application/vnd.apache.arrow.file"
+    return StreamingResponse(
+        stream_dataset(fmt, filters),
+        media_type=media_type,
+        headers=_export_headers(etag, f"qa_dataset.{fmt}"),
+    )
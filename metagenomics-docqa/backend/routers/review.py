@@ -1,82 +1,384 @@
-from typing import List, Dict, Any
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Literal, Optional, Tuple
+import json
+import os
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager, selectinload
+from sqlalchemy import exists, func, insert, or_, select, update
 
+from .. import counters, events, http_cache
 from ..auth import get_current_user
-from ..database import get_db
-from ..models import QAItem, QAStatus, Annotation, User
-from ..schemas import QAOut, AnnotationIn, AnnotationOut
+from ..database import get_async_db, get_async_read_db
+from ..models import Chunk, QAItem, QAStatus, Annotation, User
+from ..schemas import QAOut, AnnotationIn, AnnotationOut, AnnotationBatchIn, LeaseRelease
 
 
 router = APIRouter()
 
 
 @router.get("/stats")
-def get_stats(db: Session = Depends(get_db), _user=Depends(get_current_user)):
-    total_qas = db.query(QAItem).count()
-    pending_qas = db.query(QAItem).filter(QAItem.status == QAStatus.pending).count()
-    ready_qas = db.query(QAItem).filter(QAItem.status == QAStatus.ready).count()
-    rejected_qas = db.query(QAItem).filter(QAItem.status == QAStatus.rejected).count()
-    
+async def get_stats(
+    request: Request,
+    source: Optional[str] = None,
+    by_source: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+    _user=Depends(get_current_user),
+):
+    # Served from qa_status_counters; `python -m backend.counters rebuild` resyncs it with qa_items.
+    async def build():
+        stats: Dict[str, Any] = await db.run_sync(counters.get_counts, source)
+        if by_source:
+            stats["sources"] = await db.run_sync(counters.get_counts_by_source)
+        return stats
+
+    return await http_cache.cached_json(request, db, build)
+
+
+PENDING_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+LEASE_SECONDS = int(os.getenv("DOCQA_REVIEW_LEASE_SECONDS", "600"))
+MAX_LEASE_BATCH = 200  # also MAX_LEASE_BATCH in frontend/static/js/app.js
+
+LEASE_ORDER = {
+    "age": (QAItem.id,),
+    "chunk": (QAItem.chunk_id_fk, QAItem.id),
+    "source": (Chunk.source_url, QAItem.chunk_id_fk, QAItem.id),
+}
+
+
+def _annotator_summary(annotations: List[Annotation]) -> Dict[str, Any]:
+    scores = [ann.score for ann in annotations]
     return {
-        "total": total_qas,
-        "pending": pending_qas,
-        "ready": ready_qas,
-        "rejected": rejected_qas
+        "count": len(annotations),
+        "avg_score": sum(scores) / len(scores) if scores else None,
+        "last_annotated_at": max(ann.created_at for ann in annotations).isoformat() if annotations else None,
     }
 
 
-@router.get("/pending", response_model=List[Dict[str, Any]])
-def list_pending(db: Session = Depends(get_db), _user=Depends(get_current_user)):
-    items = db.query(QAItem).filter(QAItem.status == QAStatus.pending).all()
-    result = []
-    for item in items:
-        annotations = db.query(Annotation).filter(Annotation.qa_item_id_fk == item.id).all()
-        annotators = []
-        for ann in annotations:
-            user = db.query(User).filter(User.id == ann.annotated_by_user_id).first()
-            if user:
-                annotators.append({
-                    "name": user.full_name or user.email,
-                    "date": ann.created_at.isoformat(),
-                    "score": ann.score
-                })
-        
-        result.append({
-            "id": item.id,
-            "chunk_id": item.chunk_id_fk,
-            "question": item.question,
-            "answer": item.answer,
-            "status": item.status.value,
-            "created_at": item.created_at.isoformat(),
-            "annotators": annotators
-        })
-    return result
+def _qa_summary(item: QAItem) -> Dict[str, Any]:
+    annotations = sorted(item.annotations, key=lambda ann: ann.created_at)
+    return {
+        "id": item.id,
+        "chunk_id": item.chunk_id_fk,
+        "chunk_ref": item.chunk.chunk_id,
+        "source_url": item.chunk.source_url,
+        "question": item.question,
+        "answer": item.answer,
+        "status": item.status.value,
+        "created_at": item.created_at.isoformat(),
+        "duplicate_of": item.duplicate_of_id,
+        "verification": None if item.verdict is None else {
+            "verdict": item.verdict,
+            "by": item.verdict_by,
+            "overlap_score": item.overlap_score,
+            "grounding_score": item.grounding_score,
+            "offending_claims": json.loads(item.verifier_notes) if item.verifier_notes else [],
+        },
+        "annotation_summary": _annotator_summary(annotations),
+        "annotators": [
+            {
+                "name": ann.annotator.full_name or ann.annotator.email,
+                "date": ann.created_at.isoformat(),
+                "score": ann.score,
+            }
+            for ann in annotations
+            if ann.annotator is not None
+        ],
+    }
+
+
+def _with_review_details(stmt):
+    return stmt.join(Chunk, Chunk.id == QAItem.chunk_id_fk).options(
+        contains_eager(QAItem.chunk),
+        selectinload(QAItem.annotations).joinedload(Annotation.annotator),
+    )
+
+
+def _lease_free(now: datetime):
+    return or_(QAItem.lease_expires_at.is_(None), QAItem.lease_expires_at < now)
+
+
+def _not_annotated_by(user_id: int):
+    # An annotation that leaves the QA pending also ends its lease; without this it would be leased again.
+    return ~exists().where(Annotation.qa_item_id_fk == QAItem.id, Annotation.annotated_by_user_id == user_id)
+
+
+@router.get("/pending")
+async def list_pending(
+    request: Request,
+    limit: int = Query(PENDING_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(None, description="id of the last item of the previous page"),
+    status: QAStatus = QAStatus.pending,
+    chunk_id: Optional[str] = None,
+    source: Optional[str] = None,
+    include_duplicates: bool = False,
+    verdict: Optional[Literal["supported", "unsupported", "uncertain", "unverified"]] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+    _user=Depends(get_current_user),
+):
+    # One query for the page (keyset on id) plus one eager IN-load for its annotations and annotators.
+    stmt = _with_review_details(select(QAItem)).where(QAItem.status == status)
+    if cursor is not None:
+        stmt = stmt.where(QAItem.id > cursor)
+    if not include_duplicates:
+        stmt = stmt.where(QAItem.duplicate_of_id.is_(None))
+    if verdict is not None:
+        stmt = stmt.where(QAItem.verdict.is_(None) if verdict == "unverified" else QAItem.verdict == verdict)
+    if chunk_id is not None:
+        stmt = stmt.where(Chunk.chunk_id == chunk_id)
+    if source is not None:
+        stmt = stmt.where(Chunk.source_url == source)
+
+    async def build():
+        items = (await db.execute(stmt.order_by(QAItem.id).limit(limit + 1))).scalars().all()
+        has_more = len(items) > limit
+        items = items[:limit]
+        return {
+            "items": [_qa_summary(item) for item in items],
+            "next_cursor": items[-1].id if has_more else None,
+            "has_more": has_more,
+        }
+
+    return await http_cache.cached_json(request, db, build)
+
+
+@router.post("/next")
+async def lease_next(
+    limit: int = Query(10, ge=1, le=MAX_LEASE_BATCH),
+    order: Literal["age", "chunk", "source"] = "age",
+    chunk_id: Optional[str] = None,
+    source: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    """Lease pending items to the caller.
+
+    Leases the caller already holds (within the same filters) are renewed and returned as well; new
+    items are only claimed to top the batch up to `limit`, so polling never piles up work. Items the
+    caller has already annotated are not claimed again, even while they stay pending.
+    """
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=LEASE_SECONDS)
+    conditions = [QAItem.status == QAStatus.pending, QAItem.duplicate_of_id.is_(None)]
+    if chunk_id is not None or source is not None:
+        chunks = select(Chunk.id)
+        if chunk_id is not None:
+            chunks = chunks.where(Chunk.chunk_id == chunk_id)
+        if source is not None:
+            chunks = chunks.where(Chunk.source_url == source)
+        conditions.append(QAItem.chunk_id_fk.in_(chunks))
+
+    held = (await db.execute(
+        update(QAItem)
+        .where(QAItem.leased_by_user_id == user.id, *conditions)
+        .values(lease_expires_at=expires)
+        .returning(QAItem.id)
+        .execution_options(synchronize_session=False, bump_generation=False)
+    )).scalars().all()
+
+    ids = list(held)
+    if len(ids) < limit:
+        claimable = [*conditions, _lease_free(now), _not_annotated_by(user.id)]
+        candidates = select(QAItem.id).where(*claimable)
+        if order == "source":
+            candidates = candidates.join(Chunk, Chunk.id == QAItem.chunk_id_fk)
+        # SKIP LOCKED lets concurrent claims on PostgreSQL pass each other; SQLite serializes writers anyway.
+        candidates = (
+            candidates.order_by(*LEASE_ORDER[order])
+            .limit(limit - len(ids))
+            .with_for_update(skip_locked=True, of=QAItem)
+        )
+        claimed = await db.execute(
+            update(QAItem)
+            .where(QAItem.id.in_(candidates), *claimable)
+            .values(leased_by_user_id=user.id, lease_expires_at=expires)
+            .returning(QAItem.id)
+            .execution_options(synchronize_session=False, bump_generation=False)
+        )
+        ids.extend(claimed.scalars())
+    await db.commit()
+
+    items = []
+    if ids:
+        stmt = _with_review_details(select(QAItem)).where(QAItem.id.in_(ids)).order_by(*LEASE_ORDER[order])
+        items = (await db.execute(stmt)).scalars().all()
+    return {
+        "items": [_qa_summary(item) for item in items],
+        "lease_expires_at": expires.isoformat(),
+    }
+
+
+@router.post("/release")
+async def release_leases(
+    payload: LeaseRelease,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user),
+):
+    stmt = update(QAItem).where(QAItem.leased_by_user_id == user.id)
+    if payload.qa_item_ids is not None:
+        stmt = stmt.where(QAItem.id.in_(payload.qa_item_ids))
+    result = await db.execute(
+        stmt.values(leased_by_user_id=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False, bump_generation=False)
+    )
+    await db.commit()
+    return {"released": result.rowcount}
+
+
+def _status_after(status: QAStatus, payload: AnnotationIn) -> QAStatus:
+    if payload.validated and payload.score >= 0.7:
+        return QAStatus.ready
+    if payload.validated and payload.score < 0.3:
+        return QAStatus.rejected
+    return status
+
+
+def _replay(applied: List[Tuple[Dict[str, Any], AnnotationIn]], start: Dict[int, QAStatus]) -> Dict[int, QAStatus]:
+    """Apply the annotations of the QAs in `start` in request order, so several annotations of one QA
+    end in the status the last one implies; each result gets the status after its annotation."""
+    status = dict(start)
+    for result, ann in applied:
+        if ann.qa_item_id in status:
+            status[ann.qa_item_id] = _status_after(status[ann.qa_item_id], ann)
+            result["status"] = status[ann.qa_item_id].value
+    return status
+
+
+def _leased_by_other(leased_by: Optional[int], expires: Optional[datetime], user_id: int, now: datetime) -> bool:
+    return leased_by not in (None, user_id) and expires is not None and expires > now
+
+
+def _annotation_values(payload: AnnotationIn, user_id: int) -> Dict[str, Any]:
+    return {
+        "qa_item_id_fk": payload.qa_item_id,
+        "edited_question": payload.edited_question,
+        "edited_answer": payload.edited_answer,
+        "score": payload.score,
+        "comment": payload.comment,
+        "validated": payload.validated,
+        "annotated_by_user_id": user_id,
+    }
 
 
 @router.post("/annotate", response_model=AnnotationOut)
-def annotate(payload: AnnotationIn, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    qa = db.query(QAItem).filter(QAItem.id == payload.qa_item_id).first()
+async def annotate(payload: AnnotationIn, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)):
+    qa = await db.get(QAItem, payload.qa_item_id, options=[selectinload(QAItem.chunk)])
     if not qa:
         raise HTTPException(status_code=404, detail="QA not found")
-    ann = Annotation(
-        qa_item_id_fk=qa.id,
-        edited_question=payload.edited_question,
-        edited_answer=payload.edited_answer,
-        score=payload.score,
-        comment=payload.comment,
-        validated=payload.validated,
-        annotated_by_user_id=user.id,
-    )
-    if payload.validated and payload.score >= 0.7:
-        qa.status = QAStatus.ready
-    elif payload.validated and payload.score < 0.3:
-        qa.status = QAStatus.rejected
+    if _leased_by_other(qa.leased_by_user_id, qa.lease_expires_at, user.id, datetime.utcnow()):
+        raise HTTPException(status_code=409, detail="QA is leased by another annotator")
+    ann = Annotation(**_annotation_values(payload, user.id))
+    old_status = qa.status
+    while True:
+        new_status = _status_after(old_status, payload)
+        # Only moves from the status we read, so two concurrent annotations can't both count the same move.
+        moved = await db.execute(
+            update(QAItem)
+            .where(QAItem.id == qa.id, QAItem.status == old_status)
+            .values(status=new_status, leased_by_user_id=None, lease_expires_at=None)
+            .returning(QAItem.id)
+            .execution_options(synchronize_session=False)
+        )
+        if moved.scalar() is not None:
+            break
+        # Someone else moved it first; start again from the status they left.
+        old_status = (await db.execute(select(QAItem.status).where(QAItem.id == qa.id))).scalar()
+        if old_status is None:
+            raise HTTPException(status_code=404, detail="QA not found")
+    if new_status != old_status:
+        if qa.duplicate_of_id is None:  # clustered duplicates aren't counted
+            await db.run_sync(counters.record_transitions, [(qa.chunk.source_url, old_status, new_status)])
+        events.queue(db, "qa_status", {"items": [
+            {"id": qa.id, "status": new_status.value, "previous": old_status.value}
+        ]})
     db.add(ann)
-    db.commit()
-    db.refresh(ann)
+    await db.commit()
+    await db.refresh(ann)
     return ann
 
 
+@router.post("/annotate/batch")
+async def annotate_batch(
+    payload: AnnotationBatchIn, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user)
+):
+    """Apply many annotations in one transaction; items that can't be applied are reported, not raised."""
+    now = datetime.utcnow()
+    ids = list({ann.qa_item_id for ann in payload.annotations})
+    rows = await db.execute(
+        select(
+            QAItem.id, QAItem.status, QAItem.leased_by_user_id, QAItem.lease_expires_at, QAItem.duplicate_of_id,
+            Chunk.source_url,
+        )
+        .join(Chunk, Chunk.id == QAItem.chunk_id_fk)
+        .where(QAItem.id.in_(ids))
+    )
+    qas = {row.id: row for row in rows}
+
+    results: List[Dict[str, Any]] = []
+    applied: List[Tuple[Dict[str, Any], AnnotationIn]] = []
+    values: List[Dict[str, Any]] = []
+    for index, ann in enumerate(payload.annotations):
+        row = qas.get(ann.qa_item_id)
+        if row is None:
+            results.append({"index": index, "qa_item_id": ann.qa_item_id, "error": "QA not found"})
+            continue
+        if _leased_by_other(row.leased_by_user_id, row.lease_expires_at, user.id, now):
+            results.append({"index": index, "qa_item_id": ann.qa_item_id, "error": "QA is leased by another annotator"})
+            continue
+        result = {"index": index, "qa_item_id": ann.qa_item_id}
+        results.append(result)
+        applied.append((result, ann))
+        values.append({**_annotation_values(ann, user.id), "created_at": now})
+
+    if values:
+        created = await db.execute(
+            insert(Annotation).returning(Annotation.id, sort_by_parameter_order=True), values
+        )
+        for (result, _), annotation_id in zip(applied, created.scalars().all()):
+            result["annotation_id"] = annotation_id
+
+        annotated = sorted({result["qa_item_id"] for result, _ in applied})
+        start = {qa_id: qas[qa_id].status for qa_id in annotated}
+        transitions = []
+        moved = []
+        while start:
+            final = _replay(applied, start)
+            changed: Dict[Tuple[QAStatus, QAStatus], List[int]] = {}
+            for qa_id in sorted(start):
+                changed.setdefault((start[qa_id], final[qa_id]), []).append(qa_id)
+            # Each move is guarded by the status it was computed from, like /review/annotate; unchanged
+            # items are checked the same way, since a move by someone else changes what they replay to.
+            missed: List[int] = []
+            for (old_status, new_status), qa_ids in changed.items():
+                updated = await db.execute(
+                    update(QAItem).where(QAItem.id.in_(qa_ids), QAItem.status == old_status).values(status=new_status)
+                    .returning(QAItem.id)
+                    .execution_options(synchronize_session=False)
+                )
+                hit = set(updated.scalars())
+                for qa_id in qa_ids:
+                    if qa_id not in hit:
+                        missed.append(qa_id)
+                    elif new_status != old_status:
+                        if qas[qa_id].duplicate_of_id is None:  # clustered duplicates aren't counted
+                            transitions.append((qas[qa_id].source_url, old_status, new_status))
+                        moved.append({"id": qa_id, "status": new_status.value, "previous": old_status.value})
+            # Another request moved these since the first SELECT: replay them from the status it left.
+            start = {}
+            if missed:
+                start = dict((await db.execute(select(QAItem.id, QAItem.status).where(QAItem.id.in_(missed)))).all())
+        await db.execute(
+            update(QAItem).where(QAItem.id.in_(annotated)).values(leased_by_user_id=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.run_sync(counters.record_transitions, transitions)
+        if moved:
+            events.queue(db, "qa_status", {"items": moved})
+        await db.commit()
+    return {
+        "created": len(values),
+        "failed": len(results) - len(values),
+        "results": results,
+    }
@@ -0,0 +1,31 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..auth import get_current_user
+from ..database import get_async_read_db
+from ..models import QAStatus
+from ..search import search_chunks, search_qas
+
+
+router = APIRouter()
+
+MAX_SEARCH_PAGE = 100
+
+
+@router.get("")
+async def search(
+    q: str = Query(..., min_length=1),
+    scope: Literal["qa", "chunks"] = "qa",
+    status: Optional[QAStatus] = None,
+    source: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_PAGE),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_read_db),
+    _user=Depends(get_current_user),
+):
+    # Ranked best-first; matched terms are wrapped in <mark> in `highlights` / `snippet`.
+    if scope == "chunks":
+        return await db.run_sync(search_chunks, q, source, limit, offset)
+    return await db.run_sync(search_qas, q, status, limit, offset)
@@ -1,54 +1,305 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+import json
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Literal, Tuple
+
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import iterate_in_threadpool
 
+from .. import counters, events
 from ..auth import require_role
-from ..database import get_db
-from ..models import UserRole, Chunk, QAItem
-from ..pipeline import generate_qas_for_chunk
+from ..compression import UploadTooLarge, open_upload, plain_text, uncompressed_name
+from ..database import get_async_db, get_async_read_db, dialect_insert
+from ..jobs import close_ingestion, enqueue_chunks, job_summary, pool, retry_failed_items
+from ..llm_cache import cache_summary
+from ..models import UserRole, Annotation, Chunk, IngestJob, IngestJobItem, JobStatus, QAItem, QAStatus
+from ..pipeline import get_backend_pool
+from ..search import index_chunks, unindex_chunks
 
 
 router = APIRouter()
 
 
-@router.post("/file")
-def upload_raw_file(
-    f: UploadFile = File(...),
-    _user=Depends(require_role(UserRole.provider)),
-    db: Session = Depends(get_db),
-):
-    # Accept uploaded jsonl of raw chunks with fields: chunk_id, source_url, content
-    if not f.filename.endswith((".jsonl", ".json")):
-        raise HTTPException(status_code=400, detail="Only .jsonl or .json supported for now")
-    content = f.file.read().decode("utf-8", errors="ignore")
-    import json
-
-    created, qa_created = 0, 0
-    for line in content.splitlines():
-        line = line.strip()
+INGEST_BATCH_SIZE = 1000
+MAX_REPORTED_REJECTS = 1000
+
+
+def _iter_records(upload, filename: str) -> Iterator[Tuple[int, Any]]:
+    # NDJSON is parsed line by line straight from the spooled upload (decompressing .gz/.zst as it
+    # goes); a .json array is the only format that has to be loaded whole.
+    fileobj = open_upload(upload, filename)
+    head = fileobj.read(1)
+    while head and head.isspace():
+        head = fileobj.read(1)
+    # Compressed streams can't seek back, so the upload is reopened from its start.
+    fileobj = open_upload(upload, filename)
+    if uncompressed_name(filename).endswith(".json") and head == b"[":
+        try:
+            records = json.load(fileobj)
+        except ValueError as exc:  # malformed or truncated array, or not UTF-8 (UnicodeDecodeError)
+            yield getattr(exc, "lineno", 1), exc
+            return
+        for n, obj in enumerate(records if isinstance(records, list) else [records], start=1):
+            yield n, obj
+        return
+    for n, raw in enumerate(fileobj, start=1):
+        line = raw.decode("utf-8", errors="ignore").strip()
         if not line:
             continue
         try:
-            obj = json.loads(line)
-        except Exception:
+            yield n, json.loads(line)
+        except ValueError as exc:
+            yield n, exc
+
+
+def _record_batches(
+    upload, filename: str, on_conflict: str, batch_size: int, tally: Dict[str, Any]
+) -> Iterator[Dict[str, Dict[str, str]]]:
+    """Valid records of the upload, keyed by chunk_id, `batch_size` at a time; rejects and
+    in-batch repeats are counted in `tally`. Blocking: iterate it off the event loop."""
+
+    def reject(line_no: int, reason: str) -> None:
+        tally["rejected"] += 1
+        if len(tally["rejects"]) < MAX_REPORTED_REJECTS:
+            tally["rejects"].append({"line": line_no, "reason": reason})
+
+    batch: Dict[str, Dict[str, str]] = {}
+    for line_no, obj in _iter_records(upload, filename):
+        if isinstance(obj, Exception):
+            reject(line_no, f"invalid json: {obj}")
             continue
-        chunk = Chunk(
-            chunk_id=obj.get("chunk_id") or obj.get("id"),
-            source_url=obj.get("source_url", ""),
-            content=obj.get("content") or obj.get("text") or "",
-        )
-        if not chunk.content:
+        if not isinstance(obj, dict):
+            reject(line_no, "expected a json object")
+            continue
+        chunk_id = obj.get("chunk_id") or obj.get("id")
+        content = obj.get("content") or obj.get("text") or ""
+        if not chunk_id:
+            reject(line_no, "missing chunk_id")
+            continue
+        if not content:
+            reject(line_no, "missing content")
+            continue
+        chunk_id = str(chunk_id)
+        if chunk_id in batch:
+            # repeated id inside one batch: skip keeps the first record, upsert the last
+            tally["skipped"] += 1
+            if on_conflict == "skip":
+                continue
+        batch[chunk_id] = {
+            "chunk_id": chunk_id,
+            "source_url": obj.get("source_url") or obj.get("url") or "",
+            "content": content,
+        }
+        if len(batch) >= batch_size:
+            yield batch
+            batch = {}
+    if batch:
+        yield batch
+
+
+def _changed_chunks(db: Session, batch: Dict[str, Dict[str, str]]) -> Dict[int, Tuple[str, str, bool]]:
+    """Existing chunks an upsert of `batch` rewrites: id -> (old source_url, new source_url, text changed)."""
+    rows = db.execute(
+        select(Chunk.id, Chunk.chunk_id, Chunk.source_url, Chunk.content).where(Chunk.chunk_id.in_(list(batch)))
+    )
+    changed = {}
+    for row in rows:
+        new = batch[row.chunk_id]
+        if row.content != new["content"] or row.source_url != new["source_url"]:
+            changed[row.id] = (row.source_url, new["source_url"], row.content != new["content"])
+    return changed
+
+
+def _retire_stale_qas(db: Session, changed: Dict[int, Tuple[str, str, bool]]) -> None:
+    """Reject the unannotated QAs of chunks whose text changed (they were generated from text that no
+    longer exists; the chunk is queued for new ones) and move the counters of QAs whose chunk changed
+    source."""
+    deltas: Counter = Counter()
+    rewritten = [chunk_id for chunk_id, (_, _, text_changed) in changed.items() if text_changed]
+    stale = []
+    if rewritten:
+        stale = db.execute(
+            update(QAItem)
+            .where(
+                QAItem.chunk_id_fk.in_(rewritten),
+                QAItem.status == QAStatus.pending,
+                ~select(Annotation.id).where(Annotation.qa_item_id_fk == QAItem.id).exists(),
+            )
+            .values(status=QAStatus.rejected, leased_by_user_id=None, lease_expires_at=None)
+            .returning(QAItem.id, QAItem.chunk_id_fk, QAItem.duplicate_of_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+    for _, chunk_id, head in stale:
+        if head is not None:  # clustered duplicates aren't counted
             continue
-        db.add(chunk)
-        db.commit()
-        db.refresh(chunk)
-        created += 1
+        old_source = changed[chunk_id][0]
+        deltas[(QAStatus.pending, old_source)] -= 1
+        deltas[(QAStatus.rejected, old_source)] += 1
+    moved = [chunk_id for chunk_id, (old_source, new_source, _) in changed.items() if old_source != new_source]
+    if moved:
+        # Counters are kept per chunk source, so every QA of a re-sourced chunk moves with it.
+        for chunk_id, status, count in db.execute(
+            select(QAItem.chunk_id_fk, QAItem.status, func.count())
+            .where(QAItem.chunk_id_fk.in_(moved), QAItem.duplicate_of_id.is_(None))
+            .group_by(QAItem.chunk_id_fk, QAItem.status)
+        ):
+            old_source, new_source, _ = changed[chunk_id]
+            deltas[(status, old_source)] -= count
+            deltas[(status, new_source)] += count
+    counters.apply_deltas(db, deltas)
+    if stale:
+        events.queue(db, "qa_status", {"items": [
+            {"id": qa_id, "status": QAStatus.rejected.value, "previous": QAStatus.pending.value} for qa_id, _, _ in stale
+        ]})
+
+
+async def _insert_batch(db: AsyncSession, batch: Dict[str, Dict[str, str]], on_conflict: str) -> List[int]:
+    refs = list(batch)
+    changed = {}
+    if on_conflict == "upsert":
+        changed = await db.run_sync(_changed_chunks, batch)
+        # The search index needs the old text to drop a row, so existing chunks leave it before the
+        # upsert and all of the batch is indexed again after it.
+        await db.run_sync(unindex_chunks, refs)
+    stmt = dialect_insert(db, Chunk).values(
+        [{**row, "created_at": datetime.utcnow()} for row in batch.values()]
+    )
+    if on_conflict == "upsert":
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Chunk.chunk_id],
+            set_={"content": stmt.excluded.content, "source_url": stmt.excluded.source_url},
+            # unchanged rows are left alone so they are not queued for generation again
+            where=or_(
+                plain_text(db, Chunk.content) != plain_text(db, stmt.excluded.content),
+                Chunk.source_url != stmt.excluded.source_url,
+            ),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Chunk.chunk_id])
+    written = (await db.execute(stmt.returning(Chunk.id, Chunk.chunk_id))).all()
+    await db.run_sync(index_chunks, refs if on_conflict == "upsert" else [ref for _, ref in written])
+    if changed:
+        await db.run_sync(_retire_stale_qas, changed)
+    return [chunk_id for chunk_id, _ in written]
 
-        # autogenerate QAs via Ollama
-        for qa in generate_qas_for_chunk(chunk.content):
-            db.add(QAItem(chunk_id_fk=chunk.id, question=qa["question"], answer=qa["answer"]))
-            qa_created += 1
-        db.commit()
 
-    return {"chunks": created, "qa_generated": qa_created}
+@router.post("/file", status_code=202)
+async def upload_raw_file(
+    f: UploadFile = File(...),
+    on_conflict: Literal["skip", "upsert"] = "skip",
+    batch_size: int = Query(INGEST_BATCH_SIZE, ge=1, le=5000),
+    bypass_cache: bool = False,
+    user=Depends(require_role(UserRole.provider)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Accept uploaded jsonl of raw chunks with fields: chunk_id, source_url, content
+    if not uncompressed_name(f.filename).endswith((".jsonl", ".json")):
+        raise HTTPException(status_code=400, detail="Only .jsonl or .json (optionally .gz or .zst) supported for now")
+
+    job = IngestJob(
+        filename=f.filename, created_by_user_id=user.id, status=JobStatus.ingesting, bypass_cache=bypass_cache
+    )
+    db.add(job)
+    await db.commit()
+
+    stored = 0
+    tally: Dict[str, Any] = {"skipped": 0, "rejected": 0, "rejects": []}
+
+    async def flush(batch: Dict[str, Dict[str, str]]) -> None:
+        nonlocal stored
+        chunk_ids = await _insert_batch(db, batch, on_conflict)
+        await db.run_sync(enqueue_chunks, job, chunk_ids)
+        # One transaction per batch; workers can start on it while the rest is still parsed.
+        await db.commit()
+        pool.notify()
+        stored += len(chunk_ids)
+        tally["skipped"] += len(batch) - len(chunk_ids)
+
+    try:
+        # Reading, decompressing and parsing the upload run in the threadpool, one batch at a time;
+        # only the inserts and commits happen on the event loop.
+        batches = _record_batches(f.file, f.filename, on_conflict, batch_size, tally)
+        async for batch in iterate_in_threadpool(batches):
+            await flush(batch)
+    except UploadTooLarge as exc:
+        # Batches committed before the limit was hit stay in the job.
+        raise HTTPException(status_code=413, detail=f"{exc}; {stored} chunks were stored in job {job.id}")
+    finally:
+        await db.rollback()
+        await db.run_sync(close_ingestion, job)
+        await db.commit()
+        pool.notify()
+
+    return {
+        "job_id": job.id,
+        "chunks": stored,
+        "skipped": tally["skipped"],
+        "rejected": tally["rejected"],
+        "rejects": tally["rejects"],
+        "status": job.status.value,
+    }
+
+
+@router.get("/jobs")
+async def list_jobs(
+    limit: int = 20,
+    _user=Depends(require_role(UserRole.provider)),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    jobs = (await db.execute(select(IngestJob).order_by(IngestJob.id.desc()).limit(min(limit, 200)))).scalars()
+    return [job_summary(job) for job in jobs]
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: int,
+    _user=Depends(require_role(UserRole.provider)),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    job = await db.get(IngestJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    failures = await db.execute(
+        select(IngestJobItem, Chunk.chunk_id)
+        .join(Chunk, Chunk.id == IngestJobItem.chunk_id_fk)
+        .where(IngestJobItem.job_id_fk == job.id, IngestJobItem.status == JobStatus.failed)
+        .order_by(IngestJobItem.id)
+        .limit(100)
+    )
+    result = job_summary(job)
+    result["failures"] = [
+        {"chunk_id": chunk_id, "attempts": item.attempts, "error": item.error}
+        for item, chunk_id in failures
+    ]
+    return result
+
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_job(
+    job_id: int,
+    _user=Depends(require_role(UserRole.provider)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    job = await db.get(IngestJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    requeued = await db.run_sync(lambda session: retry_failed_items(session, job))
+    await db.commit()
+    pool.notify()
+    return {"job_id": job.id, "requeued": requeued, "status": job.status.value}
+
+
+@router.get("/cache/stats")
+async def llm_cache_stats(
+    _user=Depends(require_role(UserRole.provider)),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    return await db.run_sync(cache_summary)
 
 
+@router.get("/llm/backends")
+async def llm_backends(_user=Depends(require_role(UserRole.provider))):
+    return get_backend_pool().snapshot()
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import AliasChoices, BaseModel, EmailStr, Field
 
 from .models import UserRole, QAStatus
 
@@ -77,9 +77,13 @@ class AnnotationIn(BaseModel):
     validated: bool = False
 
 
+class AnnotationBatchIn(BaseModel):
+    annotations: List[AnnotationIn] = Field(min_length=1, max_length=5000)
+
+
 class AnnotationOut(BaseModel):
     id: int
-    qa_item_id: int
+    qa_item_id: int = Field(validation_alias=AliasChoices("qa_item_id", "qa_item_id_fk"))
     edited_question: str
     edited_answer: str
     score: float
@@ -91,3 +95,6 @@ class AnnotationOut(BaseModel):
         from_attributes = True
 
 
+class LeaseRelease(BaseModel):
+    # None releases every lease the caller holds
+    qa_item_ids: Optional[List[int]] = None
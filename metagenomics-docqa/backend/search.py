@@ -0,0 +1,268 @@
+"""Ranked full-text search over chunks, QA items and annotation edits.
+
+SQLite uses the FTS5 tables created by migration 3; PostgreSQL uses the generated
+``search_vector`` columns and GIN indexes from the same migration. Triggers keep the QA and
+annotation indexes in sync. ``chunks_fts`` is kept in sync by the code that writes chunks
+(:func:`index_chunks`, :func:`unindex_chunks`), because its text has to be decompressed first
+(migration 8). Ranking happens in the database; highlighting only runs for the rows of the
+requested page.
+"""
+import argparse
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.orm import Session, selectinload
+
+from .models import Chunk, QAItem, QAStatus
+
+
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+SNIPPET_WORDS = 32
+
+_PG_QUERY = "WITH query AS (SELECT websearch_to_tsquery('english', :q) AS q) "
+_PG_HEADLINE = f"StartSel={HIGHLIGHT_OPEN}, StopSel={HIGHLIGHT_CLOSE}, HighlightAll=true"
+_PG_SNIPPET = f"StartSel={HIGHLIGHT_OPEN}, StopSel={HIGHLIGHT_CLOSE}, MaxWords={SNIPPET_WORDS}, MinWords=10"
+
+SQL = {
+    "sqlite": {
+        # bm25() is lower-is-better; negate it so both dialects sort by score DESC. Question terms weigh double.
+        "qa_hits": """
+            SELECT h.qa_id AS id, MAX(h.score) AS score
+            FROM (
+                SELECT rowid AS qa_id, -bm25(qa_items_fts, 2.0, 1.0) AS score
+                FROM qa_items_fts WHERE qa_items_fts MATCH :q
+                UNION ALL
+                SELECT a.qa_item_id_fk, -bm25(annotations_fts, 2.0, 1.0)
+                FROM annotations_fts JOIN annotations a ON a.id = annotations_fts.rowid
+                WHERE annotations_fts MATCH :q
+            ) h
+            JOIN qa_items qi ON qi.id = h.qa_id
+            {where}
+            GROUP BY h.qa_id
+            ORDER BY score DESC, h.qa_id
+            LIMIT :limit OFFSET :offset
+        """,
+        "qa_highlights": """
+            SELECT rowid AS id,
+                   highlight(qa_items_fts, 0, :open, :close) AS question,
+                   snippet(qa_items_fts, 1, :open, :close, '…', :words) AS answer
+            FROM qa_items_fts WHERE qa_items_fts MATCH :q AND rowid IN :ids
+        """,
+        "annotation_highlights": """
+            SELECT a.qa_item_id_fk AS id,
+                   highlight(annotations_fts, 0, :open, :close) AS edited_question,
+                   snippet(annotations_fts, 1, :open, :close, '…', :words) AS edited_answer
+            FROM annotations_fts JOIN annotations a ON a.id = annotations_fts.rowid
+            WHERE annotations_fts MATCH :q AND a.qa_item_id_fk IN :ids
+            ORDER BY a.id
+        """,
+        "chunk_hits": """
+            SELECT c.id, -bm25(chunks_fts) AS score
+            FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid
+            WHERE chunks_fts MATCH :q {and_source}
+            ORDER BY score DESC, c.id
+            LIMIT :limit OFFSET :offset
+        """,
+        "chunk_snippets": """
+            SELECT rowid AS id, snippet(chunks_fts, 0, :open, :close, '…', :words) AS content
+            FROM chunks_fts WHERE chunks_fts MATCH :q AND rowid IN :ids
+        """,
+    },
+    "postgresql": {
+        "qa_hits": _PG_QUERY + """
+            SELECT h.qa_id AS id, MAX(h.score) AS score
+            FROM (
+                SELECT qi.id AS qa_id, ts_rank(qi.search_vector, query.q) AS score
+                FROM qa_items qi, query WHERE qi.search_vector @@ query.q
+                UNION ALL
+                SELECT a.qa_item_id_fk, ts_rank(a.search_vector, query.q)
+                FROM annotations a, query WHERE a.search_vector @@ query.q
+            ) h
+            JOIN qa_items qi ON qi.id = h.qa_id
+            {where}
+            GROUP BY h.qa_id
+            ORDER BY score DESC, h.qa_id
+            LIMIT :limit OFFSET :offset
+        """,
+        "qa_highlights": _PG_QUERY + f"""
+            SELECT qi.id,
+                   ts_headline('english', qi.question, query.q, '{_PG_HEADLINE}') AS question,
+                   ts_headline('english', qi.answer, query.q, '{_PG_SNIPPET}') AS answer
+            FROM qa_items qi, query WHERE qi.search_vector @@ query.q AND qi.id IN :ids
+        """,
+        "annotation_highlights": _PG_QUERY + f"""
+            SELECT a.qa_item_id_fk AS id,
+                   ts_headline('english', a.edited_question, query.q, '{_PG_HEADLINE}') AS edited_question,
+                   ts_headline('english', a.edited_answer, query.q, '{_PG_SNIPPET}') AS edited_answer
+            FROM annotations a, query WHERE a.search_vector @@ query.q AND a.qa_item_id_fk IN :ids
+            ORDER BY a.id
+        """,
+        "chunk_hits": _PG_QUERY + """
+            SELECT c.id, ts_rank(c.search_vector, query.q) AS score
+            FROM chunks c, query
+            WHERE c.search_vector @@ query.q {and_source}
+            ORDER BY score DESC, c.id
+            LIMIT :limit OFFSET :offset
+        """,
+        "chunk_snippets": _PG_QUERY + f"""
+            SELECT c.id, ts_headline('english', c.content, query.q, '{_PG_SNIPPET}') AS content
+            FROM chunks c, query WHERE c.search_vector @@ query.q AND c.id IN :ids
+        """,
+    },
+}
+
+
+def _chunk_index_sql(db: Session, sql: str, refs: List[str]) -> None:
+    if db.get_bind().dialect.name == "postgresql" or not refs:
+        return  # the generated search_vector column follows the row by itself
+    db.execute(text(sql).bindparams(bindparam("refs", expanding=True)), {"refs": refs})
+
+
+def index_chunks(db: Session, refs: List[str]) -> None:
+    """Add ``chunks_fts`` rows for the chunks with these ``chunk_id``s, from the text they hold now."""
+    _chunk_index_sql(
+        db, "INSERT INTO chunks_fts (rowid, content) "
+        "SELECT id, docqa_unzstd(content) FROM chunks WHERE chunk_id IN :refs", refs,
+    )
+
+
+def unindex_chunks(db: Session, refs: List[str]) -> None:
+    """Remove the ``chunks_fts`` rows of these ``chunk_id``s; call it before their text changes."""
+    _chunk_index_sql(
+        db, "INSERT INTO chunks_fts (chunks_fts, rowid, content) "
+        "SELECT 'delete', id, docqa_unzstd(content) FROM chunks WHERE chunk_id IN :refs", refs,
+    )
+
+
+def rebuild_chunk_index(db: Session) -> None:
+    """Rebuild ``chunks_fts`` from the chunks table, e.g. after writing chunks outside the app."""
+    if db.get_bind().dialect.name != "postgresql":
+        db.execute(text("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')"))
+
+
+def fts5_query(q: str) -> str:
+    # Quote every term so user input can't trip FTS5 query syntax; terms are ANDed.
+    return " ".join(f'"{term}"' for term in re.findall(r"\w+", q))
+
+
+def _prepare(db: Session, q: str):
+    dialect = db.get_bind().dialect.name
+    sql = SQL["postgresql" if dialect == "postgresql" else "sqlite"]
+    return sql, (q.strip() if dialect == "postgresql" else fts5_query(q))
+
+
+def _highlights(db: Session, sql: str, query: str, ids: List[int]) -> Dict[int, Dict[str, str]]:
+    stmt = text(sql).bindparams(bindparam("ids", expanding=True))
+    params = {"q": query, "ids": ids, "open": HIGHLIGHT_OPEN, "close": HIGHLIGHT_CLOSE, "words": SNIPPET_WORDS}
+    # Later rows win, so for annotations the latest matching edit is kept.
+    return {row.id: {k: v for k, v in row._mapping.items() if k != "id"} for row in db.execute(stmt, params)}
+
+
+def search_qas(
+    db: Session, q: str, status: Optional[QAStatus] = None, limit: int = 20, offset: int = 0
+) -> Dict[str, Any]:
+    sql, query = _prepare(db, q)
+    if not query:
+        return {"items": [], "has_more": False, "next_offset": None}
+    params: Dict[str, Any] = {"q": query, "limit": limit + 1, "offset": offset}
+    where = ""
+    if status is not None:
+        where = "WHERE qi.status = :status"
+        params["status"] = status.name
+    hits = db.execute(text(sql["qa_hits"].format(where=where)), params).all()
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    ids = [hit.id for hit in hits]
+    if not ids:
+        return {"items": [], "has_more": False, "next_offset": None}
+
+    items = {
+        item.id: item
+        for item in db.execute(select(QAItem).options(selectinload(QAItem.chunk)).where(QAItem.id.in_(ids))).scalars()
+    }
+    qa_marks = _highlights(db, sql["qa_highlights"], query, ids)
+    edit_marks = _highlights(db, sql["annotation_highlights"], query, ids)
+    result = []
+    for hit in hits:
+        item = items[hit.id]
+        result.append({
+            "id": item.id,
+            "chunk_id": item.chunk_id_fk,
+            "chunk_ref": item.chunk.chunk_id,
+            "source_url": item.chunk.source_url,
+            "question": item.question,
+            "answer": item.answer,
+            "status": item.status.value,
+            "created_at": item.created_at.isoformat(),
+            "score": hit.score,
+            "highlights": {**qa_marks.get(hit.id, {}), **edit_marks.get(hit.id, {})},
+        })
+    return {"items": result, "has_more": has_more, "next_offset": offset + limit if has_more else None}
+
+
+def search_chunks(
+    db: Session, q: str, source: Optional[str] = None, limit: int = 20, offset: int = 0
+) -> Dict[str, Any]:
+    sql, query = _prepare(db, q)
+    if not query:
+        return {"items": [], "has_more": False, "next_offset": None}
+    params: Dict[str, Any] = {"q": query, "limit": limit + 1, "offset": offset}
+    and_source = ""
+    if source is not None:
+        and_source = "AND c.source_url = :source"
+        params["source"] = source
+    hits = db.execute(text(sql["chunk_hits"].format(and_source=and_source)), params).all()
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    ids = [hit.id for hit in hits]
+    if not ids:
+        return {"items": [], "has_more": False, "next_offset": None}
+
+    chunks = {
+        row.id: row
+        for row in db.execute(select(Chunk.id, Chunk.chunk_id, Chunk.source_url, Chunk.created_at).where(Chunk.id.in_(ids)))
+    }
+    snippets = _highlights(db, sql["chunk_snippets"], query, ids)
+    result = []
+    for hit in hits:
+        chunk = chunks[hit.id]
+        result.append({
+            "id": chunk.id,
+            "chunk_id": chunk.chunk_id,
+            "source_url": chunk.source_url,
+            "created_at": chunk.created_at.isoformat(),
+            "score": hit.score,
+            "snippet": snippets.get(hit.id, {}).get("content"),
+        })
+    return {"items": result, "has_more": has_more, "next_offset": offset + limit if has_more else None}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Search chunks or QA items from the command line")
+    p.add_argument("query", nargs="?")
+    p.add_argument("--rebuild-chunk-index", action="store_true", help="re-index all chunks (SQLite) and exit")
+    p.add_argument("--scope", choices=["qa", "chunks"], default="qa")
+    p.add_argument("--status", choices=[s.value for s in QAStatus])
+    p.add_argument("--limit", type=int, default=20)
+    args = p.parse_args()
+
+    from .database import ReadSessionLocal, SessionLocal
+
+    if args.rebuild_chunk_index:
+        with SessionLocal() as db:
+            rebuild_chunk_index(db)
+            db.commit()
+        raise SystemExit(0)
+    if not args.query:
+        p.error("a query is required")
+    with ReadSessionLocal() as db:
+        if args.scope == "qa":
+            found = search_qas(db, args.query, QAStatus(args.status) if args.status else None, args.limit)
+            for item in found["items"]:
+                print(f"{item['score']:8.3f}  #{item['id']} [{item['status']}] {item['highlights'].get('question') or item['question']}")
+        else:
+            found = search_chunks(db, args.query, limit=args.limit)
+            for item in found["items"]:
+                print(f"{item['score']:8.3f}  {item['chunk_id']}  {item['snippet']}")
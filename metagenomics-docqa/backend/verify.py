@@ -0,0 +1,259 @@
+"""Faithfulness check of generated QAs against their chunk: a lexical pre-filter, then an LLM verifier.
+
+The pre-filter scores a whole batch of answers at once with NumPy: ``overlap`` is the fraction of
+the answer's content words found in the chunk, ``grounding`` the fraction of its word bigrams. Clear
+passes and clear failures are decided there; only the borderline band in between is sent to the
+LLM verifier (concurrently, through the backend pool). Unsupported pending QAs are rejected before
+they reach human review.
+
+DOCQA_VERIFY_MODE: ``llm`` (default) runs both stages, ``lexical`` leaves borderline QAs
+``uncertain``, ``off`` skips verification.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from . import events, metrics
+from .counters import record_transitions
+from .models import Chunk, QAItem, QAStatus
+
+
+logger = logging.getLogger(__name__)
+
+VERIFY_MODE = os.getenv("DOCQA_VERIFY_MODE", "llm")
+# Lexical score = OVERLAP_WEIGHT * overlap + (1 - OVERLAP_WEIGHT) * grounding.
+VERIFY_ACCEPT = float(os.getenv("DOCQA_VERIFY_ACCEPT", "0.7"))
+VERIFY_REJECT = float(os.getenv("DOCQA_VERIFY_REJECT", "0.3"))
+OVERLAP_WEIGHT = 0.6
+
+VERIFY_PROMPT_PATH = Path(__file__).resolve().parents[1] / "scrapper" / "prompts" / "verifier_faithfulness.txt"
+VERIFY_INSTRUCTIONS = VERIFY_PROMPT_PATH.read_text(encoding="utf-8").strip()
+
+SUPPORTED, UNSUPPORTED, UNCERTAIN = "supported", "unsupported", "uncertain"
+
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can do does for from has have how if in into is it its may "
+    "not of on or such that the their then there these this to was were what when where which who "
+    "will with within without you your".split()
+)
+
+
+def build_verify_prompt(content: str, question: str, answer: str) -> str:
+    return (
+        f"{VERIFY_INSTRUCTIONS}\n\n"
+        f"CHUNK:\n{content[:4000]}\n\n"
+        f"QUESTION: {question}\nANSWER: {answer}\n"
+    )
+
+
+def parse_verifier_response(raw: str) -> Optional[Tuple[bool, List[str]]]:
+    """``(is_supported, offending_claims)``, or None if the model's answer can't be read."""
+    match = re.search(r"\{.*\}", raw, re.S)
+    if match:
+        try:
+            obj = json.loads(match.group(0))
+            if isinstance(obj, dict) and isinstance(obj.get("is_supported"), bool):
+                claims = obj.get("offending_claims") or []
+                return obj["is_supported"], [str(c) for c in claims] if isinstance(claims, list) else []
+        except ValueError:
+            pass
+    # Models sometimes echo the prompt's unquoted keys.
+    match = re.search(r"is_supported\W*(true|false)", raw, re.I)
+    return (match.group(1).lower() == "true", []) if match else None
+
+
+def content_words(text: str) -> List[str]:
+    return [w for w in re.findall(r"\w+", text.lower()) if w not in STOPWORDS]
+
+
+def lexical_scores(answers: Sequence[str], contexts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-pair ``(overlap, grounding)`` for answers[i] against contexts[i], in [0, 1]."""
+    n = len(answers)
+    ans_words = [content_words(t) for t in answers]
+    ctx_words = [content_words(t) for t in contexts]
+    flat = [w for words in ans_words + ctx_words for w in words]
+    vocab = {w: i for i, w in enumerate(dict.fromkeys(flat))}
+    ids = np.fromiter(map(vocab.__getitem__, flat), dtype=np.int64, count=len(flat))
+    v = max(len(vocab), 1)
+    lengths = np.array([len(words) for words in ans_words + ctx_words], dtype=np.int64)
+    # Texts 0..n-1 are answers and n..2n-1 their contexts; both sides of pair i are owned by i.
+    owners = np.repeat(np.arange(2 * n, dtype=np.int64) % max(n, 1), lengths)
+    is_answer = np.repeat(np.arange(2 * n) < n, lengths)
+    same_text = np.repeat(np.arange(2 * n, dtype=np.int64), lengths)
+
+    def fraction_found(keys: np.ndarray, key_owners: np.ndarray, from_answer: np.ndarray, space: int) -> np.ndarray:
+        # Keys qualified by pair index, so one isin answers "is this term in its own chunk" for the whole batch.
+        qualified = key_owners * space + keys
+        ans_keys, first = np.unique(qualified[from_answer], return_index=True)
+        found = np.isin(ans_keys, qualified[~from_answer])
+        pair = key_owners[from_answer][first]
+        totals = np.bincount(pair, minlength=n)
+        hits = np.bincount(pair, weights=found, minlength=n)
+        return np.divide(hits, totals, out=np.zeros(n), where=totals > 0)
+
+    overlap = fraction_found(ids, owners, is_answer, v)
+    adjacent = same_text[:-1] == same_text[1:]
+    bigrams = (ids[:-1] * v + ids[1:])[adjacent]
+    grounding = fraction_found(bigrams, owners[:-1][adjacent], is_answer[:-1][adjacent], v * v)
+    return overlap, grounding
+
+
+def lexical_verdicts(overlap: np.ndarray, grounding: np.ndarray) -> np.ndarray:
+    score = OVERLAP_WEIGHT * overlap + (1 - OVERLAP_WEIGHT) * grounding
+    return np.where(score >= VERIFY_ACCEPT, SUPPORTED, np.where(score < VERIFY_REJECT, UNSUPPORTED, UNCERTAIN))
+
+
+def load_unverified(
+    db: Session, chunk_id: Optional[int] = None, after_id: int = 0, limit: int = 1000, retry_uncertain: bool = False
+) -> List[Any]:
+    verdicts = QAItem.verdict.is_(None)
+    if retry_uncertain:
+        verdicts = verdicts | (QAItem.verdict == UNCERTAIN)
+    stmt = (
+        select(QAItem.id, QAItem.question, QAItem.answer, Chunk.content, Chunk.source_url)
+        .join(Chunk, Chunk.id == QAItem.chunk_id_fk)
+        .where(QAItem.status == QAStatus.pending, verdicts, QAItem.id > after_id)
+        .order_by(QAItem.id)
+        .limit(limit)
+    )
+    if chunk_id is not None:
+        stmt = stmt.where(QAItem.chunk_id_fk == chunk_id)
+    return db.execute(stmt).all()
+
+
+def prefilter(rows: Sequence[Any]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """Score `rows` lexically; returns one result per row and the indexes left for the LLM stage."""
+    overlap, grounding = lexical_scores([r.answer for r in rows], [r.content for r in rows])
+    verdicts = lexical_verdicts(overlap, grounding)
+    results = [
+        {"id": r.id, "verdict": str(verdicts[i]), "verdict_by": "lexical",
+         "overlap_score": float(overlap[i]), "grounding_score": float(grounding[i]), "verifier_notes": None}
+        for i, r in enumerate(rows)
+    ]
+    borderline = [i for i, result in enumerate(results) if result["verdict"] == UNCERTAIN]
+    return results, borderline
+
+
+def apply_llm_answer(result: Dict[str, Any], raw: Any) -> None:
+    if isinstance(raw, Exception):
+        logger.warning("Verifier call failed for QA %s: %s", result["id"], raw)
+        return
+    parsed = parse_verifier_response(raw)
+    if parsed is None:
+        return
+    supported, claims = parsed
+    result["verdict"] = SUPPORTED if supported else UNSUPPORTED
+    result["verdict_by"] = "llm"
+    result["verifier_notes"] = json.dumps(claims, ensure_ascii=False) if claims else None
+
+
+def store_results(db: Session, rows: Sequence[Any], results: List[Dict[str, Any]]) -> Dict[str, int]:
+    if not results:
+        return {}
+    now = datetime.utcnow()
+    db.execute(update(QAItem), [{**result, "verified_at": now} for result in results])
+    # Only QAs still pending are rejected: a reviewer may have got to one while the verifier ran.
+    unsupported = [result["id"] for result in results if result["verdict"] == UNSUPPORTED]
+    rejected = set()
+    if unsupported:
+        moved = db.execute(
+            update(QAItem)
+            .where(QAItem.id.in_(unsupported), QAItem.status == QAStatus.pending)
+            .values(status=QAStatus.rejected)
+            .returning(QAItem.id, QAItem.duplicate_of_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        rejected = {qa_id for qa_id, _ in moved}
+        sources = {row.id: row.source_url for row in rows}
+        # Clustered duplicates aren't counted (see counters.rebuild).
+        record_transitions(db, [
+            (sources[qa_id], QAStatus.pending, QAStatus.rejected) for qa_id, head in moved if head is None
+        ])
+        if rejected:
+            events.queue(db, "qa_status", {"items": [
+                {"id": qa_id, "status": QAStatus.rejected.value, "previous": QAStatus.pending.value}
+                for qa_id in sorted(rejected)
+            ]})
+    stats: Dict[str, int] = {"rejected": len(rejected)}
+    for result in results:
+        metrics.VERIFY_VERDICTS.labels(result["verdict_by"], result["verdict"]).inc()
+        key = f"{result['verdict_by']}_{result['verdict']}"
+        stats[key] = stats.get(key, 0) + 1
+    return stats
+
+
+def verify_rows(db: Session, rows: Sequence[Any]) -> Dict[str, int]:
+    from .pipeline import get_llm_client
+
+    results, borderline = prefilter(rows)
+    if borderline and VERIFY_MODE == "llm":
+        # No transaction is held open while the verifier runs.
+        db.rollback()
+        prompts = [build_verify_prompt(rows[i].content, rows[i].question, rows[i].answer) for i in borderline]
+        for j, raw in get_llm_client().generate_batch(prompts):
+            apply_llm_answer(results[borderline[j]], raw)
+    stats = store_results(db, rows, results)
+    db.commit()
+    return stats
+
+
+async def averify_rows(db, rows: Sequence[Any]) -> Dict[str, int]:
+    """verify_rows for the asyncio worker mode; `db` is an AsyncSession."""
+    from .pipeline import get_async_llm_client
+
+    results, borderline = prefilter(rows)
+    if borderline and VERIFY_MODE == "llm":
+        # As in verify_rows: no transaction is held open while the verifier runs.
+        await db.rollback()
+        prompts = [build_verify_prompt(rows[i].content, rows[i].question, rows[i].answer) for i in borderline]
+        async for j, raw in get_async_llm_client().generate_batch(prompts):
+            apply_llm_answer(results[borderline[j]], raw)
+    stats = await db.run_sync(store_results, rows, results)
+    await db.commit()
+    return stats
+
+
+def verify_chunk(db: Session, chunk_id: int) -> Dict[str, int]:
+    rows = load_unverified(db, chunk_id=chunk_id)
+    return verify_rows(db, rows) if rows else {}
+
+
+async def averify_chunk(db, chunk_id: int) -> Dict[str, int]:
+    rows = await db.run_sync(lambda session: load_unverified(session, chunk_id=chunk_id))
+    return await averify_rows(db, rows) if rows else {}
+
+
+def verify_pending(db: Session, batch_size: int = 1000, retry_uncertain: bool = False) -> Dict[str, int]:
+    """Verify every pending QA without a verdict (or with an uncertain one), in id order."""
+    totals: Dict[str, int] = {"scanned": 0}
+    last_id = 0
+    while True:
+        rows = load_unverified(db, after_id=last_id, limit=batch_size, retry_uncertain=retry_uncertain)
+        if not rows:
+            return totals
+        for key, value in verify_rows(db, rows).items():
+            totals[key] = totals.get(key, 0) + value
+        totals["scanned"] += len(rows)
+        last_id = rows[-1].id
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Verify pending QA items against their chunks")
+    p.add_argument("--batch-size", type=int, default=1000)
+    p.add_argument("--retry-uncertain", action="store_true", help="also re-check QAs left uncertain")
+    args = p.parse_args()
+
+    from .database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as db:
+        print(verify_pending(db, args.batch_size, args.retry_uncertain))
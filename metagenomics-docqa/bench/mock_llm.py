@@ -0,0 +1,135 @@
+"""Deterministic stand-in for Ollama's ``POST /api/generate``.
+
+Latency and output depend only on the prompt (and --seed), so two benchmark runs send the
+workers through exactly the same work.
+
+    python -m bench.mock_llm --port 11435 --latency 0.5 --jitter 0.2 --fail-rate 0.01
+
+With ``"stream": true`` the completion is sent as NDJSON fragments spread over the latency, like
+Ollama's token stream; --extra-qas makes the model ramble past the 3 QAs asked for.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+STREAM_FRAGMENT_CHARS = 16
+VERIFY_PROMPT_PREFIX = "Given the chunk and one QA, verify"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    jitter = 0.0
+    fail_rate = 0.0
+    extra_qas = 0
+    seed = 0
+    attempts: Counter = Counter()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        # Health probe target (Ollama lists its local models here).
+        if self.path == "/api/tags":
+            self._send(200, b'{"models": []}', "application/json")
+        else:
+            self._send(404, b"")
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send(404, b"")
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = body.get("prompt", "")
+        rng = random.Random(hashlib.sha256(f"{self.seed}:{prompt}".encode()).digest())
+        latency = max(0.0, self.latency * (1 + rng.uniform(-self.jitter, self.jitter)))
+        if not body.get("stream"):
+            time.sleep(latency)
+        with self.lock:
+            self.attempts[prompt] += 1
+            first_attempt = self.attempts[prompt] == 1
+        # Only first attempts fail, so the client's retry path is exercised without losing the chunk.
+        if rng.random() < self.fail_rate and first_attempt:
+            self._send(503, b"")
+            return
+        if prompt.startswith(VERIFY_PROMPT_PREFIX):
+            supported = rng.random() < 0.8
+            response = json.dumps({"is_supported": supported, "offending_claims": [] if supported else ["mock claim"]})
+        else:
+            response = _qas(prompt, rng, 3 + self.extra_qas)
+        if body.get("stream"):
+            self._stream(body.get("model"), response, latency)
+            return
+        out = json.dumps({"model": body.get("model"), "response": response, "done": True}).encode()
+        self._send(200, out, "application/json")
+
+    def _stream(self, model: str, response: str, latency: float):
+        fragments = [response[i:i + STREAM_FRAGMENT_CHARS] for i in range(0, len(response), STREAM_FRAGMENT_CHARS)]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for fragment in fragments + [""]:
+                time.sleep(latency / len(fragments))
+                line = json.dumps({"model": model, "response": fragment, "done": not fragment}).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading: the generation is cancelled, as with Ollama.
+            self.close_connection = True
+
+    def _send(self, status: int, payload: bytes, content_type: str = "text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def _qas(prompt: str, rng: random.Random, count: int) -> str:
+    # Questions are built from the chunk's own words, so different chunks don't look like near-duplicates.
+    chunk = prompt.rsplit("CHUNK:", 1)[-1].split("\n\nOutput", 1)[0]
+    words = re.findall(r"\w+", chunk) or ["text"]
+    lines = []
+    for i in range(count):
+        picked = [rng.choice(words) for _ in range(8)]
+        lines.append(json.dumps({
+            "question": f"What does the passage say about {' '.join(picked[:4])}?",
+            "answer": " ".join(picked),
+        }))
+    return "\n".join(lines)
+
+
+def serve(
+    port: int, latency: float = 0.0, jitter: float = 0.0, fail_rate: float = 0.0, seed: int = 0, extra_qas: int = 0
+):
+    MockLLMHandler.latency = latency
+    MockLLMHandler.extra_qas = extra_qas
+    MockLLMHandler.jitter = jitter
+    MockLLMHandler.fail_rate = fail_rate
+    MockLLMHandler.seed = seed
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockLLMHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Mock Ollama /api/generate for benchmarks")
+    p.add_argument("--port", type=int, default=11435)
+    p.add_argument("--latency", type=float, default=0.0, help="mean seconds per generation")
+    p.add_argument("--jitter", type=float, default=0.0, help="relative latency spread, e.g. 0.2 for +/-20%%")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="fraction of prompts answered with 503")
+    p.add_argument("--extra-qas", type=int, default=0, help="QA lines generated past the 3 requested")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+    serve(args.port, args.latency, args.jitter, args.fail_rate, args.seed, args.extra_qas).serve_forever()
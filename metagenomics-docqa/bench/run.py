@@ -0,0 +1,291 @@
+"""Load-test the API against a seeded database and a mock LLM, and compare runs.
+
+    python -m bench.run run --rows 100000 --concurrency 16
+    python -m bench.run compare bench/results/a.json bench/results/b.json
+
+`run` seeds (once per --rows, cached under bench/data/), copies the seed to a scratch database,
+starts ``bench.mock_llm`` and uvicorn on it, drives every scenario with concurrent clients and
+writes a JSON report to bench/results/. Worker settings (DOCQA_WORKER_MODE, DOCQA_QA_WORKERS,
+...) are taken from the environment, so the same command benchmarks each configuration.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+import httpx
+
+from .seed import BENCH_PASSWORD, BENCH_USERS, QAS_PER_CHUNK, _text
+
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DATA_DIR = BASE_DIR / "bench" / "data"
+RESULTS_DIR = BASE_DIR / "bench" / "results"
+COMPARED = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def _summary(latencies: List[float], errors: int, seconds: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2)  # noqa: E731
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "p50_ms": ms(_percentile(ordered, 50)),
+        "p95_ms": ms(_percentile(ordered, 95)),
+        "p99_ms": ms(_percentile(ordered, 99)),
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+    }
+
+
+async def _drive(requests: int, concurrency: int, call: Callable[[int], Awaitable[httpx.Response]]) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    queue = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for i in queue:
+            start = time.perf_counter()
+            try:
+                response = await call(i)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return _summary(latencies, errors, time.perf_counter() - start)
+
+
+def _seed_db(rows: int, reseed: bool) -> Path:
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    path = DATA_DIR / f"seed-{rows}.sqlite3"
+    if reseed and path.exists():
+        path.unlink()
+    if not path.exists():
+        print(f"seeding {rows} rows into {path}", flush=True)
+        subprocess.run([sys.executable, "-m", "bench.seed", "--rows", str(rows), "--db", str(path)], cwd=BASE_DIR, check=True)
+    return path
+
+
+def _start(args, db_path: Path):
+    llm_port, api_port = _free_port(), _free_port()
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "bench.mock_llm", "--port", str(llm_port), "--latency", str(args.llm_latency),
+         "--jitter", str(args.llm_jitter), "--fail-rate", str(args.llm_fail_rate), "--extra-qas", str(args.llm_extra_qas)],
+        cwd=BASE_DIR,
+    )
+    env = {**os.environ, "DOCQA_DB_PATH": str(db_path), "OLLAMA_BASE_URL": f"http://127.0.0.1:{llm_port}"}
+    env.pop("DOCQA_DATABASE_URL", None)
+    env.pop("DOCQA_READ_DATABASE_URL", None)
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(api_port), "--log-level", "warning"],
+        cwd=BASE_DIR, env=env,
+    )
+    return [mock, api], f"http://127.0.0.1:{api_port}"
+
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/openapi.json")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+
+async def _login(client: httpx.AsyncClient, email: str) -> Dict[str, str]:
+    response = await client.post("/auth/login", data={"username": email, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def _upload_scenario(client, args, provider) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    job_ids: List[int] = []
+
+    async def upload(i: int):
+        lines = [
+            json.dumps({"chunk_id": f"upload-{i}-{j}", "source_url": f"https://example.org/upload/{i}",
+                        "content": _text(rng, 120)})
+            for j in range(args.upload_chunks)
+        ]
+        files = {"f": (f"bench-{i}.jsonl", "\n".join(lines).encode(), "application/x-ndjson")}
+        response = await client.post("/upload/file", files=files, headers=provider)
+        if response.status_code < 400:
+            job_ids.append(response.json()["job_id"])
+        return response
+
+    result = await _drive(args.uploads, min(args.concurrency, args.uploads), upload)
+
+    # Generation throughput: time until every uploaded chunk went through the (mock) LLM.
+    start = time.perf_counter()
+    pending = set(job_ids)
+    while pending and time.perf_counter() - start < args.generation_timeout:
+        for job_id in list(pending):
+            job = (await client.get(f"/upload/jobs/{job_id}", headers=provider)).json()
+            if job["status"] in ("completed", "failed"):
+                pending.discard(job_id)
+        await asyncio.sleep(0.5)
+    seconds = time.perf_counter() - start
+    chunks = len(job_ids) * args.upload_chunks
+    result["generation"] = {
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 2) if seconds else 0.0,
+        "timed_out_jobs": len(pending),
+    }
+    return result
+
+
+async def run(args) -> Dict[str, Any]:
+    seed_path = _seed_db(args.rows, args.reseed)
+    work_dir = DATA_DIR / "work"
+    work_dir.mkdir(parents=True, exist_ok=True)
+    db_path = work_dir / f"run-{os.getpid()}.sqlite3"
+    shutil.copyfile(seed_path, db_path)  # seeds are checkpointed, so the main file is complete
+
+    procs, base_url = _start(args, db_path)
+    rng = random.Random(args.seed)
+    scenarios: Dict[str, Any] = {}
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+            await _wait_ready(client)
+            provider = await _login(client, BENCH_USERS["provider"])
+            annotator = await _login(client, BENCH_USERS["annotator"])
+            n = args.requests
+            c = args.concurrency
+
+            print("review_pending", flush=True)
+            scenarios["review_pending"] = await _drive(n, c, lambda i: client.get(
+                "/review/pending", params={"limit": 50, "cursor": rng.randint(0, args.rows)}, headers=annotator
+            ))
+            print("review_stats", flush=True)
+            scenarios["review_stats"] = await _drive(n, c, lambda i: client.get("/review/stats", headers=annotator))
+            print("review_revalidate", flush=True)
+            first = await client.get("/review/pending", params={"limit": 50}, headers=annotator)
+            conditional = {**annotator, "If-None-Match": first.headers.get("etag", "")}
+            scenarios["review_revalidate"] = await _drive(n, c, lambda i: client.get(
+                "/review/pending", params={"limit": 50}, headers=conditional
+            ))
+            print("annotate", flush=True)
+            scenarios["annotate"] = await _drive(n, c, lambda i: client.post("/review/annotate", headers=annotator, json={
+                "qa_item_id": rng.randint(1, args.rows), "edited_question": f"bench question {i}",
+                "edited_answer": f"bench answer {i}", "score": 0.5, "validated": i % 2 == 0,
+            }))
+            for fmt in ("jsonl", "csv", "parquet"):
+                print(f"export_{fmt}", flush=True)
+                scenarios[f"export_{fmt}"] = await _drive(
+                    args.export_requests, min(c, args.export_requests),
+                    lambda i, fmt=fmt: client.get(f"/provider/export/{fmt}", headers=provider),
+                )
+            if args.uploads:
+                print("upload", flush=True)
+                scenarios["upload"] = await _upload_scenario(client, args, provider)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=30)
+        if not args.keep_db:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True)
+    return {
+        "commit": commit.stdout.strip() or None,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            **{k: v for k, v in vars(args).items() if k not in ("command", "output", "reseed", "keep_db")},
+            "seed_chunks": max(1, args.rows // QAS_PER_CHUNK),
+            "env": {k: v for k, v in os.environ.items() if k.startswith("DOCQA_")},
+        },
+        "scenarios": scenarios,
+    }
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> None:
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'scenario':<16}{'metric':<16}{'before':>12}{'after':>12}{'change':>10}")
+    for name, old in before["scenarios"].items():
+        new = after["scenarios"].get(name)
+        if new is None:
+            continue
+        for metric in COMPARED:
+            a, b = old[metric], new[metric]
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"{name:<16}{metric:<16}{a:>12}{b:>12}{change:>10}")
+        if "generation" in old and "generation" in new:
+            a, b = old["generation"]["chunks_per_second"], new["generation"]["chunks_per_second"]
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"{name:<16}{'chunks_per_s':<16}{a:>12}{b:>12}{change:>10}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Benchmark the DocQA API against a mock LLM")
+    sub = p.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--rows", type=int, default=10_000, help="seeded QA items (10k to 1M)")
+    r.add_argument("--reseed", action="store_true", help="rebuild the cached seed database")
+    r.add_argument("--concurrency", type=int, default=16)
+    r.add_argument("--requests", type=int, default=500, help="requests per review scenario")
+    r.add_argument("--export-requests", type=int, default=3)
+    r.add_argument("--uploads", type=int, default=4)
+    r.add_argument("--upload-chunks", type=int, default=50)
+    r.add_argument("--generation-timeout", type=float, default=600)
+    r.add_argument("--llm-latency", type=float, default=0.2)
+    r.add_argument("--llm-jitter", type=float, default=0.2)
+    r.add_argument("--llm-fail-rate", type=float, default=0.0)
+    r.add_argument("--llm-extra-qas", type=int, default=0, help="QA lines the mock generates past the 3 requested")
+    r.add_argument("--seed", type=int, default=42)
+    r.add_argument("--keep-db", action="store_true")
+    r.add_argument("--output", help="report path (default: bench/results/<commit>-<timestamp>.json)")
+    c = sub.add_parser("compare")
+    c.add_argument("before")
+    c.add_argument("after")
+    args = p.parse_args()
+
+    if args.command == "compare":
+        compare(json.loads(Path(args.before).read_text()), json.loads(Path(args.after).read_text()))
+        sys.exit()
+
+    report = asyncio.run(run(args))
+    output = Path(args.output) if args.output else (
+        RESULTS_DIR / f"{report['commit'] or 'nogit'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    for name, result in report["scenarios"].items():
+        print(f"{name:<16} {result['throughput_rps']:>9} req/s  p50 {result['p50_ms']:>8} ms  "
+              f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {result['errors']}")
+    print(f"wrote {output}")
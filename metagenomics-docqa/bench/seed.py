@@ -0,0 +1,136 @@
+"""Seed a database with synthetic chunks, QA items and annotations for benchmarks.
+
+Output is a pure function of --rows and --seed, so every run starts from the same data.
+
+    python -m bench.seed --rows 100000 --db bench/data/seed-100000.sqlite3
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+
+BENCH_PASSWORD = "bench-password"
+BENCH_USERS = {"provider": "bench-provider@example.org", "annotator": "bench-annotator@example.org"}
+QAS_PER_CHUNK = 3
+INSERT_BATCH = 5000
+
+VOCAB = (
+    "sample read reads genome genomes taxon taxa kmer database index abundance coverage assembly binning "
+    "contig contigs marker gene genes protein alignment classifier kraken2 bracken metaphlan fastp quality "
+    "trimming adapter paired single end illumina nanopore pacbio host depletion rarefaction diversity alpha "
+    "beta shannon simpson otu asv amplicon 16s shotgun pipeline snakemake nextflow conda docker reference "
+    "taxonomy ncbi gtdb silva blast diamond hmm domain pathway kegg function annotation prokka bakta checkm "
+    "completeness contamination mag mags strain variant snp mapping bowtie2 bwa samtools depth normalization"
+).split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(VOCAB, k=words))
+
+
+def seed(rows: int, rng_seed: int = 42) -> dict:
+    from sqlalchemy import insert
+
+    from backend import counters
+    from backend.auth import get_password_hash
+    from backend.database import SessionLocal, engine, init_database
+    from backend.models import Annotation, Chunk, QAItem, QAStatus, User, UserRole
+    from backend.search import rebuild_chunk_index
+
+    init_database()
+    rng = random.Random(rng_seed)
+    epoch = datetime(2024, 1, 1)
+    n_chunks = max(1, rows // QAS_PER_CHUNK)
+    n_annotations = rows // 5
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        password_hash = get_password_hash(BENCH_PASSWORD)
+        conn.execute(insert(User), [
+            {"email": email, "full_name": f"bench {role}", "role": UserRole(role), "password_hash": password_hash,
+             "created_at": epoch}
+            for role, email in BENCH_USERS.items()
+        ])
+        annotator_id = 2
+
+    with engine.begin() as conn:
+        batch = []
+        for i in range(n_chunks):
+            batch.append({
+                "chunk_id": f"bench-{i:08d}",
+                "source_url": f"https://example.org/source/{i % 50}",
+                "content": _text(rng, 120),
+                "created_at": epoch + timedelta(seconds=i),
+            })
+            if len(batch) >= INSERT_BATCH:
+                conn.execute(insert(Chunk), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Chunk), batch)
+
+    statuses = [QAStatus.pending] * 7 + [QAStatus.ready] * 2 + [QAStatus.rejected]
+    with engine.begin() as conn:
+        batch = []
+        for i in range(rows):
+            batch.append({
+                "chunk_id_fk": i // QAS_PER_CHUNK % n_chunks + 1,
+                "question": f"Q{i}: what about {_text(rng, 6)}?",
+                "answer": _text(rng, 25),
+                "status": rng.choice(statuses),
+                "created_at": epoch + timedelta(seconds=i),
+            })
+            if len(batch) >= INSERT_BATCH:
+                conn.execute(insert(QAItem), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(QAItem), batch)
+
+    with engine.begin() as conn:
+        batch = []
+        for i in range(n_annotations):
+            batch.append({
+                "qa_item_id_fk": rng.randint(1, rows),
+                "edited_question": _text(rng, 8),
+                "edited_answer": _text(rng, 20),
+                "score": round(rng.random(), 2),
+                "comment": "",
+                "validated": rng.random() < 0.5,
+                "annotated_by_user_id": annotator_id,
+                "created_at": epoch + timedelta(seconds=rows + i),
+            })
+            if len(batch) >= INSERT_BATCH:
+                conn.execute(insert(Annotation), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Annotation), batch)
+
+    with SessionLocal() as db:
+        counters.rebuild(db)
+        rebuild_chunk_index(db)
+        db.commit()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {
+        "chunks": n_chunks,
+        "qa_items": rows,
+        "annotations": n_annotations,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Seed a benchmark database with synthetic data")
+    p.add_argument("--rows", type=int, default=10_000, help="number of QA items (chunks = rows / 3)")
+    p.add_argument("--db", required=True, help="SQLite file to create")
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args()
+
+    if os.path.exists(args.db):
+        raise SystemExit(f"{args.db} already exists")
+    # Must be set before backend.database is imported.
+    os.environ["DOCQA_DB_PATH"] = os.path.abspath(args.db)
+    os.environ.pop("DOCQA_DATABASE_URL", None)
+    os.environ.pop("DOCQA_READ_DATABASE_URL", None)
+    print(seed(args.rows, args.seed))
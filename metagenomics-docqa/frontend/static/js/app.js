@@ -120,6 +120,7 @@ async function register(event) {
 }
 
 function logout() {
+    closeEventStream();
     clearAuth();
     window.location.href = '/';
 }
@@ -180,8 +181,9 @@ async function loadUserInfo() {
             showTab('review');
         }
         
-        // Load annotation count
-        await loadAnnotationCount();
+        // Load counts once; the event stream keeps them current
+        await loadStats();
+        openEventStream();
         
         currentUser = { role, name: userName, id: userInfo.id };
     } catch (error) {
@@ -190,77 +192,118 @@ async function loadUserInfo() {
     }
 }
 
-async function loadAnnotationCount() {
+// QA counts by status, loaded once and then updated from `counters` events
+let stats = null;
+
+async function loadStats() {
     try {
-        const stats = await apiCall('/review/stats');
-        // This is a simple count - in a real app you'd want user-specific annotation count
-        document.getElementById('annotationCount').textContent = stats.total;
+        stats = await apiCall('/review/stats');
+        renderStats();
     } catch (error) {
-        console.error('Failed to load annotation count:', error);
+        console.error('Failed to load stats:', error);
     }
 }
 
-async function loadPendingQAs() {
+function renderStats() {
+    if (!stats) return;
+    // This is a simple count - in a real app you'd want user-specific annotation count
+    document.getElementById('annotationCount').textContent = stats.total;
+    document.getElementById('qaCount').textContent = `${stats.pending} pending QAs`;
+    document.getElementById('totalQAs').textContent = stats.total;
+    document.getElementById('pendingQAs').textContent = stats.pending;
+    document.getElementById('readyQAs').textContent = stats.ready;
+    document.getElementById('rejectedQAs').textContent = stats.rejected;
+}
+
+// Number of QAs leased to this annotator from /review/next
+const LEASE_BATCH = 50;
+// Server-side cap on one /review/next call (MAX_LEASE_BATCH in backend/routers/review.py)
+const MAX_LEASE_BATCH = 200;
+let leaseLimit = LEASE_BATCH;
+
+function renderPendingQA(qa) {
+    const annotatorHistory = qa.annotators && qa.annotators.length > 0 ? `
+        <div class="annotator-history">
+            <strong>Annotated by:</strong>
+            ${qa.annotators.map(ann => `
+                <div class="annotator-item">
+                    <span class="annotator-name">${ann.name}</span>
+                    <span class="annotator-date">${new Date(ann.date).toLocaleDateString()}</span>
+                    <span class="annotator-score">${ann.score}</span>
+                </div>
+            `).join('')}
+        </div>
+    ` : '';
+
+    return `
+        <div class="qa-item" data-qa-id="${qa.id}">
+            <div class="qa-question">${qa.question}</div>
+            <div class="qa-answer">${qa.answer}</div>
+            <div class="qa-meta">
+                <span>ID: ${qa.id}</span>
+                <span>Created: ${new Date(qa.created_at).toLocaleDateString()}</span>
+            </div>
+            ${annotatorHistory}
+            <div class="qa-actions">
+                <button class="btn btn-primary btn-sm" onclick="openReviewModal(${qa.id}, '${qa.question.replace(/'/g, "\\'")}', '${qa.answer.replace(/'/g, "\\'")}')">
+                    <i class="fas fa-edit"></i> Review
+                </button>
+            </div>
+        </div>
+    `;
+}
+
+function updateLoadMore(page) {
+    const loadMoreBtn = document.getElementById('loadMoreBtn');
+    if (loadMoreBtn) {
+        // a full batch means more pending QAs may be available to lease, up to the server's cap
+        const more = page.items.length >= leaseLimit && leaseLimit < MAX_LEASE_BATCH;
+        loadMoreBtn.style.display = more ? 'block' : 'none';
+    }
+}
+
+async function loadPendingQAs(limit = LEASE_BATCH) {
+    leaseLimit = Math.min(limit, MAX_LEASE_BATCH);
     const qaList = document.getElementById('qaList');
     qaList.innerHTML = '<div class="loading">Loading QAs...</div>';
     
     try {
-        const qas = await apiCall('/review/pending');
-        const countEl = document.getElementById('qaCount');
-        countEl.textContent = `${qas.length} pending QAs`;
+        const page = await apiCall(`/review/next?limit=${leaseLimit}`, { method: 'POST' });
+        renderStats();
+        updateLoadMore(page);
         
-        if (qas.length === 0) {
+        if (page.items.length === 0) {
             qaList.innerHTML = '<div class="loading">No pending QAs found.</div>';
             return;
         }
         
-        qaList.innerHTML = qas.map(qa => {
-            const annotatorHistory = qa.annotators && qa.annotators.length > 0 ? `
-                <div class="annotator-history">
-                    <strong>Annotated by:</strong>
-                    ${qa.annotators.map(ann => `
-                        <div class="annotator-item">
-                            <span class="annotator-name">${ann.name}</span>
-                            <span class="annotator-date">${new Date(ann.date).toLocaleDateString()}</span>
-                            <span class="annotator-score">${ann.score}</span>
-                        </div>
-                    `).join('')}
-                </div>
-            ` : '';
-            
-            return `
-                <div class="qa-item">
-                    <div class="qa-question">${qa.question}</div>
-                    <div class="qa-answer">${qa.answer}</div>
-                    <div class="qa-meta">
-                        <span>ID: ${qa.id}</span>
-                        <span>Created: ${new Date(qa.created_at).toLocaleDateString()}</span>
-                    </div>
-                    ${annotatorHistory}
-                    <div class="qa-actions">
-                        <button class="btn btn-primary btn-sm" onclick="openReviewModal(${qa.id}, '${qa.question.replace(/'/g, "\\'")}', '${qa.answer.replace(/'/g, "\\'")}')">
-                            <i class="fas fa-edit"></i> Review
-                        </button>
-                    </div>
-                </div>
-            `;
-        }).join('');
+        qaList.innerHTML = page.items.map(renderPendingQA).join('');
     } catch (error) {
         qaList.innerHTML = `<div class="loading">Error loading QAs: ${error.message}</div>`;
     }
 }
 
+function removePendingQA(qaId) {
+    const item = document.querySelector(`#qaList [data-qa-id="${qaId}"]`);
+    if (!item) return;
+    item.remove();
+    if (!document.querySelector('#qaList .qa-item')) {
+        // Batch used up: lease the next one
+        loadPendingQAs(leaseLimit);
+    }
+}
+
+async function loadMorePendingQAs() {
+    // Leases already held are renewed and returned again, so ask for a bigger batch.
+    await loadPendingQAs(Math.min(leaseLimit + LEASE_BATCH, MAX_LEASE_BATCH));
+}
+
 async function loadReadyQAs() {
     const readyList = document.getElementById('readyList');
     readyList.innerHTML = '<div class="loading">Loading ready QAs...</div>';
     
     try {
-        // Load stats first
-        const stats = await apiCall('/review/stats');
-        document.getElementById('totalQAs').textContent = stats.total;
-        document.getElementById('pendingQAs').textContent = stats.pending;
-        document.getElementById('readyQAs').textContent = stats.ready;
-        document.getElementById('rejectedQAs').textContent = stats.rejected;
+        renderStats();
         
         // Load ready QAs
         const qas = await apiCall('/provider/ready');
@@ -312,12 +355,14 @@ async function uploadFile(event) {
             const result = await response.json();
             resultBox.innerHTML = `
                 <div class="message success">
-                    <strong>Success!</strong><br>
-                    Created ${result.chunks} chunks<br>
-                    Generated ${result.qa_generated} QAs
+                    <strong>Upload accepted!</strong><br>
+                    Queued ${result.chunks} chunks (job #${result.job_id})<br>
+                    Skipped ${result.skipped} existing, rejected ${result.rejected} lines
+                    <div id="jobProgress"></div>
                 </div>
             `;
             fileInput.value = '';
+            watchJob(result.job_id);
         } else {
             const error = await response.text();
             resultBox.innerHTML = `<div class="message error">Error: ${error}</div>`;
@@ -327,6 +372,129 @@ async function uploadFile(event) {
     }
 }
 
+function renderJobProgress(job) {
+    const progressEl = document.getElementById('jobProgress');
+    if (!progressEl) return;
+    const percent = Math.round(job.progress * 100);
+    progressEl.innerHTML = `
+        Status: ${job.status} (${percent}%)<br>
+        Processed ${job.processed_chunks}/${job.total_chunks} chunks, ${job.failed_chunks} failed<br>
+        Generated ${job.qa_generated} QAs (${job.chunks_per_second.toFixed(2)} chunks/s)
+    `;
+}
+
+// Job whose progress is shown under the upload form; updated from `job` events
+let watchedJobId = null;
+
+async function watchJob(jobId) {
+    watchedJobId = jobId;
+    try {
+        renderJobProgress(await apiCall(`/upload/jobs/${jobId}`));
+    } catch (error) {
+        console.error('Failed to load job progress:', error);
+    }
+}
+
+// Live updates: one EventSource per dashboard instead of polling
+let eventSource = null;
+let eventStreamGeneration = 0;
+let lastEventId = null;
+let readyReloadTimer = null;
+let pendingReloadTimer = null;
+
+function isTabActive(tabName) {
+    const content = document.getElementById(`${tabName}Content`);
+    return content && content.classList.contains('active');
+}
+
+function scheduleReadyReload() {
+    // Bursts of annotations reload the ready list once
+    if (!isTabActive('ready') || readyReloadTimer) return;
+    readyReloadTimer = setTimeout(() => {
+        readyReloadTimer = null;
+        loadReadyQAs();
+    }, 2000);
+}
+
+function schedulePendingReload() {
+    // New QAs only matter to an annotator who has run out of leased ones
+    if (!isTabActive('review') || pendingReloadTimer || document.querySelector('#qaList .qa-item')) return;
+    pendingReloadTimer = setTimeout(() => {
+        pendingReloadTimer = null;
+        if (!document.querySelector('#qaList .qa-item')) loadPendingQAs(leaseLimit);
+    }, 2000);
+}
+
+async function openEventStream() {
+    closeEventStream();
+    const opening = ++eventStreamGeneration;
+    // EventSource can't send an Authorization header; a short-lived ticket keeps the login token out of URLs
+    let ticket;
+    try {
+        ticket = (await apiCall('/events/ticket', { method: 'POST' })).ticket;
+    } catch (error) {
+        console.error('Live updates unavailable:', error);
+        return;
+    }
+    if (opening !== eventStreamGeneration) return;  // closed or reopened meanwhile
+    const after = lastEventId ? `&after=${encodeURIComponent(lastEventId)}` : '';
+    eventSource = new EventSource(`${API_BASE}/events?ticket=${encodeURIComponent(ticket)}${after}`);
+
+    const on = (type, handler) => eventSource.addEventListener(type, (event) => {
+        if (event.lastEventId) lastEventId = event.lastEventId;
+        handler(event);
+    });
+
+    on('counters', (event) => {
+        if (!stats) return;
+        for (const change of JSON.parse(event.data).deltas) {
+            stats[change.status] = (stats[change.status] || 0) + change.delta;
+            stats.total += change.delta;
+        }
+        renderStats();
+    });
+
+    on('qa_status', (event) => {
+        for (const item of JSON.parse(event.data).items) {
+            if (item.status !== 'pending') removePendingQA(item.id);
+            if (item.status === 'ready' || item.previous === 'ready') scheduleReadyReload();
+        }
+    });
+
+    on('qa_created', () => schedulePendingReload());
+
+    on('job', (event) => {
+        const job = JSON.parse(event.data);
+        if (job.id === watchedJobId) renderJobProgress(job);
+    });
+
+    on('resync', () => {
+        // Events were dropped: reload everything once
+        loadStats();
+        if (isTabActive('review')) loadPendingQAs(leaseLimit);
+        if (isTabActive('ready')) loadReadyQAs();
+        if (watchedJobId) watchJob(watchedJobId);
+    });
+
+    eventSource.onerror = () => {
+        // The browser reconnects by itself with the same URL; once its ticket has expired the
+        // server refuses it, so reopen with a fresh ticket from the last event seen
+        if (eventSource && eventSource.readyState === EventSource.CLOSED && opening === eventStreamGeneration) {
+            setTimeout(() => {
+                if (opening === eventStreamGeneration) openEventStream();
+            }, 3000);
+        }
+    };
+}
+
+function closeEventStream() {
+    eventStreamGeneration++;
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+}
+
 // Modal functions
 function openReviewModal(qaId, question, answer) {
     document.getElementById('qaId').value = qaId;
@@ -364,7 +532,8 @@ async function saveAnnotation(event) {
         
         closeModal();
         showMessage('Annotation saved successfully!');
-        loadPendingQAs();
+        // Reviewed either way; the lease was released, so drop it from this batch
+        removePendingQA(data.qa_item_id);
     } catch (error) {
         showMessage('Failed to save annotation: ' + error.message, 'error');
     }
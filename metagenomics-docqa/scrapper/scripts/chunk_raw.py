@@ -1,38 +1,244 @@
-from pathlib import Path
+"""Split dataset/raw/raw.jsonl into overlapping token windows in dataset/chunks/chunks.jsonl.
+
+Each document is tokenized once. Window text is sliced from the original text at character
+offsets derived from token boundaries, so ``char_start``/``char_end`` point back into the
+document. ``chunk_id`` hashes the URL and the chunk text, so re-runs produce the same ids.
+
+Runs are incremental: chunks.state.jsonl records the text hash and window policy each URL was last
+chunked with, and URLs whose latest text and policy match are skipped (``--full`` starts over).
+When a URL is chunked again, its previous chunks are removed from chunks.jsonl first. Documents
+are tokenized in batches with ``encode_batch`` across a process pool.
+"""
+import argparse
+import hashlib
 import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
 import tiktoken
 
 RAW = Path("dataset/raw/raw.jsonl")
 OUT = Path("dataset/chunks/chunks.jsonl")
-enc = tiktoken.get_encoding("cl100k_base")
+ENCODING = "cl100k_base"
 
-def chunk_text(text, url, min_tok=400, max_tok=800, stride=160):
-    toks = enc.encode(text)
-    for i in range(0, len(toks), stride):
-        window = toks[i:i + max_tok]
-        if len(window) < min_tok:
-            break
-        chunk_text = enc.decode(window)
 
+@dataclass(frozen=True)
+class ChunkPolicy:
+    max_tokens: int = 800
+    min_tokens: int = 400
+    stride: int = 160  # tokens between window starts; overlap = max_tokens - stride
+    # "slide": keep sliding until the window is shorter than min_tokens (the original behaviour);
+    # "cover": stop at the first window that reaches the end, shifted back to full length.
+    tail: str = "slide"
+
+    def windows(self, n_tokens: int):
+        for start in range(0, n_tokens, self.stride):
+            end = min(start + self.max_tokens, n_tokens)
+            if self.tail == "cover" and end == n_tokens:
+                start = max(0, end - self.max_tokens)
+            if end - start < self.min_tokens:
+                return
+            yield start, end
+            if self.tail == "cover" and end == n_tokens:
+                return
+
+    def key(self) -> str:
+        return f"{ENCODING}:{self.max_tokens}:{self.min_tokens}:{self.stride}:{self.tail}"
+
+
+@lru_cache(maxsize=None)
+def encoding():
+    return tiktoken.get_encoding(ENCODING)
+
+
+@lru_cache(maxsize=None)
+def token_byte_lengths() -> np.ndarray:
+    # One lookup table per process instead of decoding every token of every document.
+    enc = encoding()
+    lengths = np.zeros(enc.n_vocab, dtype=np.int64)
+    for token in range(enc.n_vocab):
+        try:
+            lengths[token] = len(enc.decode_single_token_bytes(token))
+        except KeyError:  # unused ids between the regular and special tokens
+            pass
+    return lengths
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def char_offsets(text: str, token_lengths) -> np.ndarray:
+    """Character offset of every token boundary (len(tokens) + 1 of them) in `text`."""
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    # Characters started before each byte offset; a boundary inside a multi-byte character
+    # rounds up, so a window never cuts a character in half.
+    chars_before = np.concatenate(([0], np.cumsum((data & 0xC0) != 0x80)))
+    byte_bounds = np.concatenate(([0], np.cumsum(token_lengths)))
+    return chars_before[byte_bounds]
+
+
+def chunk_document(text: str, url: str, tokens, policy: ChunkPolicy):
+    lengths = token_byte_lengths()[np.asarray(tokens, dtype=np.int64)]
+    bounds = char_offsets(text, lengths)
+    url_id = sha256(url)[:8]
+    for start, end in policy.windows(len(tokens)):
+        char_start, char_end = int(bounds[start]), int(bounds[end])
+        chunk = text[char_start:char_end]
         yield {
-            "chunk_id": f"{abs(hash(url))}_{i}",
+            "chunk_id": f"{url_id}_{sha256(chunk)[:16]}",
             "url": url,
-            "char_start": None,
-            "char_end": None,
-            "text": chunk_text,
+            "char_start": char_start,
+            "char_end": char_end,
+            "text": chunk,
         }
 
-if __name__ == "__main__":
-    OUT.parent.mkdir(parents=True, exist_ok=True)
-    print('--')
-    with RAW.open() as f, OUT.open("a", encoding="utf-8") as g:
-        for line in f:
-            print(line)
+
+def chunk_text(text, url, min_tok=400, max_tok=800, stride=160):
+    tokens = encoding().encode(text, disallowed_special=())
+    yield from chunk_document(text, url, tokens, ChunkPolicy(max_tok, min_tok, stride))
+
+
+def chunk_batch(docs, policy: ChunkPolicy):
+    # Runs in a pool worker: one encode_batch call per batch of documents.
+    token_lists = encoding().encode_batch([d["text"] for d in docs], num_threads=1, disallowed_special=())
+    return [list(chunk_document(d["text"], d["url"], tokens, policy)) for d, tokens in zip(docs, token_lists)]
+
+
+def read_state(path: Path) -> dict:
+    """url -> (text_sha256, policy) its chunks in chunks.jsonl were made from; later lines win."""
+    state = {}
+    if path.exists():
+        with path.open(encoding="utf-8") as f:
+            for s in map(json.loads, filter(str.strip, f)):
+                state[s["url"]] = (s["text_sha256"], s["policy"])
+    return state
+
+
+def latest_records(raw: Path) -> dict:
+    """url -> (line number, text sha256) of its last usable record; scrape_one.py appends on every run."""
+    latest = {}
+    with raw.open(encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if not line.strip():
+                continue
             rec = json.loads(line)
-            print(rec)
-            if not rec.get("ok"):
+            if rec.get("ok") and rec.get("text"):
+                latest[rec["url"]] = (line_no, sha256(rec["text"]))
+    return latest
+
+
+def drop_chunks(out: Path, urls: set) -> int:
+    """Rewrite chunks.jsonl without the chunks of `urls`; returns how many were dropped."""
+    dropped = 0
+    tmp = out.with_name(out.name + ".tmp")
+    with out.open(encoding="utf-8") as src, tmp.open("w", encoding="utf-8") as dst:
+        for line in src:
+            if line.strip() and json.loads(line)["url"] in urls:
+                dropped += 1
+            else:
+                dst.write(line)
+    os.replace(tmp, out)
+    return dropped
+
+
+def pending_docs(raw: Path, latest: dict, changed: set):
+    with raw.open(encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if not line.strip():
                 continue
-            print('--')
-            for ch in chunk_text(rec["text"], rec["url"]):
-                g.write(json.dumps(ch, ensure_ascii=False) + "\n")
-                print("chunked")
\ No newline at end of file
+            rec = json.loads(line)
+            url = rec.get("url")
+            if url in changed and latest[url][0] == line_no:
+                yield {"url": url, "text": rec["text"], "text_sha256": latest[url][1]}
+
+
+def batches(docs, size: int):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run(args) -> dict:
+    policy = ChunkPolicy(args.max_tokens, args.min_tokens, args.stride, args.tail)
+    state_path = args.out.with_name(args.out.stem + ".state.jsonl")
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    if args.full:
+        args.out.unlink(missing_ok=True)
+        state_path.unlink(missing_ok=True)
+    latest = latest_records(args.raw)
+    done = read_state(state_path)
+    changed = {url for url, (_, digest) in latest.items() if done.get(url) != (digest, policy.key())}
+    stats = {"documents": len(latest), "skipped": len(latest) - len(changed), "chunked": 0, "chunks": 0,
+             "superseded": 0}
+    # Before anything is appended, so chunks an interrupted run already wrote for these URLs go too.
+    if args.out.exists() and changed & done.keys():
+        stats["superseded"] = drop_chunks(args.out, changed & done.keys())
+    work = batches(pending_docs(args.raw, latest, changed), args.batch_docs)
+
+    with args.out.open("a", encoding="utf-8") as out, state_path.open("a", encoding="utf-8") as state, \
+            ProcessPoolExecutor(max_workers=args.workers) as pool:
+
+        def write(batch, results):
+            for chunks in results:
+                out.writelines(json.dumps(ch, ensure_ascii=False) + "\n" for ch in chunks)
+                stats["chunked"] += 1
+                stats["chunks"] += len(chunks)
+            out.flush()
+            # State goes after the chunks, so an interrupted run redoes a batch rather than losing it.
+            state.writelines(
+                json.dumps({"url": d["url"], "text_sha256": d["text_sha256"], "policy": policy.key(),
+                            "chunks": len(r)}) + "\n"
+                for d, r in zip(batch, results)
+            )
+            state.flush()
+
+        # Bounded read-ahead: results are written in input order while later batches are tokenized.
+        in_flight = deque()
+        for batch in work:
+            in_flight.append((batch, pool.submit(chunk_batch, batch, policy)))
+            if len(in_flight) >= 2 * args.workers:
+                batch, future = in_flight.popleft()
+                write(batch, future.result())
+        while in_flight:
+            batch, future = in_flight.popleft()
+            write(batch, future.result())
+    return stats
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--raw", type=Path, default=RAW)
+    p.add_argument("--out", type=Path, default=OUT)
+    p.add_argument("--max-tokens", type=int, default=800)
+    p.add_argument("--min-tokens", type=int, default=400)
+    overlap = p.add_mutually_exclusive_group()
+    overlap.add_argument("--stride", type=int, help="tokens between window starts (default 160)")
+    overlap.add_argument("--overlap", type=int, help="tokens shared by consecutive windows")
+    p.add_argument("--tail", choices=["slide", "cover"], default="slide")
+    p.add_argument("--full", action="store_true", help="discard chunks.jsonl and its state and chunk everything")
+    p.add_argument("--batch-docs", type=int, default=32, help="documents per encode_batch call")
+    p.add_argument("--workers", type=int, default=os.cpu_count())
+    args = p.parse_args()
+    if args.overlap is not None:
+        args.stride = args.max_tokens - args.overlap
+    elif args.stride is None:
+        args.stride = 160
+    if not 0 < args.stride <= args.max_tokens:
+        p.error("stride must be between 1 and --max-tokens (overlap below --max-tokens)")
+
+    started = time.perf_counter()
+    stats = run(args)
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(stats))
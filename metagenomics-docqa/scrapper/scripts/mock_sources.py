@@ -0,0 +1,122 @@
+"""Local stand-in for the documentation sites in sources.csv, for checking scrape_sources.py.
+
+Serves every response scrape_sources.py has a code path for, and writes a matching sources.csv:
+
+- ``/page/<n>``: HTML with an ETag, answered with 304 when ``If-None-Match`` matches.
+- ``/dated/<n>``: HTML with only Last-Modified, answered with 304 on ``If-Modified-Since``.
+- ``/flaky/<n>``: 503 with ``Retry-After: 0`` on the first request, then like ``/page``.
+- ``/missing/<n>``: 404.
+- ``/loop``: redirects to itself, so the client gives up with an error.
+
+``GET /_bump`` changes the text of every ``/page``, so the next run fetches them again;
+``GET /_stats`` returns the statuses sent per path.
+
+    python dev/scripts/mock_sources.py --port 8765 --write-sources /tmp/mock/sources.csv &
+    python dev/scripts/scrape_sources.py --sources /tmp/mock/sources.csv --out /tmp/mock/raw.jsonl \\
+        --cache /tmp/mock/cache --host-delay 0
+
+The first run fetches the pages (retrying the flaky ones) and records the 404 and the redirect
+loop as failed; a second run gets only 304s for the pages it has.
+"""
+import argparse
+import hashlib
+import json
+import threading
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+KINDS = ("page", "dated", "flaky", "missing")
+
+
+class MockSourcesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    version = 1
+    statuses = defaultdict(Counter)
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        kind = self.path.strip("/").split("/", 1)[0]
+        if self.path == "/_stats":
+            with self.lock:
+                stats = {path: dict(counts) for path, counts in self.statuses.items()}
+            self._send(200, json.dumps(stats).encode(), "application/json")
+            return
+        if self.path == "/_bump":
+            with self.lock:
+                MockSourcesHandler.version += 1
+            self._send(200, str(self.version).encode())
+            return
+        if kind == "loop":
+            self._send(302, b"", headers={"Location": self.path})
+        elif kind == "missing":
+            self._send(404, b"")
+        elif kind == "flaky" and not self.statuses[self.path]:
+            self._send(503, b"", headers={"Retry-After": "0"})
+        elif kind == "dated":
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                self._send(304, None, headers={"Last-Modified": LAST_MODIFIED})
+            else:
+                self._send(200, self._html(), "text/html", {"Last-Modified": LAST_MODIFIED})
+        elif kind in ("page", "flaky"):
+            body = self._html()
+            etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, None, headers={"ETag": etag})
+            else:
+                self._send(200, body, "text/html", {"ETag": etag})
+        else:
+            self._send(404, b"")
+
+    def _html(self) -> bytes:
+        # Only /page text follows /_bump; the other kinds stay fixed.
+        version = self.version if self.path.startswith("/page/") else 1
+        return (
+            f"<html><head><title>{self.path}</title></head><body><article><h1>Tool {self.path}</h1>"
+            f"<p>Version {version} of the documentation served at {self.path}. It explains how to install the "
+            "tool, build its reference database and classify metagenomic reads against it.</p>"
+            "<p>Paired-end reads are trimmed first; the report lists abundance per taxon.</p>"
+            "</article></body></html>"
+        ).encode()
+
+    def _send(self, status: int, payload, content_type: str = "text/plain", headers: dict = None):
+        with self.lock:
+            self.statuses[self.path][status] += 1
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if payload is not None:  # a 304 carries no body and no Content-Length
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+
+def write_sources(path: Path, base_url: str, per_kind: int = 3):
+    rows = [f"{kind}-{n},mock,{base_url}/{kind}/{n}" for kind in KINDS for n in range(per_kind)]
+    rows.append(f"loop,mock,{base_url}/loop")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("tool,topic,url\n" + "\n".join(rows) + "\n", encoding="utf-8")
+
+
+def serve(port: int):
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockSourcesHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--write-sources", type=Path, help="write a sources.csv pointing at this server")
+    p.add_argument("--per-kind", type=int, default=3, help="URLs of each kind in the written sources.csv")
+    args = p.parse_args()
+    if args.write_sources:
+        write_sources(args.write_sources, f"http://127.0.0.1:{args.port}", args.per_kind)
+    serve(args.port).serve_forever()
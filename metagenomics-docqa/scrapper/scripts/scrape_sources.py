@@ -0,0 +1,247 @@
+"""Scrape every URL in metadata/sources.csv into dataset/raw/raw.jsonl.
+
+Pages are fetched concurrently with a cap and a minimum delay per host, and revalidated with
+ETag/Last-Modified against an on-disk cache, so a refresh mostly costs 304s. Cached HTML is stored
+by SHA-256, and the extracted text is kept per HTML hash: only pages that actually changed go
+through trafilatura, which runs in a process pool.
+
+Records have the same fields as scrape_one.py's, plus the source's tool and topic. The output
+file is rewritten with one record per source.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+import trafilatura
+
+SOURCES = Path("metadata/sources.csv")
+OUT = Path("dataset/raw/raw.jsonl")
+CACHE = Path("dataset/cache")
+USER_AGENT = "metagenomics-docqa-scraper/1.0"
+EXTRACT_OPTIONS = {"include_tables": True, "include_formatting": True}  # same as scrape_one.py
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def extract(html: bytes):
+    # Runs in a pool worker.
+    return trafilatura.extract(html, **EXTRACT_OPTIONS)
+
+
+def write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class FetchCache:
+    """index.json: url -> validators and the hash of the last HTML seen; html/ and text/ by hash."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        index = root / "index.json"
+        self.index = json.loads(index.read_text(encoding="utf-8")) if index.exists() else {}
+        # Extracted text depends on the extraction options as well as the HTML.
+        self.extract_key = hashlib.sha256(json.dumps(EXTRACT_OPTIONS, sort_keys=True).encode()).hexdigest()[:8]
+
+    def _html_path(self, digest: str) -> Path:
+        return self.root / "html" / digest[:2] / digest
+
+    def _text_path(self, digest: str) -> Path:
+        return self.root / "text" / digest[:2] / f"{digest}.{self.extract_key}.json"
+
+    def validators(self, url: str) -> dict:
+        entry = self.index.get(url)
+        if not entry or not self._html_path(entry["sha256"]).exists():
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def cached_html(self, url: str):
+        entry = self.index.get(url)
+        if not entry:
+            return None, None
+        path = self._html_path(entry["sha256"])
+        return (path.read_bytes(), entry["sha256"]) if path.exists() else (None, None)
+
+    def store_html(self, url: str, html: bytes, response: httpx.Response) -> str:
+        digest = hashlib.sha256(html).hexdigest()
+        path = self._html_path(digest)
+        if not path.exists():
+            write_atomic(path, html)
+        self.index[url] = {
+            "sha256": digest,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "fetched_at": int(time.time()),
+        }
+        return digest
+
+    def touch(self, url: str):
+        self.index[url]["fetched_at"] = int(time.time())
+
+    def cached_text(self, digest: str):
+        path = self._text_path(digest)
+        if not path.exists():
+            return False, None
+        return True, json.loads(path.read_text(encoding="utf-8"))["text"]
+
+    def store_text(self, digest: str, text):
+        write_atomic(self._text_path(digest), json.dumps({"text": text}, ensure_ascii=False).encode("utf-8"))
+
+    def save(self):
+        write_atomic(self.root / "index.json", json.dumps(self.index, indent=1, sort_keys=True).encode("utf-8"))
+
+
+class HostLimiter:
+    """At most `concurrency` requests in flight, `per_host` per host, started at least `delay` seconds apart."""
+
+    def __init__(self, concurrency: int, per_host: int, delay: float):
+        self.delay = delay
+        self._overall = asyncio.Semaphore(concurrency)
+        self._slots = defaultdict(lambda: asyncio.Semaphore(per_host))
+        self._next_start = defaultdict(float)
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        async with self._slots[host]:
+            loop = asyncio.get_running_loop()
+            start = max(loop.time(), self._next_start[host])
+            self._next_start[host] = start + self.delay
+            await asyncio.sleep(start - loop.time())
+            async with self._overall:
+                yield
+
+
+def retry_after(response: httpx.Response, attempt: int) -> float:
+    value = response.headers.get("retry-after", "")
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 2.0 ** attempt
+
+
+async def fetch(client: httpx.AsyncClient, limiter: HostLimiter, cache: FetchCache, url: str, retries: int):
+    """(status, response); status is None when every attempt failed to connect."""
+    headers = cache.validators(url)
+    for attempt in range(retries + 1):
+        try:
+            async with limiter.slot(urlsplit(url).netloc):
+                response = await client.get(url, headers=headers)
+        except httpx.TransportError:
+            if attempt == retries:
+                return None, None
+            await asyncio.sleep(2.0 ** attempt)
+            continue
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            await asyncio.sleep(retry_after(response, attempt))
+            continue
+        return response.status_code, response
+
+
+async def scrape(row: dict, client, limiter, cache: FetchCache, pool, stats: dict, retries: int) -> dict:
+    record = {"url": row["url"], "tool": row.get("tool"), "topic": row.get("topic")}
+    try:
+        return await _scrape(record, client, limiter, cache, pool, stats, retries)
+    except Exception as exc:  # one bad source (redirect loop, undecodable page, extractor crash) must not sink the run
+        stats["errors"] += 1
+        return {**record, "ok": False, "reason": f"error: {type(exc).__name__}: {exc}"}
+
+
+async def _scrape(record: dict, client, limiter, cache: FetchCache, pool, stats: dict, retries: int) -> dict:
+    url = record["url"]
+    status, response = await fetch(client, limiter, cache, url, retries)
+    if status == 304:
+        stats["not_modified"] += 1
+        cache.touch(url)
+        html, digest = cache.cached_html(url)
+    elif status == 200:
+        stats["fetched"] += 1
+        html = response.content
+        digest = cache.store_html(url, html, response)
+    else:
+        # Keep serving the last good copy when a source is temporarily down.
+        stats["failed"] += 1
+        html, digest = cache.cached_html(url)
+        if html is None:
+            return {**record, "ok": False, "reason": "fetch_failed" if status is None else f"http_{status}"}
+        record["stale"] = True
+
+    found, text = cache.cached_text(digest)
+    if found:
+        stats["extract_cached"] += 1
+    else:
+        stats["extracted"] += 1
+        text = await asyncio.get_running_loop().run_in_executor(pool, extract, html)
+        cache.store_text(digest, text)
+    if not text:
+        return {**record, "ok": False, "reason": "extract_failed"}
+    return {**record, "ok": True, "title": None, "text": text, "retrieved_at": cache.index[url]["fetched_at"]}
+
+
+def read_sources(path: Path) -> list:
+    with path.open(encoding="utf-8", newline="") as f:
+        rows = [row for row in csv.DictReader(f) if (row.get("url") or "").strip()]
+    unique = {}
+    for row in rows:
+        unique.setdefault(row["url"].strip(), {**row, "url": row["url"].strip()})
+    return list(unique.values())
+
+
+async def run(args) -> dict:
+    rows = read_sources(args.sources)
+    cache = FetchCache(args.cache)
+    stats = {"sources": len(rows), "fetched": 0, "not_modified": 0, "failed": 0, "errors": 0, "extracted": 0,
+             "extract_cached": 0}
+    limiter = HostLimiter(args.concurrency, args.per_host, args.host_delay)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(
+            timeout=args.timeout, limits=limits, follow_redirects=True, headers={"User-Agent": USER_AGENT}
+        ) as client:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                records = await asyncio.gather(
+                    *(scrape(row, client, limiter, cache, pool, stats, args.retries) for row in rows)
+                )
+    finally:
+        # Pages stored so far stay revalidatable even if the run is interrupted.
+        cache.save()
+    write_atomic(args.out, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"))
+    stats["ok"] = sum(r["ok"] for r in records)
+    return stats
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--sources", type=Path, default=SOURCES)
+    p.add_argument("--out", type=Path, default=OUT)
+    p.add_argument("--cache", type=Path, default=CACHE)
+    p.add_argument("--concurrency", type=int, default=16, help="requests in flight overall")
+    p.add_argument("--per-host", type=int, default=2, help="requests in flight per host")
+    p.add_argument("--host-delay", type=float, default=1.0, help="seconds between request starts per host")
+    p.add_argument("--retries", type=int, default=2, help="extra attempts on connection errors, 429 and 5xx")
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("--workers", type=int, default=os.cpu_count(), help="extraction processes")
+    args = p.parse_args()
+
+    started = time.perf_counter()
+    stats = asyncio.run(run(args))
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(stats))
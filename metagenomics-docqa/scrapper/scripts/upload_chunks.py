@@ -11,6 +11,7 @@ def main():
     p.add_argument("--api", default="http://localhost:8000")
     p.add_argument("--email")
     p.add_argument("--password")
+    p.add_argument("--on-conflict", choices=["skip", "upsert"], default="skip")
     args = p.parse_args()
 
     with httpx.Client(base_url=args.api, timeout=60) as c:
@@ -18,9 +19,9 @@ def main():
         r.raise_for_status()
         token = r.json()["access_token"]
         headers = {"Authorization": f"Bearer {token}"}
-        content = args.jsonl.read_bytes()
-        files = {"f": (args.jsonl.name, content, "application/json")}
-        rr = c.post("/upload/file", headers=headers, files=files)
+        with args.jsonl.open("rb") as fh:
+            files = {"f": (args.jsonl.name, fh, "application/json")}
+            rr = c.post("/upload/file", headers=headers, files=files, params={"on_conflict": args.on_conflict})
         print(rr.status_code, rr.text)
 
 
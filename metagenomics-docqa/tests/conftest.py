@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# backend.database reads this at import; keep tests off the committed docqa.sqlite3.
+os.environ.setdefault("DOCQA_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="docqa-tests-"), "docqa.sqlite3"))
@@ -0,0 +1,128 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from backend.counters import get_counts, record_created, record_transitions
+from backend.database import SessionLocal, init_database
+from backend.models import Chunk, QAItem, QAStatus
+from backend.verify import UNSUPPORTED, lexical_scores, load_unverified, prefilter, store_results
+
+_chunk_ids = itertools.count()
+
+
+def scores(answers, contexts):
+    overlap, grounding = lexical_scores(answers, contexts)
+    return overlap.tolist(), grounding.tolist()
+
+
+def test_known_scores():
+    # Content words: kraken2 builds reference database quickly / kraken2 builds reference database.
+    overlap, grounding = scores(
+        ["kraken2 builds the reference database quickly"], ["kraken2 builds a reference database"]
+    )
+    assert overlap == [pytest.approx(4 / 5)]
+    assert grounding == [pytest.approx(3 / 4)]
+
+
+def test_empty_and_stopword_only_answers_score_zero():
+    assert scores(["", "the of and it"], ["kraken2 database", "the of and it"]) == ([0.0, 0.0], [0.0, 0.0])
+
+
+def test_one_word_answer_has_no_bigrams():
+    assert scores(["kraken2", "bracken"], ["kraken2 database", "kraken2 database"]) == ([1.0, 0.0], [0.0, 0.0])
+
+
+def test_repeated_words_count_once():
+    assert scores(["reads reads reads"], ["reads"]) == ([1.0], [0.0])
+
+
+def test_bigrams_do_not_span_texts():
+    # Concatenated, answer 0 + answer 1 would read "kraken2 database" (found in context 0), and
+    # answer 1 + context 0 "database kraken2" (found in context 1).
+    assert scores(["kraken2", "database"], ["kraken2 database", "database kraken2"]) == ([1.0, 1.0], [0.0, 0.0])
+
+
+def test_empty_batch():
+    overlap, grounding = lexical_scores([], [])
+    assert overlap.shape == grounding.shape == (0,)
+    assert overlap.dtype == np.float64
+
+
+
+@pytest.fixture
+def db():
+    init_database()
+    with SessionLocal() as session:
+        yield session
+
+
+def add_chunk(db, content, source_url):
+    chunk = Chunk(chunk_id=f"verify-test-{next(_chunk_ids)}", source_url=source_url, content=content)
+    db.add(chunk)
+    db.flush()
+    return chunk
+
+
+def add_qa(db, chunk, answer, **values):
+    qa = QAItem(chunk_id_fk=chunk.id, question=f"Question {next(_chunk_ids)}?", answer=answer, **values)
+    db.add(qa)
+    db.flush()
+    if qa.duplicate_of_id is None:
+        record_created(db, chunk.source_url, 1, qa.status)
+    return qa
+
+
+def verify_lexically(db, chunk):
+    rows = load_unverified(db, chunk_id=chunk.id)
+    results, _ = prefilter(rows)
+    stats = store_results(db, rows, results)
+    db.commit()
+    db.expire_all()
+    return {result["id"]: result for result in results}, stats
+
+
+def test_store_results_rejects_answers_scoring_below_reject_threshold(db):
+    source = "https://example.org/reject"
+    chunk = add_chunk(db, "kraken2 builds a reference database from genomic sequences", source)
+    grounded = add_qa(db, chunk, "kraken2 builds a reference database")
+    unrelated = add_qa(db, chunk, "bracken estimates species abundance afterwards")
+    db.commit()
+
+    results, stats = verify_lexically(db, chunk)
+
+    result = results[unrelated.id]
+    assert 0.6 * result["overlap_score"] + 0.4 * result["grounding_score"] < 0.3
+    assert (result["verdict"], result["verdict_by"]) == (UNSUPPORTED, "lexical")
+    assert stats["rejected"] == 1
+    assert db.get(QAItem, unrelated.id).status == QAStatus.rejected
+    assert db.get(QAItem, unrelated.id).verdict == UNSUPPORTED
+    assert db.get(QAItem, grounded.id).status == QAStatus.pending
+    counts = get_counts(db, source)
+    assert (counts["pending"], counts["rejected"], counts["total"]) == (1, 1, 2)
+
+
+def test_store_results_counts_only_pending_cluster_heads(db):
+    source = "https://example.org/heads"
+    chunk = add_chunk(db, "kraken2 builds a reference database", source)
+    head = add_qa(db, chunk, "metaphlan marker genes")
+    duplicate = add_qa(db, chunk, "metaphlan marker genes", duplicate_of_id=head.id)
+    db.commit()
+    # A reviewer accepts a QA while the verifier runs: its verdict is stored but it stays ready.
+    reviewed = add_qa(db, chunk, "humann pathway abundance")
+    rows = load_unverified(db, chunk_id=chunk.id)
+    db.query(QAItem).filter(QAItem.id == reviewed.id).update({QAItem.status: QAStatus.ready})
+    record_transitions(db, [(source, QAStatus.pending, QAStatus.ready)])
+    results, _ = prefilter(rows)
+    stats = store_results(db, rows, results)
+    db.commit()
+    db.expire_all()
+
+    assert all(result["verdict"] == UNSUPPORTED for result in results)
+    assert stats["rejected"] == 2
+    assert db.get(QAItem, reviewed.id).status == QAStatus.ready
+    assert db.get(QAItem, reviewed.id).verdict == UNSUPPORTED
+    assert db.get(QAItem, duplicate.id).status == QAStatus.rejected
+    # The duplicate was never counted, so only the head moves from pending to rejected.
+    counts = get_counts(db, source)
+    assert (counts["pending"], counts["ready"], counts["rejected"]) == (0, 1, 1)